@@ -1,7 +1,88 @@
 __version__ = "0.0.10"
 
-from .runner import ResourceManager, Runner
-from .states import Choice, ChoiceRule, Fail, Machine, Parallel, Pass, Sequence, State, States, Succeed, Task, Wait
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .budget import Budget, BudgetExceeded
+    from .caching import LRU, clear_all_caches
+    from .checkpoints import Checkpoint, CheckpointError, Checkpointer
+    from .choice_profile import ChoiceProfiler
+    from .clock import Clock, VirtualClock, WallClock
+    from .diffing import Edit
+    from .errors import ExecutionFailed, StatesError
+    from .history import ExecutionHistory, JsonLinesSink
+    from .payloads import PayloadSizeMonitor, PayloadSizeWarning
+    from .plan import ExecutionPlan, PlanCache, PlanFormatError, ResourceResolutionError
+    from .providers import HttpSession, LocalLambdaEndpoint, ProviderFactory
+    from .runner import ResourceManager, Runner
+    from .states import (
+        Choice, ChoiceRule, Fail, Machine, Map, Parallel, Pass, Sequence, State, States, Succeed, Task, Wait
+    )
+    from .tracing import CompositeTracer, HotSpotTracer, StateTrace, Tracer
+
+# Names are imported from their modules on first access, so that importing the package is fast
+# and, for example, building definitions doesn't import the runner.
+_EXPORTS = {
+    "Budget": ".budget",
+    "BudgetExceeded": ".budget",
+    "LRU": ".caching",
+    "clear_all_caches": ".caching",
+    "Checkpoint": ".checkpoints",
+    "CheckpointError": ".checkpoints",
+    "Checkpointer": ".checkpoints",
+    "ChoiceProfiler": ".choice_profile",
+    "Clock": ".clock",
+    "VirtualClock": ".clock",
+    "WallClock": ".clock",
+    "Edit": ".diffing",
+    "ExecutionFailed": ".errors",
+    "StatesError": ".errors",
+    "ExecutionHistory": ".history",
+    "JsonLinesSink": ".history",
+    "PayloadSizeMonitor": ".payloads",
+    "PayloadSizeWarning": ".payloads",
+    "ExecutionPlan": ".plan",
+    "PlanCache": ".plan",
+    "PlanFormatError": ".plan",
+    "ResourceResolutionError": ".plan",
+    "HttpSession": ".providers",
+    "LocalLambdaEndpoint": ".providers",
+    "ProviderFactory": ".providers",
+    "ResourceManager": ".runner",
+    "Runner": ".runner",
+    "Choice": ".states",
+    "ChoiceRule": ".states",
+    "Fail": ".states",
+    "Machine": ".states",
+    "Map": ".states",
+    "Parallel": ".states",
+    "Pass": ".states",
+    "Sequence": ".states",
+    "State": ".states",
+    "States": ".states",
+    "Succeed": ".states",
+    "Task": ".states",
+    "Wait": ".states",
+    "CompositeTracer": ".tracing",
+    "HotSpotTracer": ".tracing",
+    "StateTrace": ".tracing",
+    "Tracer": ".tracing",
+}
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 __all__ = [
     "ResourceManager",
@@ -10,6 +91,7 @@ __all__ = [
     "ChoiceRule",
     "Fail",
     "Machine",
+    "Map",
     "Parallel",
     "Pass",
     "Sequence",
@@ -18,4 +100,33 @@ __all__ = [
     "Succeed",
     "Task",
     "Wait",
+    "Budget",
+    "BudgetExceeded",
+    "Checkpoint",
+    "CheckpointError",
+    "Checkpointer",
+    "ChoiceProfiler",
+    "Clock",
+    "CompositeTracer",
+    "Edit",
+    "ExecutionFailed",
+    "ExecutionHistory",
+    "ExecutionPlan",
+    "HotSpotTracer",
+    "HttpSession",
+    "JsonLinesSink",
+    "LocalLambdaEndpoint",
+    "LRU",
+    "PayloadSizeMonitor",
+    "PayloadSizeWarning",
+    "PlanCache",
+    "PlanFormatError",
+    "ProviderFactory",
+    "ResourceResolutionError",
+    "StatesError",
+    "StateTrace",
+    "Tracer",
+    "VirtualClock",
+    "WallClock",
+    "clear_all_caches",
 ]
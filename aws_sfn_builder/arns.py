@@ -0,0 +1,90 @@
+import fnmatch
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def is_arn_pattern(s: str) -> bool:
+    """
+    Returns ``True`` if ``s`` contains glob wildcards (``*``, ``?``, ``[...]``).
+    """
+    return _GLOB_CHARS.search(s) is not None
+
+
+def split_arn(arn: str) -> List[str]:
+    return arn.split(":")
+
+
+class _TrieNode:
+    __slots__ = ("exact", "globs", "values")
+
+    def __init__(self):
+        self.exact: Dict[str, "_TrieNode"] = {}
+        self.globs: List[Tuple[str, Any, "_TrieNode"]] = []
+        # (specificity, registration order, value) of patterns ending at this node
+        self.values: List[Tuple[Tuple, int, Any]] = []
+
+
+class ArnPatternIndex:
+    """
+    Index of ARN patterns compiled into a trie over ARN components (the parts separated by ``:``).
+
+    Each component of a pattern is either a literal or a glob (``*``, ``?``, ``[...]``)
+    that matches within one component, so ``arn:aws:lambda:*:*:function:*`` matches
+    ``arn:aws:lambda:us-east-1:123456789012:function:Foo`` but not the qualified
+    ``arn:aws:lambda:us-east-1:123456789012:function:Foo:prod``.
+
+    When several patterns match, the most specific one wins: the one with more literal
+    components, left to right. Ties go to the pattern added last.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._counter = 0
+
+    def __bool__(self):
+        return self._counter > 0
+
+    def add(self, pattern: str, value: Any) -> None:
+        node = self._root
+        specificity = []
+        for component in split_arn(pattern):
+            if is_arn_pattern(component):
+                for glob, _, child in node.globs:
+                    if glob == component:
+                        break
+                else:
+                    child = _TrieNode()
+                    node.globs.append((component, re.compile(fnmatch.translate(component)).match, child))
+                node = child
+                # Globs with more literal characters are more specific than a bare "*".
+                specificity.append(len(_GLOB_CHARS.sub("", component)) - 1 if component != "*" else -2)
+            else:
+                node = node.exact.setdefault(component, _TrieNode())
+                specificity.append(len(component) + 1_000_000)
+        self._counter += 1
+        node.values.append((tuple(specificity), self._counter, value))
+
+    def match(self, arn: str) -> Optional[Any]:
+        """
+        Returns the value of the most specific pattern matching ``arn``, or ``None``.
+        """
+        components = split_arn(arn)
+        best = None
+        stack = [(self._root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth == len(components):
+                for candidate in node.values:
+                    if best is None or candidate[:2] > best[:2]:
+                        best = candidate
+                continue
+            component = components[depth]
+            child = node.exact.get(component)
+            if child is not None:
+                stack.append((child, depth + 1))
+            for _, glob_match, child in node.globs:
+                if glob_match(component):
+                    stack.append((child, depth + 1))
+        return None if best is None else best[2]
@@ -0,0 +1,97 @@
+from typing import Any, Optional
+
+import dataclasses
+
+
+class BudgetExceeded(RuntimeError):
+    """
+    Raised when an execution exceeds its ``Budget``.
+
+    ``error`` is ``States.Timeout`` if the execution exceeded
+    the state machine's own ``TimeoutSeconds``.
+    """
+
+    def __init__(self, message: str, error: str=None):
+        super().__init__(message)
+        self.error = error
+
+
+@dataclasses.dataclass
+class Budget:
+    """
+    Limits of a single execution.
+
+    ``max_transitions`` -- maximum number of states entered, including states in branches of Parallel and Map states.
+    ``max_wall_seconds`` -- maximum real time the execution may take, branches included,
+    checked every ``wall_check_interval`` states.
+    ``enforce_timeout_seconds`` -- fail with ``States.Timeout`` once the state machine's ``TimeoutSeconds``
+    have passed on the runner's clock. Has no effect if the runner has no clock.
+    ``detect_cycles`` -- fail as soon as the execution is provably in an infinite loop. If the state machine
+    has ``TimeoutSeconds`` that are enforced, the loop would end in a timeout, and the execution fails
+    with ``States.Timeout`` rather than run until then.
+    """
+
+    max_transitions: Optional[int] = 25000
+    max_wall_seconds: Optional[float] = None
+    wall_check_interval: int = 64
+    enforce_timeout_seconds: bool = True
+    detect_cycles: bool = True
+
+
+def _same_payload(a: Any, b: Any) -> bool:
+    """
+    Equality of payloads that, unlike ``==``, tells ``1`` from ``1.0`` and ``True`` --
+    states such as Choice rules with StringEquals or IsBoolean treat them differently.
+    """
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same_payload(value, b[key]) for key, value in a.items())
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(map(_same_payload, a, b))
+    return a == b
+
+
+class CycleDetector:
+    """
+    Brent's cycle detection over the stream of state indices.
+
+    An execution is in an infinite loop if it returns to a state with the same payload (see ``_same_payload``)
+    without executing any state that could behave differently the second time
+    (a Task, for example). ``step`` returns the length of the cycle once it is detected.
+
+    The payload is compared only when the state index matches, and only states that don't modify
+    payloads in place are considered deterministic, so the stored payload can be kept by reference.
+    """
+
+    __slots__ = ("_power", "_length", "_index", "_payload", "_clean")
+
+    def __init__(self):
+        self._power = 1
+        self._length = 0
+        self._index = -1
+        self._payload = None
+        self._clean = False
+
+    def step(self, index: int, payload: Any, deterministic: bool) -> Optional[int]:
+        if not deterministic:
+            # Anything seen before this state proves nothing -- restart.
+            self._power = 1
+            self._length = 0
+            self._index = -1
+            self._clean = False
+            return None
+
+        self._length += 1
+        if self._clean and index == self._index and _same_payload(payload, self._payload):
+            return self._length
+
+        if self._length == self._power or not self._clean:
+            self._index = index
+            self._payload = payload
+            self._power *= 2
+            self._length = 0
+            self._clean = True
+        return None
@@ -0,0 +1,137 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_all_caches = weakref.WeakSet()
+
+_MISSING = object()
+
+
+def payload_key(payload: Any, resource_arn: str=None) -> Optional[str]:
+    """
+    Canonical hash of a JSON payload -- equal payloads have equal keys regardless of the order of keys.
+    With ``resource_arn``, payloads of different resources have different keys.
+
+    Returns ``None`` if the payload isn't JSON-serializable and so has no reliable key.
+    """
+    try:
+        canonical = json.dumps([resource_arn, payload], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LRU:
+    """
+    Least-recently-used cache of resource provider results.
+
+    Usage:
+
+        @resources.provider("arn:lookup", cache=LRU(maxsize=1024, ttl=60))
+        def lookup(payload):
+            ...
+
+    ``maxsize`` -- maximum number of results kept, ``None`` for unbounded.
+    ``ttl`` -- seconds after which a result expires, ``None`` for never.
+    ``timer`` -- returns the current time in seconds, used for ``ttl``.
+
+    Cached results are shared between calls, so they must not be modified.
+    """
+
+    def __init__(self, maxsize: int=128, ttl: float=None, timer: Callable[[], float]=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: Dict[str, Tuple[float, Any]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        _all_caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def get(self, key: str) -> Any:
+        """
+        Returns the cached value or ``_MISSING``.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > self.timer():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return _MISSING
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = None if self.ttl is None else self.timer() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def wrap(self, provider: Callable, resource_arn: str=None) -> Callable:
+        """
+        Returns ``provider`` memoized in this cache, with keys of ``resource_arn``
+        so that one cache can be shared by providers of different resources.
+        Payloads that aren't JSON-serializable are passed to ``provider`` without caching.
+        """
+
+        def cached_provider(payload):
+            key = payload_key(payload, resource_arn)
+            if key is None:
+                return provider(payload)
+            result = self.get(key)
+            if result is _MISSING:
+                result = provider(payload)
+                self.put(key, result)
+            return result
+
+        cached_provider.cache = self
+        cached_provider.__wrapped__ = provider
+        return cached_provider
+
+
+def clear_all_caches() -> None:
+    """
+    Clears all provider result caches in this process.
+    """
+    for cache in list(_all_caches):
+        cache.clear()
@@ -0,0 +1,199 @@
+"""
+Checkpoints of executions, taken by ``Runner`` at regular intervals so that long executions
+can be resumed with ``Runner.resume`` rather than started over.
+
+A checkpoint is taken between two states of the top-level state machine, or between two attempts
+of a state that is being retried. Parallel and Map states are resumed from their start.
+"""
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Union
+
+import dataclasses
+
+from .clock import Clock
+from .states import Machine
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class CheckpointError(RuntimeError):
+    """
+    Raised when a checkpoint can't be loaded or doesn't belong to the state machine that it is resumed with.
+    """
+
+
+@dataclasses.dataclass
+class Checkpoint:
+    """
+    The state of an execution before it executes ``state`` with ``input``.
+
+    ``retry_attempts`` -- the number of attempts made so far per Retry rule of ``state``, by rule index.
+    ``transitions`` -- the number of states executed so far.
+    ``time``, ``started_at`` -- the time on the clock of the execution, now and when the execution started.
+    ``fingerprint`` -- ``Machine.fingerprint`` of the state machine.
+    """
+
+    state: str
+    input: Any
+    retry_attempts: Dict[int, int] = dataclasses.field(default_factory=dict)
+    transitions: int = 0
+    time: Optional[float] = None
+    started_at: Optional[float] = None
+    fingerprint: Optional[str] = None
+
+    def dumps(self) -> bytes:
+        """
+        Returns the checkpoint as compressed JSON. The input must be JSON-serializable.
+        """
+        return zlib.compress(json.dumps(
+            {
+                "format": CHECKPOINT_FORMAT_VERSION,
+                "state": self.state,
+                "input": self.input,
+                "retry_attempts": [[k, v] for k, v in sorted(self.retry_attempts.items())],
+                "transitions": self.transitions,
+                "time": self.time,
+                "started_at": self.started_at,
+                "fingerprint": self.fingerprint,
+            },
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode("utf-8"))
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Checkpoint":
+        try:
+            raw = json.loads(zlib.decompress(data).decode("utf-8"))
+        except (zlib.error, ValueError) as e:
+            raise CheckpointError(f"Invalid checkpoint: {e}") from e
+        if not isinstance(raw, dict) or raw.get("format") != CHECKPOINT_FORMAT_VERSION:
+            raise CheckpointError(
+                f"Checkpoint format {raw.get('format') if isinstance(raw, dict) else None!r} is not supported"
+            )
+        return cls(
+            state=raw["state"],
+            input=raw["input"],
+            retry_attempts={k: v for k, v in raw["retry_attempts"]},
+            transitions=raw["transitions"],
+            time=raw["time"],
+            started_at=raw["started_at"],
+            fingerprint=raw["fingerprint"],
+        )
+
+
+class Checkpointer:
+    """
+    Takes checkpoints of executions every ``every_transitions`` state executions (retries included)
+    and/or every ``every_seconds`` seconds of wall time.
+
+    Usage:
+
+        checkpointer = Checkpointer(save=lambda data: path.write_bytes(data), every_transitions=1000)
+        runner = Runner(checkpointer=checkpointer)
+        try:
+            runner.run(sm, input=input)
+        except KeyboardInterrupt:
+            pass
+        ...
+        runner.resume(sm, path.read_bytes())
+
+    ``save`` is called with each checkpoint serialized by ``Checkpoint.dumps``.
+    Without ``save``, the last checkpoint is kept in ``latest``.
+    """
+
+    def __init__(
+        self,
+        save: Callable[[bytes], None]=None,
+        every_transitions: int=None,
+        every_seconds: float=None,
+        timer: Callable[[], float]=time.monotonic,
+    ):
+        if every_transitions is None and every_seconds is None:
+            raise ValueError("Set every_transitions or every_seconds")
+        self.save = save
+        self.every_transitions = every_transitions
+        self.every_seconds = every_seconds
+        self.timer = timer
+        self.latest: Optional[bytes] = None
+        self.count = 0
+
+    def _save(self, checkpoint: Checkpoint) -> None:
+        data = checkpoint.dumps()
+        self.count += 1
+        if self.save is not None:
+            self.save(data)
+        else:
+            self.latest = data
+
+    def schedule(self, machine: Machine, started_at: Optional[float], transitions: int=0) -> "_CheckpointSchedule":
+        return _CheckpointSchedule(self, machine, started_at, transitions)
+
+
+class _CheckpointSchedule:
+    """
+    Decides when to take checkpoints of a single execution. Created by ``Runner`` for each execution.
+    """
+
+    def __init__(self, checkpointer: Checkpointer, machine: Machine, started_at: Optional[float], transitions: int):
+        self._checkpointer = checkpointer
+        self._machine = machine
+        self._fingerprint = None
+        self.started_at = started_at
+        self.transitions = transitions
+        self._steps = 0
+        self._last_step = 0
+        self._last_time = checkpointer.timer() if checkpointer.every_seconds is not None else None
+
+    def _is_due(self) -> bool:
+        checkpointer = self._checkpointer
+        self._steps += 1
+        every_transitions = checkpointer.every_transitions
+        if every_transitions is not None and self._steps - self._last_step >= every_transitions:
+            return True
+        return self._last_time is not None and checkpointer.timer() - self._last_time >= checkpointer.every_seconds
+
+    def _take(self, state_name: str, input: Any, retry_attempts: Dict[int, int], clock: Optional[Clock]) -> None:
+        if self._fingerprint is None:
+            self._fingerprint = self._machine.fingerprint()
+        self._checkpointer._save(Checkpoint(
+            state=state_name,
+            input=input,
+            retry_attempts=dict(retry_attempts),
+            transitions=self.transitions,
+            time=clock.now() if clock is not None else None,
+            started_at=self.started_at,
+            fingerprint=self._fingerprint,
+        ))
+        self._last_step = self._steps
+        if self._last_time is not None:
+            self._last_time = self._checkpointer.timer()
+
+    def before_state(self, state_name: str, input: Any, transitions: int, clock: Optional[Clock]) -> None:
+        """
+        Called before executing a state, after ``transitions`` states have been executed.
+        """
+        self.transitions = transitions
+        if self._is_due():
+            self._take(state_name, input, {}, clock)
+
+    def before_retry(self, state_name: str, input: Any, retry_attempts: Dict[int, int], clock: Optional[Clock]) -> None:
+        """
+        Called before executing a state again, after ``retry_attempts`` and waiting for the back-off.
+        """
+        if self._is_due():
+            self._take(state_name, input, retry_attempts, clock)
+
+
+def load_checkpoint(checkpoint: Union[bytes, Checkpoint], machine: Machine) -> Checkpoint:
+    """
+    Loads ``checkpoint`` if it is serialized, and checks that it was taken of an execution of ``machine``.
+    """
+    if not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint.loads(checkpoint)
+    if checkpoint.fingerprint is not None and checkpoint.fingerprint != machine.fingerprint():
+        raise CheckpointError("Checkpoint was taken of an execution of a different state machine")
+    if checkpoint.state not in machine.states:
+        raise CheckpointError(f"State {checkpoint.state!r} of the checkpoint is not in the state machine")
+    return checkpoint
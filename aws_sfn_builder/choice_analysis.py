@@ -0,0 +1,373 @@
+"""
+Static analysis of Choice rules.
+
+The value of each variable, as converted by the comparison operators of one kind
+(``Numeric*``, ``String*``, ``Timestamp*``, ``Boolean*``), is constrained by a rule
+to an ``IntervalSet``. Rules that constrain a variable to disjoint sets can't both match.
+A rule whose set of a variable is covered by the sets of earlier rules never fires.
+
+Values are treated as continuous, so the analysis can miss that a rule is shadowed
+(``BooleanEquals`` true and false don't cover all booleans here), but never reports one that isn't.
+"""
+import bisect
+import collections
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+from .choice_rules import ChoiceRule, Operator
+
+# Comparison kinds, by the prefix of the operator name.
+_KINDS = ("Numeric", "String", "Timestamp", "Boolean")
+
+
+class Interval(NamedTuple):
+    """
+    An interval of values, ``None`` bounds being unbounded.
+    """
+
+    lo: Any
+    lo_closed: bool
+    hi: Any
+    hi_closed: bool
+
+    def is_empty(self) -> bool:
+        if self.lo is None or self.hi is None:
+            return False
+        return self.lo > self.hi or (self.lo == self.hi and not (self.lo_closed and self.hi_closed))
+
+
+def _lo_key(interval: Interval):
+    # Orders intervals by where they start, unbounded first.
+    return (interval.lo is not None, interval.lo, not interval.lo_closed)
+
+
+def _starts_before_end(lo: Interval, hi: Interval) -> bool:
+    """
+    Whether ``hi`` starts no later than ``lo`` ends, so that the two touch or overlap.
+    """
+    if lo.hi is None or hi.lo is None:
+        return True
+    if hi.lo < lo.hi:
+        return True
+    return hi.lo == lo.hi and (hi.lo_closed or lo.hi_closed)
+
+
+class IntervalSet:
+    """
+    A union of disjoint intervals, kept sorted.
+    """
+
+    __slots__ = ("intervals",)
+
+    def __init__(self, intervals: Sequence[Interval]=()):
+        self.intervals: Tuple[Interval, ...] = self._normalize(intervals)
+
+    @staticmethod
+    def _normalize(intervals: Sequence[Interval]) -> Tuple[Interval, ...]:
+        merged: List[Interval] = []
+        for interval in sorted((i for i in intervals if not i.is_empty()), key=_lo_key):
+            if merged and _starts_before_end(merged[-1], interval):
+                last = merged[-1]
+                if last.hi is None or (interval.hi is not None and interval.hi < last.hi):
+                    continue
+                if interval.hi is not None and interval.hi == last.hi:
+                    merged[-1] = last._replace(hi_closed=last.hi_closed or interval.hi_closed)
+                else:
+                    merged[-1] = last._replace(hi=interval.hi, hi_closed=interval.hi_closed)
+            else:
+                merged.append(interval)
+        return tuple(merged)
+
+    @classmethod
+    def everything(cls) -> "IntervalSet":
+        return cls([Interval(None, False, None, False)])
+
+    def is_empty(self) -> bool:
+        return not self.intervals
+
+    def union(self, other: "IntervalSet") -> "IntervalSet":
+        return IntervalSet(self.intervals + other.intervals)
+
+    def complement(self) -> "IntervalSet":
+        result = []
+        lo, lo_closed = None, False
+        for interval in self.intervals:
+            if interval.lo is not None:
+                result.append(Interval(lo, lo_closed, interval.lo, not interval.lo_closed))
+            if interval.hi is None:
+                return IntervalSet(result)
+            lo, lo_closed = interval.hi, not interval.hi_closed
+        result.append(Interval(lo, lo_closed, None, False))
+        return IntervalSet(result)
+
+    def intersection(self, other: "IntervalSet") -> "IntervalSet":
+        # A ∩ B = not (not A ∪ not B) -- linear in the number of intervals.
+        return self.complement().union(other.complement()).complement()
+
+    def isdisjoint(self, other: "IntervalSet") -> bool:
+        return self.intersection(other).is_empty()
+
+    def issubset(self, other: "IntervalSet") -> bool:
+        return self.intersection(other.complement()).is_empty()
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and self.intervals == other.intervals
+
+    def __repr__(self):
+        parts = []
+        for i in self.intervals:
+            parts.append(
+                f"{'[' if i.lo_closed else '('}{'-inf' if i.lo is None else repr(i.lo)}, "
+                f"{'+inf' if i.hi is None else repr(i.hi)}{']' if i.hi_closed else ')'}"
+            )
+        return f"<{self.__class__.__name__} {' | '.join(parts) or 'empty'}>"
+
+
+class IntervalIndex:
+    """
+    A union of intervals that are added one at a time, kept as sorted disjoint intervals
+    so that adding and looking up an interval are bisections rather than scans.
+
+    Each interval remembers the sources that it was merged from.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple] = []
+        self._intervals: List[Interval] = []
+        self._sources: List[FrozenSet] = []
+
+    def add(self, values: IntervalSet, source: Any) -> None:
+        for interval in values.intervals:
+            self._add(interval, source)
+
+    def _add(self, interval: Interval, source: Any) -> None:
+        intervals = self._intervals
+        start = end = bisect.bisect_left(self._keys, _lo_key(interval))
+        if start > 0 and _starts_before_end(intervals[start - 1], interval):
+            start -= 1
+        while end < len(intervals) and _starts_before_end(interval, intervals[end]):
+            end += 1
+        merged, = IntervalSet(intervals[start:end] + [interval]).intervals
+        if end - start == 1 and merged == intervals[start]:
+            # Already covered, so the source adds nothing.
+            return
+        sources = frozenset([source]).union(*self._sources[start:end])
+        self._keys[start:end] = [_lo_key(merged)]
+        self._intervals[start:end] = [merged]
+        self._sources[start:end] = [sources]
+
+    def covers(self, values: IntervalSet) -> Optional[FrozenSet]:
+        """
+        Returns the sources of the intervals that ``values`` lies in, or ``None`` if it isn't covered.
+        """
+        sources = frozenset()
+        for interval in values.intervals:
+            i = bisect.bisect_right(self._keys, _lo_key(interval)) - 1
+            if i < 0 or not IntervalSet([interval]).issubset(IntervalSet([self._intervals[i]])):
+                return None
+            sources |= self._sources[i]
+        return sources
+
+    def __len__(self):
+        return len(self._intervals)
+
+
+# A constrained value: the variable and the kind of comparison that converts it.
+Key = Tuple[str, str]
+
+
+def _kind(operator: Operator) -> Optional[str]:
+    for kind in _KINDS:
+        if operator.name.startswith(kind):
+            return kind
+    return None
+
+
+def _is_analysable(operator: Operator) -> bool:
+    """
+    Whether all comparisons in ``operator`` are of a known kind and compare to values of the right type.
+    """
+    if operator.name in ("And", "Or"):
+        return all(_is_analysable(item) for item in operator.value)
+    elif operator.name == "Not":
+        return _is_analysable(operator.value)
+    kind = _kind(operator)
+    if kind == "Numeric":
+        return isinstance(operator.value, (int, float))
+    elif kind in ("String", "Timestamp"):
+        return isinstance(operator.value, str)
+    return kind == "Boolean"
+
+
+def _comparison_set(operator: Operator) -> IntervalSet:
+    value = operator.value
+    comparison = operator.name[len(_kind(operator)):]
+    if comparison == "Equals":
+        return IntervalSet([Interval(value, True, value, True)])
+    elif comparison == "GreaterThan":
+        return IntervalSet([Interval(value, False, None, False)])
+    elif comparison == "GreaterThanEquals":
+        return IntervalSet([Interval(value, True, None, False)])
+    elif comparison == "LessThan":
+        return IntervalSet([Interval(None, False, value, False)])
+    elif comparison == "LessThanEquals":
+        return IntervalSet([Interval(None, False, value, True)])
+    raise ValueError(operator.name)
+
+
+def operator_keys(operator: Operator) -> FrozenSet[Key]:
+    """
+    Returns ``(variable, kind)`` of all comparisons in ``operator``.
+    """
+    if operator.name in ("And", "Or"):
+        return frozenset().union(*(operator_keys(item) for item in operator.value))
+    elif operator.name == "Not":
+        return operator_keys(operator.value)
+    return frozenset([(operator.variable, _kind(operator))])
+
+
+def _single_key_set(operator: Operator) -> IntervalSet:
+    if operator.name == "And":
+        result = IntervalSet.everything()
+        for item in operator.value:
+            result = result.intersection(_single_key_set(item))
+        return result
+    elif operator.name == "Or":
+        result = IntervalSet()
+        for item in operator.value:
+            result = result.union(_single_key_set(item))
+        return result
+    elif operator.name == "Not":
+        return _single_key_set(operator.value).complement()
+    return _comparison_set(operator)
+
+
+def operator_constraints(operator: Operator) -> Optional[Dict[Key, IntervalSet]]:
+    """
+    Returns the set of values that each variable must have for ``operator`` to match,
+    or ``None`` if the operator can't be expressed as independent constraints per variable
+    (``Or`` and ``Not`` over more than one variable).
+    """
+    if not _is_analysable(operator):
+        return None
+    keys = operator_keys(operator)
+    if len(keys) == 1:
+        key, = keys
+        return {key: _single_key_set(operator)}
+    if operator.name != "And":
+        return None
+    constraints: Dict[Key, IntervalSet] = {}
+    for item in operator.value:
+        item_constraints = operator_constraints(item)
+        if item_constraints is None:
+            return None
+        for key, values in item_constraints.items():
+            constraints[key] = constraints[key].intersection(values) if key in constraints else values
+    return constraints
+
+
+def rule_constraints(choice_rule: ChoiceRule) -> Optional[Dict[Key, IntervalSet]]:
+    return operator_constraints(choice_rule.operator)
+
+
+def are_exclusive(a: Optional[Dict[Key, IntervalSet]], b: Optional[Dict[Key, IntervalSet]]) -> bool:
+    """
+    Whether two rules, given by their constraints, provably can't both match and can be evaluated
+    in either order.
+
+    Both must constrain the same variables with the same kinds of comparisons, so that an input
+    on which evaluating one fails (a missing variable, a value that can't be converted) also
+    fails or doesn't match the other.
+    """
+    if a is None or b is None or a.keys() != b.keys():
+        return False
+    return any(a[key].isdisjoint(b[key]) for key in a)
+
+
+def reorder_rules(choices: List[ChoiceRule], hits: Sequence[int]) -> List[int]:
+    """
+    Returns the positions of ``choices`` in the order in which they should be evaluated:
+    the rules with the most ``hits`` first, but never ahead of an earlier rule
+    that they are not provably exclusive with.
+    """
+    if len(hits) != len(choices):
+        raise ValueError(f"Expected hits of {len(choices)} rules, got {len(hits)}")
+    constraints = [rule_constraints(rule) for rule in choices]
+    # blockers[j] -- earlier rules that must stay ahead of rule j.
+    blockers = [
+        {i for i in range(j) if not are_exclusive(constraints[i], constraints[j])}
+        for j in range(len(choices))
+    ]
+    order = []
+    placed = set()
+    remaining = list(range(len(choices)))
+    while remaining:
+        available = [j for j in remaining if blockers[j] <= placed]
+        best = max(available, key=lambda j: (hits[j], -j))
+        order.append(best)
+        placed.add(best)
+        remaining.remove(best)
+    return order
+
+
+def _coverage(operator: Operator) -> Dict[Key, IntervalSet]:
+    """
+    Returns sets of values such that, for any input in which a variable has a value in its set,
+    ``operator`` either matches or fails -- so no later rule is evaluated on that input.
+    """
+    if not _is_analysable(operator):
+        return {}
+    keys = operator_keys(operator)
+    if len(keys) == 1:
+        key, = keys
+        return {key: _single_key_set(operator)}
+    if operator.name == "Or":
+        coverage: Dict[Key, IntervalSet] = {}
+        for item in operator.value:
+            for key, values in _coverage(item).items():
+                coverage[key] = coverage[key].union(values) if key in coverage else values
+        return coverage
+    return {}
+
+
+class ShadowedRule(NamedTuple):
+    index: int  # position of the rule in Choices
+    next: str
+    shadowed_by: Tuple[int, ...]  # earlier rules that together cover it, () if it can't match any input
+
+
+class ChoiceAnalysis(NamedTuple):
+    shadowed: List[ShadowedRule]
+    unreachable: List[str]  # Next targets that only shadowed rules lead to
+
+
+def analyze_choice(choice) -> ChoiceAnalysis:
+    """
+    Finds rules of ``choice`` that never fire, see ``Choice.analyze``.
+
+    Earlier rules are accumulated per variable in an ``IntervalIndex``, so each rule
+    is checked with a bisection per interval rather than against every earlier rule.
+    """
+    covered: Dict[Key, IntervalIndex] = collections.defaultdict(IntervalIndex)
+    shadowed = []
+    for i, choice_rule in enumerate(choice.choices):
+        constraints = rule_constraints(choice_rule)
+        if constraints is not None:
+            if any(values.is_empty() for values in constraints.values()):
+                shadowed.append(ShadowedRule(i, choice_rule.next, ()))
+            else:
+                for key, values in constraints.items():
+                    sources = covered[key].covers(values) if key in covered else None
+                    if sources is not None:
+                        shadowed.append(ShadowedRule(i, choice_rule.next, tuple(sorted(sources))))
+                        break
+        for key, values in _coverage(choice_rule.operator).items():
+            covered[key].add(values, i)
+
+    shadowed_indices = {rule.index for rule in shadowed}
+    live = {rule.next for i, rule in enumerate(choice.choices) if i not in shadowed_indices}
+    live.add(choice.default)
+    unreachable = []
+    for rule in shadowed:
+        if rule.next not in live and rule.next not in unreachable:
+            unreachable.append(rule.next)
+    return ChoiceAnalysis(shadowed, unreachable)
@@ -0,0 +1,276 @@
+"""
+Columnar evaluation of a Choice state over a batch of inputs -- see ``Choice.route_batch``.
+
+The value of every ``Variable`` is pulled out of all records into a column once, and converted once
+for each kind of comparison (``Numeric*``, ``String*``, ``Timestamp*``, ``Boolean*``).
+Comparisons produce masks over the whole batch, which ``And``, ``Or`` and ``Not`` combine.
+
+Masks are NumPy boolean arrays if NumPy is installed. Otherwise they are bit sets in Python integers
+and numeric columns are ``array.array("d")``.
+
+Alongside each mask of matches goes a mask of records on which evaluation fails, so that
+short-circuiting ``And`` and ``Or`` fail on exactly the records that ``Choice.execute`` fails on.
+"""
+import array
+import itertools
+import operator
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .choice_rules import Operator, Operators, to_bool, to_numeric, to_timestamp
+from .paths import compile_getter, parse_path
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+_COMPARISONS = {
+    "Equals": operator.eq,
+    "GreaterThan": operator.gt,
+    "GreaterThanEquals": operator.ge,
+    "LessThan": operator.lt,
+    "LessThanEquals": operator.le,
+}
+
+# Integers beyond this lose precision as floats.
+_MAX_EXACT_FLOAT = 2 ** 53
+
+_BITS = bytes.maketrans(b"01", b"\x00\x01")
+_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+class _NumpyMasks:
+    def __init__(self, size: int):
+        self.size = size
+        self.none = numpy.zeros(size, dtype=bool)
+        self.all = numpy.ones(size, dtype=bool)
+
+    def from_bools(self, bools: Iterable[bool]):
+        return numpy.fromiter(bools, dtype=bool, count=self.size)
+
+    def numeric_column(self, values: List, exact: bool):
+        return numpy.array(values, dtype=float if exact else object)
+
+    def object_column(self, values: List):
+        column = numpy.empty(self.size, dtype=object)
+        column[:] = values
+        return column
+
+    def compare(self, column, op: Callable, value):
+        return numpy.asarray(op(column, value), dtype=bool)
+
+    def indices(self, mask) -> List[int]:
+        return numpy.flatnonzero(mask).tolist()
+
+
+class _BitMasks:
+    """
+    Masks as bit sets: bit ``i`` of the integer is set if record ``i`` is in the mask.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.none = 0
+        self.all = (1 << size) - 1
+
+    def from_bools(self, bools: Iterable[bool]) -> int:
+        flags = bytes(bytearray(bools))
+        if not flags:
+            return 0
+        return int(flags[::-1].translate(_DIGITS), 2)
+
+    def numeric_column(self, values: List, exact: bool):
+        return array.array("d", values) if exact else values
+
+    def object_column(self, values: List):
+        return values
+
+    def compare(self, column, op: Callable, value) -> int:
+        return self.from_bools(op(x, value) for x in column)
+
+    def indices(self, mask: int) -> List[int]:
+        flags = format(mask, f"0{self.size}b")[::-1].encode().translate(_BITS)
+        return list(itertools.compress(range(self.size), flags))
+
+
+def _convert_each(convert: Callable, values: List, placeholder: Any, masks) -> Tuple[List, Any]:
+    """
+    Converts ``values`` one by one, returning ``placeholder`` for the ones that fail to convert
+    along with the mask of those.
+    """
+    converted = []
+    failed = []
+    for value in values:
+        try:
+            converted.append(convert(value))
+            failed.append(False)
+        except Exception:
+            converted.append(placeholder)
+            failed.append(True)
+    return converted, masks.from_bools(failed)
+
+
+def _kind(name: str) -> Optional[str]:
+    for kind in ("Numeric", "String", "Timestamp", "Boolean"):
+        if name.startswith(kind):
+            return kind
+    return None
+
+
+class _Batch:
+    """
+    Columns of a batch of records and the masks of operators evaluated over them.
+    """
+
+    def __init__(self, records: List):
+        self.records = records
+        self.masks = _NumpyMasks(len(records)) if numpy is not None else _BitMasks(len(records))
+        self._raw: Dict[str, Tuple[List, Any]] = {}
+        self._columns: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
+
+    def raw(self, variable: str) -> Tuple[List, Any]:
+        """
+        Values of ``variable`` in all records, and the mask of records that don't have it.
+        """
+        if variable not in self._raw:
+            get = compile_getter(variable)
+            try:
+                keys = parse_path(variable)
+                if keys is None:
+                    values = [get(record) for record in self.records]
+                else:
+                    values = self.records
+                    for key in keys:
+                        values = list(map(operator.itemgetter(key), values))
+                self._raw[variable] = values, self.masks.none
+            except Exception:
+                self._raw[variable] = _convert_each(get, self.records, None, self.masks)
+        return self._raw[variable]
+
+    def column(self, variable: str, kind: str) -> Tuple[Any, Any]:
+        """
+        Values of ``variable`` converted for comparisons of ``kind``, and the mask of records
+        on which the conversion fails.
+        """
+        key = (variable, kind)
+        if key not in self._columns:
+            values, missing = self.raw(variable)
+            convert = {"Numeric": to_numeric, "String": str, "Timestamp": to_timestamp, "Boolean": to_bool}[kind]
+            types = set(map(type, values))
+            try:
+                if types == {int} and kind == "Numeric":
+                    converted, failed = values, missing
+                elif types == {str} and kind == "String":
+                    converted, failed = values, missing
+                else:
+                    converted, failed = list(map(convert, values)), missing
+            except Exception:
+                converted, failed = _convert_each(convert, values, 0 if kind == "Numeric" else "", self.masks)
+                failed = failed | missing
+            if kind == "Numeric":
+                # to_numeric only returns ints and floats.
+                ints = converted if types == {int} else [x for x in converted if type(x) is int]
+                exact = not ints or -_MAX_EXACT_FLOAT <= min(ints) and max(ints) <= _MAX_EXACT_FLOAT
+                column = self.masks.numeric_column(converted, exact)
+            elif kind == "Boolean":
+                column = self.masks.from_bools(converted)
+            else:
+                column = self.masks.object_column(converted)
+            self._columns[key] = column, failed
+        return self._columns[key]
+
+    def _each(self, op: Operator) -> Tuple[Any, Any]:
+        # Evaluates a comparison record by record, for values that columns can't compare.
+        values, missing = self.raw(op.variable)
+        impl = Operators.ALL[op.name].impl
+        matched = []
+        failed = []
+        for value in values:
+            try:
+                matched.append(bool(impl(op.value, value)))
+                failed.append(False)
+            except Exception:
+                matched.append(False)
+                failed.append(True)
+        failed = self.masks.from_bools(failed) | missing
+        return self.masks.from_bools(matched) & (self.masks.all ^ failed), failed
+
+    def evaluate(self, op: Operator) -> Tuple[Any, Any]:
+        """
+        Returns the masks of records that ``op`` matches and of records on which it fails.
+        The two are disjoint.
+        """
+        masks = self.masks
+        if op.name == "Not":
+            matched, failed = self.evaluate(op.value)
+            return masks.all ^ (matched | failed), failed
+
+        if op.name == "And":
+            # Records that all operands so far have matched; the rest are decided.
+            pending, failed = masks.all, masks.none
+            for item in op.value:
+                item_matched, item_failed = self.evaluate(item)
+                failed = failed | (pending & item_failed)
+                pending = pending & item_matched
+            return pending, failed
+
+        if op.name == "Or":
+            # Records that no operand so far has matched or failed on.
+            pending, matched, failed = masks.all, masks.none, masks.none
+            for item in op.value:
+                item_matched, item_failed = self.evaluate(item)
+                failed = failed | (pending & item_failed)
+                matched = matched | (pending & item_matched)
+                pending = pending & (masks.all ^ (item_matched | item_failed))
+            return matched, failed
+
+        kind = _kind(op.name)
+        value = op.value
+        if kind == "Boolean":
+            column, failed = self.column(op.variable, kind)
+            if value is True:
+                matched = column
+            elif value is False:
+                matched = masks.all ^ column
+            else:
+                matched = masks.none
+            return matched & (masks.all ^ failed), failed
+
+        if kind == "Numeric":
+            comparable = isinstance(value, (int, float))
+        else:
+            comparable = isinstance(value, str)
+        if not comparable:
+            return self._each(op)
+        column, failed = self.column(op.variable, kind)
+        matched = masks.compare(column, _COMPARISONS[op.name[len(kind):]], value)
+        return matched & (masks.all ^ failed), failed
+
+
+def route_batch(choice, records: Iterable, errors: str="raise") -> List[Optional[str]]:
+    """
+    Returns the name of the next state for each of ``records``, see ``Choice.route_batch``.
+    """
+    if errors not in ("raise", "ignore"):
+        raise ValueError(f"errors must be 'raise' or 'ignore', got {errors!r}")
+    records = list(records)
+    batch = _Batch(records)
+    masks = batch.masks
+    routes = [choice.default] * len(records)
+    pending = masks.all
+    all_failed = masks.none
+    for choice_rule in choice.choices:
+        matched, failed = batch.evaluate(choice_rule.operator)
+        for i in masks.indices(pending & matched):
+            routes[i] = choice_rule.next
+        all_failed = all_failed | (pending & failed)
+        pending = pending & (masks.all ^ (matched | failed))
+
+    failed_indices = masks.indices(all_failed)
+    if failed_indices:
+        if errors == "raise":
+            # Raises the same exception as executing the first failing record would.
+            choice.execute(records[failed_indices[0]])
+        for i in failed_indices:
+            routes[i] = None
+    return routes
@@ -0,0 +1,186 @@
+import sys
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+from .states import Choice
+
+
+class RuleStats(NamedTuple):
+    state: str
+    index: Optional[int]  # position of the rule in Choices, or None for Default
+    next: Optional[str]
+    hits: int
+    evaluations: int
+    cost_ns: int
+
+
+class ChoiceProfile:
+    """
+    Counters of a single Choice state, indexed by the position of the rule in ``Choices``.
+
+    ``evaluations[i]`` -- how many times rule ``i`` was evaluated.
+    ``hits[i]`` -- how many times rule ``i`` matched.
+    ``cost_ns[i]`` -- total time spent evaluating rule ``i``.
+    ``default_hits`` -- how many times no rule matched.
+    ``errors`` -- how many times evaluation of a rule failed.
+
+    ``name`` is the name of the state, ``label`` tells it apart from other profiled states of the same name.
+    """
+
+    def __init__(self, choice: Choice, label: str=None):
+        # Keeps the state alive so that its id, which the profiler knows it by, can't be reused.
+        self.choice = choice
+        self.name = choice.name
+        self.label = label or choice.name
+        self.rule_nexts = [rule.next for rule in choice.choices]
+        self.default = choice.default
+        size = len(choice.choices)
+        self.hits = [0] * size
+        self.evaluations = [0] * size
+        self.cost_ns = [0] * size
+        self.default_hits = 0
+        self.errors = 0
+        self.executions = 0
+        self._lock = threading.Lock()
+
+    def record(self, matched: Optional[int], costs: List[int], error: bool=False) -> None:
+        """
+        Records an execution in which rules ``0 .. len(costs) - 1`` were evaluated
+        and rule ``matched`` (``None`` for Default) matched, or, with ``error``, the last one failed.
+        """
+        with self._lock:
+            self.executions += 1
+            evaluations = self.evaluations
+            cost_ns = self.cost_ns
+            for i, cost in enumerate(costs):
+                evaluations[i] += 1
+                cost_ns[i] += cost
+            if error:
+                self.errors += 1
+            elif matched is None:
+                self.default_hits += 1
+            else:
+                self.hits[matched] += 1
+
+    @property
+    def average_path_length(self) -> float:
+        """
+        Average number of rules evaluated per execution.
+        """
+        if not self.executions:
+            return 0.0
+        return sum(self.evaluations) / self.executions
+
+    def rules(self) -> List[RuleStats]:
+        """
+        Statistics of all rules and of the Default, in the order they are evaluated.
+        """
+        rules = [
+            RuleStats(self.label, i, self.rule_nexts[i], self.hits[i], self.evaluations[i], self.cost_ns[i])
+            for i in range(len(self.hits))
+        ]
+        rules.append(RuleStats(self.label, None, self.default, self.default_hits, 0, 0))
+        return rules
+
+    def uncovered(self) -> List[int]:
+        """
+        Positions of rules that never matched.
+        """
+        return [i for i, hits in enumerate(self.hits) if not hits]
+
+
+class ChoiceProfiler:
+    """
+    Counts which Choice rules match and how much their evaluation costs.
+
+    Usage:
+
+        profiler = ChoiceProfiler()
+        runner = Runner(choice_profiler=profiler)
+        for input in replayed_inputs:
+            runner.run(sm, input=input)
+        profiler.print_report()
+
+    Each Choice state object has its own profile. ``profiles`` holds them by label: the name of the state,
+    followed by `` [2]``, `` [3]`` and so on for further states of the same name -- in other branches
+    or state machines -- in the order they were first executed. Without a profiler, Choice states are
+    executed as usual, with no counting at all.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[str, ChoiceProfile] = {}
+        self._by_state: Dict[int, ChoiceProfile] = {}
+        self._lock = threading.Lock()
+
+    def profile(self, choice: Choice) -> ChoiceProfile:
+        profile = self._by_state.get(id(choice))
+        if profile is None:
+            with self._lock:
+                profile = self._by_state.get(id(choice))
+                if profile is None:
+                    label = choice.name
+                    number = 1
+                    while label in self.profiles:
+                        number += 1
+                        label = f"{choice.name} [{number}]"
+                    profile = self.profiles[label] = ChoiceProfile(choice, label=label)
+                    self._by_state[id(choice)] = profile
+        return profile
+
+    def execute(self, choice: Choice, input) -> Tuple[Optional[str], Any]:
+        """
+        Executes ``choice`` like ``Choice.execute`` does, counting the rules evaluated.
+        """
+        profile = self.profile(choice)
+        costs = []
+        perf_counter_ns = time.perf_counter_ns
+        try:
+            for i, choice_rule in enumerate(choice.choices):
+                started_ns = perf_counter_ns()
+                matched = choice_rule.matches(input)
+                costs.append(perf_counter_ns() - started_ns)
+                if matched:
+                    profile.record(i, costs)
+                    return choice_rule.next, input
+        except Exception:
+            costs.append(perf_counter_ns() - started_ns)
+            profile.record(None, costs, error=True)
+            raise
+        profile.record(None, costs)
+        return choice.default, input
+
+    def hottest_rules(self, limit: int=None) -> List[RuleStats]:
+        """
+        Rules of all profiled Choice states, the ones that matched most often first.
+        """
+        rules = [rule for profile in self.profiles.values() for rule in profile.rules()]
+        rules.sort(key=lambda r: r.hits, reverse=True)
+        return rules[:limit] if limit else rules
+
+    def report(self, limit: int=None) -> str:
+        header = ("State", "Rule", "Next", "Hits", "Hit %", "Evaluations", "Avg ns", "Avg path")
+        rows = [header]
+        for rule in self.hottest_rules(limit=limit):
+            profile = self.profiles[rule.state]
+            rows.append((
+                rule.state,
+                "Default" if rule.index is None else str(rule.index),
+                str(rule.next),
+                str(rule.hits),
+                f"{100 * rule.hits / profile.executions:.1f}" if profile.executions else "-",
+                str(rule.evaluations),
+                str(rule.cost_ns // rule.evaluations) if rule.evaluations else "-",
+                f"{profile.average_path_length:.2f}",
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for row in rows:
+            lines.append("  ".join(
+                cell.ljust(widths[i]) if i < 3 else cell.rjust(widths[i])
+                for i, cell in enumerate(row)
+            ).rstrip())
+        return "\n".join(lines)
+
+    def print_report(self, limit: int=None, file: Optional[TextIO]=None) -> None:
+        print(self.report(limit=limit), file=file or sys.stdout)
@@ -3,9 +3,9 @@ from typing import Any, Callable, Dict
 
 import dataclasses
 from bidict import bidict
-from jsonpath_ng import parse as parse_jsonpath
 
 from .base import Node
+from .paths import get_path
 
 
 class _OperatorDef:
@@ -109,7 +109,7 @@ class Operator(Node):
 
     def matches(self, input) -> bool:
         if self.name == "Not":
-            return not self.value[0].matches(input)
+            return not self.value.matches(input)
 
         elif self.name == "Or":
             return any(v.matches(input) for v in self.value)
@@ -118,8 +118,7 @@ class Operator(Node):
             return all(v.matches(input) for v in self.value)
 
         else:
-            path = parse_jsonpath(self.variable)
-            check_value = path.find(input)[0].value
+            check_value = get_path(input, self.variable)
             return Operators.ALL[self.name].impl(self.value, check_value)
 
 
@@ -0,0 +1,82 @@
+import time
+
+
+class Clock:
+    """
+    Source of time for executions -- used by Wait states and Retry back-off.
+    """
+
+    def now(self) -> float:
+        """
+        Current time in seconds since the epoch.
+        """
+        raise NotImplementedError()
+
+    def sleep(self, seconds: float) -> None:
+        raise NotImplementedError()
+
+    def fork(self) -> "Clock":
+        """
+        Returns a clock for a branch that runs in parallel with others.
+        """
+        return self
+
+    def join(self, forks) -> None:
+        """
+        Called when all branches running on ``forks`` have finished.
+        """
+        pass
+
+    def restore(self, now: float) -> None:
+        """
+        Called when an execution is resumed from a checkpoint taken at ``now``.
+        Clocks that can be set, set their time to ``now``.
+        """
+        pass
+
+
+class WallClock(Clock):
+    """
+    Real time. Waits and back-offs actually sleep.
+    """
+
+    def now(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Simulated time. Waits and back-offs advance the clock instantly,
+    so executions with hours of waiting finish in milliseconds.
+
+    Starts at ``start`` seconds since the epoch, or at the current time if not specified.
+    """
+
+    def __init__(self, start: float=None):
+        self._now = time.time() if start is None else float(start)
+
+    def now(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self._now += seconds
+
+    def fork(self) -> "VirtualClock":
+        return VirtualClock(start=self._now)
+
+    def restore(self, now: float) -> None:
+        self._now = float(now)
+
+    def join(self, forks) -> None:
+        # Branches wait in parallel -- the parent has waited for the slowest one.
+        for fork in forks:
+            if fork._now > self._now:
+                self._now = fork._now
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self._now}>"
@@ -0,0 +1,242 @@
+"""
+Structural diff of state machines -- see ``Machine.diff``.
+
+States are matched by name. States with generated names (the ``Parallel`` and ``Sequence``
+states that list notation creates) are matched by how they are reached instead:
+``a.Next`` is the generated state that follows ``a``, ``StartAt`` the one that the sequence starts at.
+
+Every state and sequence gets a hash of its whole subtree, so identical
+branches and sequences are skipped without looking inside them.
+"""
+import collections
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import dataclasses
+
+from .base import _compile_node_value
+from .caching import payload_key
+from .states import Choice, Machine, Map, Parallel, Sequence, State
+
+_GENERATED_NAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$")
+
+# Fields that hold nested sequences rather than values.
+_NESTED_FIELDS = ("branches", "iterator", "states")
+
+
+def _hash(value: Any) -> str:
+    # Compiled fields are JSON, but a hash of the repr is still better than no hash at all.
+    return payload_key(value) or payload_key(repr(value))
+
+
+@dataclasses.dataclass(frozen=True)
+class Edit:
+    """
+    A single difference between two state machines.
+
+    ``kind`` is one of:
+
+    * ``"added"``, ``"removed"`` -- a state, or a branch of a Parallel state.
+    * ``"changed"`` -- a field of a state, ``field`` being its States Language name.
+    * ``"edge"`` -- a transition: ``field`` is ``"StartAt"``, ``"Next"``, ``"Default"``,
+      ``"Choices[i].Next"`` or ``"Catch[i].Next"``.
+
+    ``path`` is the tuple of names of the enclosing states (and branch indices) and the name of the state.
+    """
+
+    kind: str
+    path: Tuple[str, ...]
+    field: Optional[str] = None
+    old: Any = None
+    new: Any = None
+
+
+def _edges(state: State) -> List[Tuple[str, str]]:
+    """
+    Returns ``(field, target)`` of all transitions of ``state``.
+    """
+    edges = []
+    if state.next is not None:
+        edges.append(("Next", state.next))
+    if isinstance(state, Choice):
+        for i, rule in enumerate(state.choices):
+            edges.append((f"Choices[{i}].Next", rule.next))
+        if state.default is not None:
+            edges.append(("Default", state.default))
+    for i, catcher in enumerate(getattr(state, "catch", None) or ()):
+        edges.append((f"Catch[{i}].Next", catcher.get("Next")))
+    return edges
+
+
+class _Digest:
+    """
+    Labels and subtree hashes of all states of a machine, computed once per diff.
+    """
+
+    def __init__(self):
+        self._labels: Dict[int, Dict[str, str]] = {}
+        self._hashes: Dict[int, str] = {}
+
+    def labels(self, sequence: Sequence) -> Dict[str, str]:
+        """
+        Maps state names of ``sequence`` to labels that are stable across re-parses.
+        """
+        labels = self._labels.get(id(sequence))
+        if labels is not None:
+            return labels
+        labels = {name: name for name in sequence.states if not _GENERATED_NAME.match(name)}
+        queue = collections.deque([(sequence.start_at, "StartAt")] if sequence.start_at is not None else [])
+        seen = set()
+        while queue:
+            name, label = queue.popleft()
+            if name in seen or name not in sequence.states:
+                continue
+            seen.add(name)
+            labels.setdefault(name, label)
+            for field, target in _edges(sequence.states[name]):
+                queue.append((target, f"{labels[name]}.{field.replace('.Next', '')}"))
+        for name in sequence.states:
+            labels.setdefault(name, name)
+        self._labels[id(sequence)] = labels
+        return labels
+
+    def fields(self, state: State) -> Dict[str, Any]:
+        """
+        Compiled fields of ``state`` other than transitions and nested sequences, by States Language name.
+        """
+        c = {}
+        for f, sl_name in state._FIELDS.items():
+            value = getattr(state, f, None)
+            if value is not None and f not in _NESTED_FIELDS:
+                c[sl_name] = _compile_node_value(value)
+        state.compile_dict(c)
+        c.pop("Next", None)
+        c.pop("End", None)
+        c.pop("Default", None)
+        c.pop("StartAt", None)
+        for key in ("Choices", "Catch"):
+            if key in c:
+                c[key] = [{k: v for k, v in item.items() if k != "Next"} for item in c[key]]
+        return c
+
+    def nested(self, state: State) -> List[Tuple[str, Sequence]]:
+        if isinstance(state, Parallel):
+            return [(str(i), branch) for i, branch in enumerate(state.branches)]
+        if isinstance(state, Map) and state.iterator is not None:
+            return [("Iterator", state.iterator)]
+        return []
+
+    def state_hash(self, state: State, labels: Dict[str, str]) -> str:
+        key = id(state)
+        if key not in self._hashes:
+            self._hashes[key] = _hash([
+                self.fields(state),
+                [(field, labels.get(target, target)) for field, target in _edges(state)],
+                [(key, self.subtree_hash(nested)) for key, nested in self.nested(state)],
+                self.hash(state) if isinstance(state, Sequence) else None,
+            ])
+        return self._hashes[key]
+
+    def subtree_hash(self, node: State) -> str:
+        # Branches in list notation can be Parallel states rather than sequences.
+        if isinstance(node, Sequence):
+            return self.hash(node)
+        return self.state_hash(node, {})
+
+    def hash(self, sequence: Sequence) -> str:
+        """
+        Hash of the whole subtree of ``sequence``.
+        """
+        key = ("sequence", id(sequence))
+        if key not in self._hashes:
+            labels = self.labels(sequence)
+            self._hashes[key] = _hash([
+                labels.get(sequence.start_at),
+                sorted((labels[name], self.state_hash(state, labels)) for name, state in sequence.states.items()),
+            ])
+        return self._hashes[key]
+
+
+def _diff_sequence(
+    old: Sequence, new: Sequence, path: Tuple[str, ...],
+    old_digest: _Digest, new_digest: _Digest, edits: List[Edit],
+) -> None:
+    if old_digest.hash(old) == new_digest.hash(new):
+        return
+    old_labels = old_digest.labels(old)
+    new_labels = new_digest.labels(new)
+
+    old_start = old_labels.get(old.start_at, old.start_at)
+    new_start = new_labels.get(new.start_at, new.start_at)
+    if old_start != new_start:
+        edits.append(Edit("edge", path, "StartAt", old_start, new_start))
+
+    old_states = {old_labels[name]: state for name, state in old.states.items()}
+    new_states = {new_labels[name]: state for name, state in new.states.items()}
+    for label in old_states:
+        if label not in new_states:
+            edits.append(Edit("removed", path + (label,)))
+    for label, new_state in new_states.items():
+        if label not in old_states:
+            edits.append(Edit("added", path + (label,)))
+        else:
+            _diff_state(
+                old_states[label], new_state, path + (label,),
+                old_labels, new_labels, old_digest, new_digest, edits,
+            )
+
+
+def _diff_state(
+    old: State, new: State, path: Tuple[str, ...],
+    old_labels: Dict[str, str], new_labels: Dict[str, str],
+    old_digest: _Digest, new_digest: _Digest, edits: List[Edit],
+) -> None:
+    if old_digest.state_hash(old, old_labels) == new_digest.state_hash(new, new_labels):
+        return
+
+    old_fields = old_digest.fields(old)
+    new_fields = new_digest.fields(new)
+    for sl_name in list(old_fields) + [k for k in new_fields if k not in old_fields]:
+        if old_fields.get(sl_name) != new_fields.get(sl_name):
+            edits.append(Edit("changed", path, sl_name, old_fields.get(sl_name), new_fields.get(sl_name)))
+
+    old_edges = {field: old_labels.get(target, target) for field, target in _edges(old)}
+    new_edges = {field: new_labels.get(target, target) for field, target in _edges(new)}
+    for field in list(old_edges) + [k for k in new_edges if k not in old_edges]:
+        if old_edges.get(field) != new_edges.get(field):
+            edits.append(Edit("edge", path, field, old_edges.get(field), new_edges.get(field)))
+
+    old_nested = dict(old_digest.nested(old))
+    new_nested = dict(new_digest.nested(new))
+    for key in old_nested:
+        if key not in new_nested:
+            edits.append(Edit("removed", path + (key,)))
+    for key, new_sequence in new_nested.items():
+        if key not in old_nested:
+            edits.append(Edit("added", path + (key,)))
+        elif isinstance(new_sequence, Sequence) and isinstance(old_nested[key], Sequence):
+            _diff_sequence(old_nested[key], new_sequence, path + (key,), old_digest, new_digest, edits)
+        else:
+            _diff_state(
+                old_nested[key], new_sequence, path + (key,),
+                old_labels, new_labels, old_digest, new_digest, edits,
+            )
+
+    if isinstance(old, Sequence) and isinstance(new, Sequence):
+        _diff_sequence(old, new, path, old_digest, new_digest, edits)
+
+
+def diff_machines(old: Machine, new: Machine) -> List[Edit]:
+    """
+    Returns the list of edits that turn ``old`` into ``new``, see ``Machine.diff``.
+    """
+    edits = []
+    _diff_state(old, new, (), {}, {}, _Digest(), _Digest(), edits)
+    return edits
+
+
+def fingerprint(machine: Machine) -> str:
+    """
+    Hash of the structure of ``machine``. Equal for machines that ``diff`` finds no differences between.
+    """
+    return _Digest().state_hash(machine, {})
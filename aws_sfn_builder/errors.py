@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class StatesError(Exception):
+    """
+    An error with a States Language name.
+
+    Raise it from resource providers to fail a Task with a specific ``error``
+    that Retry and Catch fields can match on. Other exceptions are matched
+    by the name of their class.
+    """
+
+    def __init__(self, error: str, cause: str=None):
+        super().__init__(error if cause is None else f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class ExecutionFailed(RuntimeError):
+    """
+    Raised by ``Runner.run`` when a state fails with an error that is not caught.
+    ``error`` and ``cause`` are those of the original error.
+    """
+
+    def __init__(self, message: str, error: str=None, cause: str=None):
+        super().__init__(message)
+        self.error = error
+        self.cause = cause
+
+
+class ErrorNames:
+    """
+    Namespace for the predefined error names.
+    """
+
+    ALL = "States.ALL"
+    Timeout = "States.Timeout"
+    TaskFailed = "States.TaskFailed"
+    Permissions = "States.Permissions"
+    ResultPathMatchFailure = "States.ResultPathMatchFailure"
+    BranchFailed = "States.BranchFailed"
+    NoChoiceMatched = "States.NoChoiceMatched"
+    DataLimitExceeded = "States.DataLimitExceeded"
+    Runtime = "States.Runtime"
+    IntrinsicFailure = "States.IntrinsicFailure"
+
+    # Terminal errors that are not matched by States.ALL
+    _NOT_RETRIABLE = [
+        DataLimitExceeded,
+        Runtime,
+    ]
+
+
+def error_name(e: Exception) -> str:
+    return getattr(e, "error", None) or type(e).__name__
+
+
+def error_cause(e: Exception) -> str:
+    cause = getattr(e, "cause", None)
+    return str(e) if cause is None else cause
+
+
+def error_matches(error_equals: List[str], error: str) -> bool:
+    if error in error_equals:
+        return True
+    if error in ErrorNames._NOT_RETRIABLE:
+        return False
+    if ErrorNames.ALL in error_equals:
+        return True
+    return ErrorNames.TaskFailed in error_equals and error != ErrorNames.Timeout
+
+
+def find_handler(handlers: Optional[List[Dict]], error: str) -> Tuple[Optional[int], Optional[Dict]]:
+    """
+    Returns the index and definition of the first Retry or Catch handler that matches ``error``.
+    """
+    for i, handler in enumerate(handlers or ()):
+        if error_matches(handler.get("ErrorEquals", ()), error):
+            return i, handler
+    return None, None
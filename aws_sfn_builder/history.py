@@ -0,0 +1,183 @@
+import datetime as dt
+import json
+import time
+from typing import IO, Any, Callable, Dict, List, Union
+
+from .errors import error_cause, error_name
+from .states import States
+from .tracing import StateTrace, Tracer
+
+
+class JsonLinesSink:
+    """
+    Writes history events as JSON Lines.
+
+    Events are buffered and written in batches of ``batch_size`` lines.
+    Accepts a path or an open text file. Files opened by the sink are closed
+    by ``close()``, files passed in are only flushed.
+
+    Usage:
+
+        with JsonLinesSink("history.jsonl") as sink:
+            runner = Runner(tracer=ExecutionHistory(sink))
+            runner.run(sm)
+
+    """
+
+    def __init__(self, file: Union[str, IO], batch_size: int=512):
+        if isinstance(file, str):
+            self._fp = open(file, "w", encoding="utf-8")
+            self._owns_fp = True
+        else:
+            self._fp = file
+            self._owns_fp = False
+        self.batch_size = batch_size
+        self._buffer: List[str] = []
+
+    def write(self, event: Dict) -> None:
+        self._buffer.append(json.dumps(event, separators=(",", ":")))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._fp.write("\n".join(self._buffer))
+            self._fp.write("\n")
+            self._buffer.clear()
+        self._fp.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._owns_fp:
+            self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MemorySink:
+    """
+    Keeps history events in a list. Handy in tests.
+    """
+
+    def __init__(self):
+        self.events: List[Dict] = []
+
+    def write(self, event: Dict) -> None:
+        self.events.append(event)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _to_json(payload: Any) -> str:
+    # Values that JSON can't represent are written as strings rather than failing the execution.
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
+
+class ExecutionHistory(Tracer):
+    """
+    A tracer that emits events shaped like the ones returned by Step Functions ``GetExecutionHistory``
+    (``ExecutionStarted``, ``TaskStateEntered``, ``TaskScheduled``, ``TaskSucceeded``, ``ChoiceStateEntered``, ...)
+    to ``sink``.
+
+    Event ids are monotonic within one execution and start at 1 for each new execution.
+    ``clock`` returns the current time in seconds since the epoch. Without it, events are timestamped
+    with the time on the ``Clock`` of the execution, such as a ``VirtualClock``, or else with ``time.time``.
+    """
+
+    def __init__(self, sink, clock: Callable[[], float]=None):
+        self.sink = sink
+        self.clock = clock or time.time
+        self._fixed_clock = clock is not None
+        self._last_id = 0
+        # When the current attempt of a Task started -- ``None`` for retries, which start after the last event.
+        self._attempt_started_at = None
+
+    def _timestamp(self, t: float=None) -> str:
+        if t is None:
+            t = self.clock()
+        return dt.datetime.fromtimestamp(t, dt.timezone.utc).isoformat()
+
+    def _emit(self, type: str, details_key: str=None, details: Dict=None, timestamp: str=None) -> None:
+        self._last_id += 1
+        event = {
+            "timestamp": timestamp or self._timestamp(),
+            "type": type,
+            "id": self._last_id,
+            "previousEventId": self._last_id - 1,
+        }
+        if details_key:
+            event[details_key] = details
+        self.sink.write(event)
+
+    def _emit_task_started(self, trace: StateTrace) -> None:
+        scheduled_at = self._timestamp(self._attempt_started_at)
+        self._attempt_started_at = None
+        self._emit("TaskScheduled", "taskScheduledEventDetails", {
+            "resource": trace.state.resource,
+        }, timestamp=scheduled_at)
+        self._emit("TaskStarted", "taskStartedEventDetails", {
+            "resource": trace.state.resource,
+        }, timestamp=scheduled_at)
+
+    def use_clock(self, clock) -> None:
+        if not self._fixed_clock:
+            self.clock = clock.now if clock is not None else time.time
+
+    def on_execution_start(self, sm, input: Any) -> None:
+        self._last_id = 0
+        self._emit("ExecutionStarted", "executionStartedEventDetails", {"input": _to_json(input)})
+
+    def on_execution_end(self, state, output: Any, error: Exception=None) -> None:
+        if error is not None:
+            self._emit("ExecutionFailed", "executionFailedEventDetails", {
+                "error": error_name(error),
+                "cause": error_cause(error),
+            })
+        elif state is not None and state.type == States.Fail:
+            self._emit("ExecutionFailed", "executionFailedEventDetails", {
+                "error": state.error,
+                "cause": state.cause,
+            })
+        else:
+            self._emit("ExecutionSucceeded", "executionSucceededEventDetails", {"output": _to_json(output)})
+        self.sink.flush()
+
+    def on_state_enter(self, trace: StateTrace, input: Any) -> None:
+        self._attempt_started_at = self.clock()
+        self._emit(f"{trace.type}StateEntered", "stateEnteredEventDetails", {
+            "name": trace.name,
+            "input": _to_json(input),
+        }, timestamp=self._timestamp(self._attempt_started_at))
+
+    def on_state_exit(self, trace: StateTrace, output: Any) -> None:
+        exited_at = self._timestamp()
+        if trace.type == States.Task and trace.error is None:
+            self._emit_task_started(trace)
+            self._emit("TaskSucceeded", "taskSucceededEventDetails", {
+                "resource": trace.state.resource,
+                "output": _to_json(trace.result),
+            }, timestamp=exited_at)
+        if trace.type == States.Fail:
+            # Fail states do not exit, the execution fails instead.
+            return
+        self._emit(f"{trace.type}StateExited", "stateExitedEventDetails", {
+            "name": trace.name,
+            "output": _to_json(output),
+        }, timestamp=exited_at)
+
+    def on_error(self, trace: StateTrace, error: Exception) -> None:
+        if trace.type == States.Task:
+            self._emit_task_started(trace)
+            self._emit("TaskFailed", "taskFailedEventDetails", {
+                "resource": trace.state.resource,
+                "error": error_name(error),
+                "cause": error_cause(error),
+            })
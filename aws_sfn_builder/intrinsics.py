@@ -0,0 +1,288 @@
+"""
+Intrinsic functions -- ``States.Format('{}', $.name)`` and the like -- in Parameters and ResultSelector.
+
+An expression is parsed once into a builder function, like the rest of the template.
+Functions that fail, for example on arguments of the wrong type, raise ``States.IntrinsicFailure``.
+"""
+import base64
+import hashlib
+import json
+import random
+import re
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+
+from .errors import ErrorNames, StatesError
+from .paths import compile_getter
+
+Builder = Callable[[Any, Any], Any]
+
+_TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*')
+        | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+        | (?P<function>States\.[A-Za-z0-9]+)\s*\(
+        | (?P<path>\$[^,()\s]*)
+        | (?P<literal>true|false|null)
+        | (?P<punctuation>[,)])
+    )
+    """,
+    re.VERBOSE,
+)
+
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+def _fail(message: str):
+    raise StatesError(ErrorNames.IntrinsicFailure, message)
+
+
+def _check(condition: bool, function: str, message: str) -> None:
+    if not condition:
+        _fail(f"{function}: {message}")
+
+
+class _EscapedString(str):
+    """
+    A string literal as written, with its escapes -- the template of ``States.Format``,
+    in which escaped braces are not placeholders.
+    """
+
+
+def _format(template, *args):
+    _check(isinstance(template, str), "States.Format", "the template must be a string")
+    pattern = r"(\\.|\{\})" if isinstance(template, _EscapedString) else r"(\{\})"
+    parts = re.split(pattern, template)
+    _check(parts.count("{}") == len(args), "States.Format", "the number of arguments must match the {} placeholders")
+    values = iter(args)
+    result = []
+    for part in parts:
+        if part == "{}":
+            value = next(values)
+            _check(
+                value is None or isinstance(value, (str, int, float, bool)),
+                "States.Format", "arguments must be strings, numbers, booleans or null",
+            )
+            result.append(value if isinstance(value, str) else json.dumps(value))
+        elif len(part) == 2 and part.startswith("\\"):
+            result.append(part[1])
+        else:
+            result.append(part)
+    return "".join(result)
+
+
+def _string_to_json(value):
+    _check(isinstance(value, str), "States.StringToJson", "the argument must be a string")
+    try:
+        return json.loads(value)
+    except ValueError as e:
+        _fail(f"States.StringToJson: {e}")
+
+
+def _json_to_string(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _array_partition(array, size):
+    _check(isinstance(array, list), "States.ArrayPartition", "the first argument must be an array")
+    _check(type(size) is int and size > 0, "States.ArrayPartition", "the chunk size must be a positive integer")
+    return [array[i:i + size] for i in range(0, len(array), size)]
+
+
+def _array_contains(array, value):
+    _check(isinstance(array, list), "States.ArrayContains", "the first argument must be an array")
+    return value in array
+
+
+def _array_range(start, end, step):
+    _check(
+        all(type(x) is int for x in (start, end, step)) and step != 0,
+        "States.ArrayRange", "arguments must be integers and the step must not be 0",
+    )
+    items = list(range(start, end + (1 if step > 0 else -1), step))
+    _check(len(items) <= 1000, "States.ArrayRange", "the array can have at most 1000 items")
+    return items
+
+
+def _array_get_item(array, index):
+    _check(isinstance(array, list), "States.ArrayGetItem", "the first argument must be an array")
+    _check(type(index) is int and 0 <= index < len(array), "States.ArrayGetItem", f"no item at index {index!r}")
+    return array[index]
+
+
+def _array_length(array):
+    _check(isinstance(array, list), "States.ArrayLength", "the argument must be an array")
+    return len(array)
+
+
+def _array_unique(array):
+    _check(isinstance(array, list), "States.ArrayUnique", "the argument must be an array")
+    unique = []
+    for item in array:
+        if item not in unique:
+            unique.append(item)
+    return unique
+
+
+def _base64_encode(value):
+    _check(isinstance(value, str), "States.Base64Encode", "the argument must be a string")
+    return base64.b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def _base64_decode(value):
+    _check(isinstance(value, str), "States.Base64Decode", "the argument must be a string")
+    try:
+        return base64.b64decode(value.encode("ascii"), validate=True).decode("utf-8")
+    except ValueError as e:
+        _fail(f"States.Base64Decode: {e}")
+
+
+_HASH_ALGORITHMS = {"MD5": "md5", "SHA-1": "sha1", "SHA-256": "sha256", "SHA-384": "sha384", "SHA-512": "sha512"}
+
+
+def _hash(value, algorithm):
+    _check(algorithm in _HASH_ALGORITHMS, "States.Hash", f"unsupported algorithm {algorithm!r}")
+    if not isinstance(value, str):
+        value = _json_to_string(value)
+    return hashlib.new(_HASH_ALGORITHMS[algorithm], value.encode("utf-8")).hexdigest()
+
+
+def _json_merge(a, b, deep):
+    _check(isinstance(a, dict) and isinstance(b, dict), "States.JsonMerge", "arguments must be objects")
+    _check(deep is False, "States.JsonMerge", "only shallow merging is supported")
+    return {**a, **b}
+
+
+def _math_random(start, end, seed=None):
+    _check(type(start) is int and type(end) is int and start < end, "States.MathRandom", "invalid range")
+    return random.Random(seed).randrange(start, end) if seed is not None else random.randrange(start, end)
+
+
+def _math_add(a, b):
+    _check(type(a) is int and type(b) is int, "States.MathAdd", "arguments must be integers")
+    return a + b
+
+
+def _string_split(value, delimiters):
+    _check(isinstance(value, str) and isinstance(delimiters, str), "States.StringSplit", "arguments must be strings")
+    if not delimiters:
+        return [value] if value else []
+    pattern = "|".join(re.escape(d) for d in delimiters)
+    return [part for part in re.split(pattern, value) if part]
+
+
+def _uuid():
+    return str(uuid.uuid4())
+
+
+# Functions by name, with the number of arguments they take -- (min, max), max None for any number.
+FUNCTIONS: Dict[str, Tuple[Callable, int, Any]] = {
+    "States.Format": (_format, 1, None),
+    "States.StringToJson": (_string_to_json, 1, 1),
+    "States.JsonToString": (_json_to_string, 1, 1),
+    "States.Array": (lambda *args: list(args), 0, None),
+    "States.ArrayPartition": (_array_partition, 2, 2),
+    "States.ArrayContains": (_array_contains, 2, 2),
+    "States.ArrayRange": (_array_range, 3, 3),
+    "States.ArrayGetItem": (_array_get_item, 2, 2),
+    "States.ArrayLength": (_array_length, 1, 1),
+    "States.ArrayUnique": (_array_unique, 1, 1),
+    "States.Base64Encode": (_base64_encode, 1, 1),
+    "States.Base64Decode": (_base64_decode, 1, 1),
+    "States.Hash": (_hash, 2, 2),
+    "States.JsonMerge": (_json_merge, 3, 3),
+    "States.MathRandom": (_math_random, 2, 3),
+    "States.MathAdd": (_math_add, 2, 2),
+    "States.StringSplit": (_string_split, 2, 2),
+    "States.UUID": (_uuid, 0, 0),
+}
+
+
+def _unescape(literal: str) -> str:
+    return re.sub(r"\\(.)", r"\1", literal[1:-1])
+
+
+def _compile_reference(path: str) -> Builder:
+    if path.startswith("$$"):
+        get = compile_getter(path[1:])
+        return lambda input, context: get(context)
+    get = compile_getter(path)
+    return lambda input, context: get(input)
+
+
+class _Parser:
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.pos = 0
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"Invalid intrinsic function {self.expression!r} at {self.pos}: {message}")
+
+    def token(self) -> Tuple[str, str]:
+        match = _TOKEN.match(self.expression, self.pos)
+        if match is None:
+            raise self.error("unexpected character")
+        self.pos = match.end()
+        return match.lastgroup, match.group(match.lastgroup)
+
+    def call(self, name: str) -> Builder:
+        if name not in FUNCTIONS:
+            raise self.error(f"unknown function {name}")
+        function, min_args, max_args = FUNCTIONS[name]
+        args: List[Tuple[bool, Any]] = []
+        kind, value = self.token()
+        if name == "States.Format" and kind == "string":
+            template = _EscapedString(value[1:-1])
+        else:
+            template = None
+        if not (kind == "punctuation" and value == ")"):
+            while True:
+                args.append(self.argument(kind, value))
+                kind, value = self.token()
+                if kind == "punctuation" and value == ")":
+                    break
+                if not (kind == "punctuation" and value == ","):
+                    raise self.error("expected , or )")
+                kind, value = self.token()
+        if len(args) < min_args or (max_args is not None and len(args) > max_args):
+            raise self.error(f"wrong number of arguments to {name}")
+        if template is not None:
+            args[0] = False, template
+
+        def call_function(input, context):
+            return function(*[build(input, context) if is_dynamic else build for is_dynamic, build in args])
+
+        return call_function
+
+    def argument(self, kind: str, value: str) -> Tuple[bool, Any]:
+        if kind == "string":
+            return False, _unescape(value)
+        if kind == "number":
+            return False, json.loads(value)
+        if kind == "literal":
+            return False, _LITERALS[value]
+        if kind == "path":
+            return True, _compile_reference(value)
+        if kind == "function":
+            return True, self.call(value)
+        raise self.error(f"unexpected {value!r}")
+
+
+def is_intrinsic(expression: str) -> bool:
+    return expression.lstrip().startswith("States.")
+
+
+def compile_intrinsic(expression: str) -> Builder:
+    """
+    Compiles an intrinsic function call into a function of ``input`` and the context object ``context``.
+    Raises ``ValueError`` if the expression is not a valid call.
+    """
+    parser = _Parser(expression)
+    kind, name = parser.token()
+    if kind != "function":
+        raise parser.error("expected a function call")
+    build = parser.call(name)
+    if expression[parser.pos:].strip():
+        raise parser.error("unexpected characters after the function call")
+    return build
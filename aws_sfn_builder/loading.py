@@ -0,0 +1,162 @@
+"""
+Streaming parse of state machine definitions from files -- see ``Machine.load``.
+
+Each entry of ``States`` is parsed into a ``State`` as soon as it has been read, and its raw
+dictionary is discarded, so the raw definition and the parsed one are never both fully in memory.
+
+Uses ``ijson`` if it is installed and the file is binary, otherwise an incremental reader
+built on ``json.JSONDecoder.raw_decode`` that only keeps the text of the current ``States`` entry in memory.
+"""
+import codecs
+import io
+import json
+import re
+from typing import IO, Any, Dict, Iterator, Tuple
+
+from .states import Machine, State
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover
+    ijson = None
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _JsonReader:
+    """
+    Reads JSON values one at a time from a text or binary file, reading more as needed.
+    """
+
+    def __init__(self, fp: IO, chunk_size: int):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self) -> bool:
+        if self.eof:
+            return False
+        # Read at least as much as is buffered so that re-decoding a large value stays linear.
+        chunk = self._fp.read(max(self._chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk, final=self.eof)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character, or ``""`` at the end of the file.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at position {self.pos} of buffer, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._read_more():
+                    continue
+                raise
+            if end == len(self.buffer) and not isinstance(value, (dict, list, str)) and self._read_more():
+                # A number or a literal at the end of the buffer may continue in the next chunk.
+                continue
+            self.pos = end
+            return value
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Reads an object whose values are read by the caller, yielding ``(key, reader)``.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self
+            if self.expect(",}") == "}":
+                return
+
+
+def _load_with_reader(fp: IO, chunk_size: int) -> Tuple[Dict, Dict[str, State]]:
+    reader = _JsonReader(fp, chunk_size)
+    top = {}
+    states = {}
+    for key, _ in reader.items():
+        if key == "States":
+            for name, _ in reader.items():
+                states[name] = State.parse(reader.value(), name=name)
+        else:
+            top[key] = reader.value()
+    return top, states
+
+
+def _build_value(events: Iterator, event: str, value: Any) -> Any:
+    builder = ijson.ObjectBuilder()
+    depth = 0
+    while True:
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if depth == 0:
+            return builder.value
+        _, event, value = next(events)
+
+
+def _load_with_ijson(fp: IO, chunk_size: int) -> Tuple[Dict, Dict[str, State]]:
+    top = {}
+    states = {}
+    events = iter(ijson.parse(fp, buf_size=chunk_size, use_float=True))
+    key = None
+    for prefix, event, value in events:
+        if prefix == "":
+            if event == "map_key":
+                key = value
+        elif prefix == "States":
+            # Events of the States object itself, the states are read by _build_value.
+            if event == "map_key":
+                _, state_event, state_value = next(events)
+                states[value] = State.parse(_build_value(events, state_event, state_value), name=value)
+        elif prefix == key:
+            top[key] = _build_value(events, event, value)
+    return top, states
+
+
+def load_machine(fp: IO, chunk_size: int=65536, **fields) -> Machine:
+    """
+    Parses the state machine definition in JSON file ``fp``, see ``Machine.load``.
+    """
+    if ijson is not None and not isinstance(fp, io.TextIOBase):
+        try:
+            top, states = _load_with_ijson(fp, chunk_size)
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid JSON: {e}") from e
+    else:
+        top, states = _load_with_reader(fp, chunk_size)
+    top["States"] = {}
+    machine = Machine.parse(top, **fields)
+    machine.states = states
+    return machine
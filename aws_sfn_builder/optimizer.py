@@ -0,0 +1,253 @@
+"""
+Machine-level optimizations -- see ``Machine.optimize``.
+
+All passes work on a copy of the state machine and only rewrite transitions
+through ``Sequence.redirect`` and ``Sequence.remove``.
+"""
+import collections
+from typing import Dict, Set
+
+import dataclasses
+
+from .paths import _set_keys, parse_path
+from .plan import _is_foldable
+from .states import Choice, Machine, Map, Parallel, Sequence, State, States
+
+# Fields that don't affect what a state does with its payload.
+_STRUCTURAL_FIELDS = {"type", "comment", "next", "end"}
+
+
+def _copy_state(state: State) -> State:
+    """
+    Copies everything that the optimizer may modify: states, sequences, Choice rules and Catch handlers.
+    Payload-related values (Result, Parameters etc.) are shared.
+    """
+    changes = {}
+    if isinstance(state, Sequence):
+        changes["states"] = {name: _copy_state(s) for name, s in state.states.items()}
+    if isinstance(state, Choice):
+        changes["choices"] = [
+            dataclasses.replace(rule, operator=rule.operator and dataclasses.replace(rule.operator))
+            for rule in state.choices
+        ]
+    if isinstance(state, Parallel):
+        changes["branches"] = [_copy_state(branch) for branch in state.branches]
+    if isinstance(state, Map) and state.iterator is not None:
+        changes["iterator"] = _copy_state(state.iterator)
+    if getattr(state, "catch", None):
+        changes["catch"] = [dict(catcher) for catcher in state.catch]
+    return dataclasses.replace(state, **changes)
+
+
+def _set_fields(state: State) -> Set[str]:
+    """
+    Names of the States Language fields of ``state`` that are set, as attribute names.
+    """
+    return {f for f in type(state)._FIELDS if getattr(state, f, None) is not None}
+
+
+def _is_root_path(path: str) -> bool:
+    return path is None or path == "$"
+
+
+def _is_identity(state: State) -> bool:
+    """
+    A Pass or Wait state that passes its input through unchanged and immediately.
+    """
+    fields = _set_fields(state) - _STRUCTURAL_FIELDS
+    if state.type == States.Pass:
+        allowed = {"input_path", "result_path", "output_path"}
+    elif state.type == States.Wait:
+        if state.seconds != 0:
+            return False
+        allowed = {"seconds", "input_path", "output_path"}
+    else:
+        return False
+    return fields <= allowed and all(_is_root_path(getattr(state, f)) for f in fields - {"seconds"})
+
+
+def _references(sequence: Sequence) -> Dict[str, collections.Counter]:
+    """
+    For each state name, counts references to it by kind: "start", "next", "choice", "catch".
+    """
+    refs = collections.defaultdict(collections.Counter)
+    if sequence.start_at is not None:
+        refs[sequence.start_at]["start"] += 1
+    for state in sequence.states.values():
+        if state.next is not None:
+            refs[state.next]["next"] += 1
+        if isinstance(state, Choice):
+            for rule in state.choices:
+                refs[rule.next]["choice"] += 1
+            if state.default is not None:
+                refs[state.default]["choice"] += 1
+        for catcher in getattr(state, "catch", None) or ():
+            refs[catcher.get("Next")]["catch"] += 1
+    return refs
+
+
+def _successors(state: State):
+    if state.next is not None:
+        yield state.next
+    if isinstance(state, Choice):
+        for rule in state.choices:
+            yield rule.next
+        if state.default is not None:
+            yield state.default
+    for catcher in getattr(state, "catch", None) or ():
+        yield catcher.get("Next")
+
+
+def _remove_unreachable(sequence: Sequence) -> bool:
+    reachable = set()
+    stack = [sequence.start_at] if sequence.start_at is not None else []
+    while stack:
+        name = stack.pop()
+        if name in reachable or name not in sequence.states:
+            continue
+        reachable.add(name)
+        stack.extend(_successors(sequence.states[name]))
+    unreachable = [name for name in sequence.states if name not in reachable]
+    for name in unreachable:
+        del sequence.states[name]
+    return bool(unreachable)
+
+
+def _remove_identity_states(sequence: Sequence, types: Set[str]) -> bool:
+    """
+    Removes Pass states that don't change their input and Wait states that wait zero seconds.
+    A terminal state is only removed if the states before it can become terminal instead.
+    """
+    changed = False
+    for name, state in list(sequence.states.items()):
+        if state.type not in types or not _is_identity(state):
+            continue
+        if state.next is None and set(_references(sequence).get(name, ())) - {"next"}:
+            continue
+        sequence.remove(name)
+        changed = True
+    return changed
+
+
+def _merge_passes(sequence: Sequence) -> bool:
+    """
+    Merges a Pass state with a static Result into the preceding one when the pair can be expressed
+    as a single Pass: when the second writes to the same path as the first, or sets something inside
+    the first's Result. Other pairs are left alone, as the first write could fail on the input --
+    ``$.a.b`` on ``{"a": 5}`` -- and merging would hide that failure.
+    """
+    changed = False
+    for name in list(sequence.states):
+        first = sequence.states.get(name)
+        if first is None or not _is_foldable(first) or first.next not in sequence.states:
+            continue
+        second = sequence.states[first.next]
+        if second is first or not _is_foldable(second) or _references(sequence)[second.name] != {"next": 1}:
+            continue
+
+        first_keys = parse_path(first.result_path) if first.result_path else ()
+        second_keys = parse_path(second.result_path) if second.result_path else ()
+        if first_keys == second_keys:
+            # The second Result replaces the first one.
+            first.result = second.result
+            first.result_path = second.result_path
+        elif second_keys[:len(first_keys)] == first_keys:
+            # The second Result goes inside the first one.
+            try:
+                first.result = _set_keys(first.result, second_keys[len(first_keys):], second.result)
+            except TypeError:
+                continue
+        else:
+            continue
+        first.output_path = None
+        sequence.remove(second.name)
+        changed = True
+    return changed
+
+
+def _inline(sequence: Sequence, name: str, inner: Sequence) -> bool:
+    """
+    Replaces state ``name`` with the states of ``inner``, which continue to where the state continued.
+    """
+    state = sequence.states[name]
+    if inner.start_at is None or set(inner.states) & (set(sequence.states) - {name}):
+        return False
+    if any(s.type == States.Succeed for s in inner.states.values()) and state.next is not None:
+        # Succeed would end the whole sequence rather than just the inner one.
+        return False
+    for inner_state in inner.states.values():
+        if inner_state.next is None and inner_state.type not in (States.Choice, *States._TERMINAL):
+            inner_state.next = state.next
+            inner_state.end = None
+    sequence.redirect(name, inner.start_at)
+    del sequence.states[name]
+    sequence.states.update(inner.states)
+    return True
+
+
+def _collapse_branches(sequence: Sequence, parallels: bool=True) -> bool:
+    """
+    Inlines nested sequences, and, with ``parallels``, Parallel states with a single branch and no other fields.
+
+    Note that the output of an inlined Parallel is the output of its branch, not a list of one item.
+    """
+    changed = False
+    for name, state in list(sequence.states.items()):
+        if state.type == States.Sequence:
+            changed |= _inline(sequence, name, state)
+        elif (
+            parallels and state.type == States.Parallel and len(state.branches) == 1
+            and isinstance(state.branches[0], Sequence)
+            and _set_fields(state) <= _STRUCTURAL_FIELDS | {"branches"}
+        ):
+            changed |= _inline(sequence, name, state.branches[0])
+    return changed
+
+
+def _optimize_sequence(
+    sequence: Sequence, unreachable: bool, passes: bool, waits: bool, parallels: bool,
+) -> None:
+    for state in sequence.states.values():
+        if isinstance(state, Parallel):
+            for branch in state.branches:
+                if isinstance(branch, Sequence):
+                    _optimize_sequence(branch, unreachable, passes, waits, parallels)
+        elif isinstance(state, Map) and state.iterator is not None:
+            _optimize_sequence(state.iterator, unreachable, passes, waits, parallels)
+        elif isinstance(state, Sequence):
+            _optimize_sequence(state, unreachable, passes, waits, parallels)
+
+    identity_types = {t for t, enabled in [(States.Pass, passes), (States.Wait, waits)] if enabled}
+    changed = True
+    while changed:
+        changed = _collapse_branches(sequence, parallels=parallels)
+        if unreachable:
+            changed |= _remove_unreachable(sequence)
+        if identity_types:
+            changed |= _remove_identity_states(sequence, identity_types)
+        if passes:
+            changed |= _merge_passes(sequence)
+
+
+def optimize_machine(
+    machine: Machine,
+    remove_unreachable: bool=True,
+    merge_passes: bool=True,
+    drop_zero_waits: bool=True,
+    collapse_parallels: bool=False,
+) -> Machine:
+    """
+    Returns an optimized copy of ``machine``. ``machine`` itself is not modified.
+
+    ``collapse_parallels`` is off by default because it changes the output of the collapsed
+    Parallel states: the output of their branch rather than a list of one item.
+    """
+    optimized = _copy_state(machine)
+    _optimize_sequence(
+        optimized,
+        unreachable=remove_unreachable,
+        passes=merge_passes,
+        waits=drop_zero_waits,
+        parallels=collapse_parallels,
+    )
+    return optimized
@@ -0,0 +1,144 @@
+"""
+Reference paths (``$.a.b[0]``) used in InputPath, ResultPath, OutputPath, Variable and similar fields.
+
+Simple paths are parsed once into a tuple of keys and evaluated without ``jsonpath_ng``.
+Anything else falls back to ``jsonpath_ng``, which is only imported when the first such path is used.
+
+Payloads are treated as immutable: ``set_path`` returns a new payload that shares
+everything but the dictionaries and lists along the path with the original.
+"""
+import copy
+import functools
+import re
+from typing import Any, Callable, Optional, Tuple, Union
+
+Keys = Tuple[Union[str, int], ...]
+
+_SEGMENT = re.compile(
+    r"""
+    \.(?P<name>[^.\[\]'"*@?()$]+)       # .name
+    | \[(?P<index>\d+)\]                # [0]
+    | \['(?P<quoted>[^']*)'\]           # ['name']
+    | \["(?P<dquoted>[^"]*)"\]          # ["name"]
+    """,
+    re.VERBOSE,
+)
+
+
+def parse_jsonpath(path: str):
+    """
+    Parses ``path`` with ``jsonpath_ng``.
+    """
+    # Imported on first use -- it is slow to import and most paths don't need it.
+    from jsonpath_ng import parse
+
+    return parse(path)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_path(path: str) -> Optional[Keys]:
+    """
+    Parses a simple reference path into a tuple of keys, ``()`` being the root ``$``.
+    Returns ``None`` if the path uses any other JSONPath features.
+    """
+    if not path.startswith("$"):
+        return None
+    keys = []
+    pos = 1
+    while pos < len(path):
+        match = _SEGMENT.match(path, pos)
+        if match is None:
+            return None
+        if match.group("name") is not None:
+            keys.append(match.group("name"))
+        elif match.group("index") is not None:
+            keys.append(int(match.group("index")))
+        elif match.group("quoted") is not None:
+            keys.append(match.group("quoted"))
+        else:
+            keys.append(match.group("dquoted"))
+        pos = match.end()
+    return tuple(keys)
+
+
+def get_path(payload: Any, path: str) -> Any:
+    """
+    Returns the value at ``path`` in ``payload``.
+    Raises ``KeyError`` or ``IndexError`` if there is no such value.
+    """
+    return compile_getter(path)(payload)
+
+
+def has_path(payload: Any, path: str) -> bool:
+    try:
+        get_path(payload, path)
+        return True
+    except (KeyError, IndexError, TypeError):
+        return False
+
+
+def set_path(payload: Any, path: str, value: Any) -> Any:
+    """
+    Returns a copy of ``payload`` with ``value`` at ``path``, creating missing dictionaries on the way.
+    Only the containers along the path are copied, the rest is shared with ``payload``.
+    ``payload`` itself is never modified.
+    """
+    keys = parse_path(path)
+    if keys is None:
+        payload = copy.deepcopy(payload)
+        parse_jsonpath(path).update_or_create(payload, value)
+        return payload
+    return _set_keys(payload, keys, value)
+
+
+def _set_keys(payload: Any, keys: Keys, value: Any) -> Any:
+    if not keys:
+        return value
+    key, rest = keys[0], keys[1:]
+    if isinstance(payload, list) and isinstance(key, int):
+        new_payload = list(payload)
+        new_payload[key] = _set_keys(payload[key], rest, value)
+        return new_payload
+    if isinstance(payload, dict):
+        new_payload = dict(payload)
+    elif payload is None:
+        new_payload = {}
+    else:
+        raise TypeError(f"Cannot set {key!r} on {type(payload).__name__}")
+    new_payload[key] = _set_keys(new_payload.get(key), rest, value)
+    return new_payload
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_getter(path: str) -> Callable[[Any], Any]:
+    """
+    Returns a function that takes a payload and returns the value at ``path`` in it,
+    raising ``KeyError`` or ``IndexError`` if there is no such value.
+    """
+    keys = parse_path(path)
+    if keys is None:
+        expression = parse_jsonpath(path)
+
+        def get_by_jsonpath(payload):
+            matches = expression.find(payload)
+            if not matches:
+                raise KeyError(path)
+            return matches[0].value
+
+        return get_by_jsonpath
+
+    if not keys:
+        return lambda payload: payload
+    if len(keys) == 1:
+        key, = keys
+        return lambda payload: payload[key]
+    if len(keys) == 2:
+        key1, key2 = keys
+        return lambda payload: payload[key1][key2]
+
+    def get_by_keys(payload):
+        for key in keys:
+            payload = payload[key]
+        return payload
+
+    return get_by_keys
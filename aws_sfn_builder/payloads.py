@@ -0,0 +1,203 @@
+import threading
+import warnings
+from typing import Any, Callable, Dict, List
+
+from .errors import ErrorNames, StatesError
+
+MAX_PAYLOAD_SIZE = 256 * 1024
+
+# Strings shorter than this are measured directly rather than remembered.
+_MIN_CACHED_STRING = 256
+
+
+class PayloadSizeWarning(UserWarning):
+    pass
+
+
+def _string_size(s: str) -> int:
+    if s.isascii():
+        # Escaping of control characters is not accounted for.
+        return len(s) + 2 + s.count('"') + s.count("\\")
+    return len(s.encode("utf-8")) + 2 + s.count('"') + s.count("\\")
+
+
+class PayloadSizer:
+    """
+    Estimates the size of payloads serialised as compact UTF-8 JSON, without serialising them.
+
+    Sizes of dictionaries, lists and long strings are remembered by identity. States never modify
+    payloads in place (see ``paths.set_path``), so after a ResultPath update only the dictionaries
+    along the path are measured again, the rest of the payload is shared with the previous one.
+    Remembered objects are kept alive so that their ids cannot be reused.
+
+    Providers may modify their input in place, and return objects that were measured before
+    and have been modified since. What goes into and comes out of a provider is ``refresh``-ed.
+    """
+
+    def __init__(self, max_cached: int=100000):
+        self.max_cached = max_cached
+        self._cache: Dict[int, tuple] = {}
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def size(self, payload: Any) -> int:
+        if len(self._cache) > self.max_cached:
+            self._cache.clear()
+        return self._size(payload)
+
+    def refresh(self, payload: Any) -> None:
+        """
+        Measures ``payload`` again without using remembered sizes. If anything in it has changed size,
+        the remembered sizes of whatever else contains it are out of date too, so all of them are forgotten.
+        """
+        changed = []
+        self._size(payload, changed)
+        if changed:
+            self._cache.clear()
+
+    def _size(self, payload: Any, changed: List=None) -> int:
+        # With ``changed``, remembered sizes aren't used, and objects whose size changed are added to it.
+        if payload is None or payload is True:
+            return 4
+        if payload is False:
+            return 5
+
+        payload_type = type(payload)
+        if payload_type is int or payload_type is float:
+            return len(repr(payload))
+        if payload_type is str and len(payload) < _MIN_CACHED_STRING:
+            return _string_size(payload)
+
+        cached = self._cache.get(id(payload))
+        if cached is not None and cached[0] is not payload:
+            cached = None
+        if cached is not None and changed is None:
+            return cached[1]
+
+        if isinstance(payload, dict):
+            size = 1 + len(payload)  # braces and separators between items
+            for key, value in payload.items():
+                size += _string_size(str(key)) + 1 + self._size(value, changed)
+            if not payload:
+                size = 2
+        elif isinstance(payload, (list, tuple)):
+            size = 1 + len(payload)
+            for value in payload:
+                size += self._size(value, changed)
+            if not payload:
+                size = 2
+        elif isinstance(payload, str):
+            size = _string_size(payload)
+        else:
+            size = len(repr(payload))
+
+        if cached is not None and cached[1] != size:
+            changed.append(payload)
+        self._cache[id(payload)] = (payload, size)
+        return size
+
+
+class RecordingResolver:
+    """
+    Wraps a resource resolver so that the payloads passed to the resolved providers,
+    and the results they return, are collected in ``payloads``.
+    """
+
+    __slots__ = ("_resolve", "payloads")
+
+    def __init__(self, resolve: Callable):
+        self._resolve = resolve
+        self.payloads: List[Any] = []
+
+    def __call__(self, resource_arn: str) -> Callable:
+        provider = self._resolve(resource_arn)
+
+        def recorded_provider(payload):
+            self.payloads.append(payload)
+            result = provider(payload)
+            if result is not payload:
+                self.payloads.append(result)
+            return result
+
+        return recorded_provider
+
+
+class _SizeStats:
+    __slots__ = ("count", "max_input", "max_output", "input_buckets", "output_buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.max_input = 0
+        self.max_output = 0
+        # Bucket ``i`` counts sizes in [2 ** (i - 1), 2 ** i)
+        self.input_buckets: List[int] = [0] * 32
+        self.output_buckets: List[int] = [0] * 32
+
+
+class PayloadSizeMonitor:
+    """
+    Tracks sizes of state inputs and outputs, and enforces the Step Functions payload size limit.
+
+    Pass an instance to ``Runner(payload_monitor=...)``.
+
+    ``action`` is ``"fail"`` to fail the execution with ``States.DataLimitExceeded`` like the service does,
+    or ``"warn"`` to only issue a ``PayloadSizeWarning``.
+    """
+
+    def __init__(self, max_size: int=MAX_PAYLOAD_SIZE, action: str="fail"):
+        if action not in ("fail", "warn"):
+            raise ValueError(action)
+        self.max_size = max_size
+        self.action = action
+        self.sizer = PayloadSizer()
+        self.stats: Dict[str, _SizeStats] = {}
+        # States in branches of Parallel and Map states are recorded from many threads.
+        self._lock = threading.Lock()
+
+    def start_execution(self) -> None:
+        self.sizer.clear()
+
+    def measure(self, payload: Any) -> int:
+        return self.sizer.size(payload)
+
+    def record(self, state_name: str, input_size: int, output_size: int) -> None:
+        with self._lock:
+            self._record(state_name, input_size, output_size)
+
+    def _record(self, state_name: str, input_size: int, output_size: int) -> None:
+        stats = self.stats.get(state_name)
+        if stats is None:
+            stats = self.stats[state_name] = _SizeStats()
+        stats.count += 1
+        if input_size > stats.max_input:
+            stats.max_input = input_size
+        if output_size > stats.max_output:
+            stats.max_output = output_size
+        stats.input_buckets[min(input_size.bit_length(), 31)] += 1
+        stats.output_buckets[min(output_size.bit_length(), 31)] += 1
+
+    def check(self, state_name: str, what: str, size: int) -> None:
+        if size <= self.max_size:
+            return
+        message = f"The {what} of state {state_name!r} has {size} bytes, exceeding the limit of {self.max_size} bytes"
+        if self.action == "fail":
+            raise StatesError(ErrorNames.DataLimitExceeded, message)
+        warnings.warn(message, PayloadSizeWarning)
+
+    def report(self, limit: int=None) -> str:
+        """
+        States by the largest output size, with histograms of output sizes (powers of two).
+        """
+        rows = [("State", "Count", "Max in", "Max out", "Output sizes")]
+        by_size = sorted(self.stats.items(), key=lambda item: item[1].max_output, reverse=True)
+        for name, stats in by_size[:limit] if limit else by_size:
+            histogram = ", ".join(
+                f"<{2 ** i}: {n}" for i, n in enumerate(stats.output_buckets) if n
+            )
+            rows.append((name, str(stats.count), str(stats.max_input), str(stats.max_output), histogram))
+        widths = [max(len(row[i]) for row in rows) for i in range(4)]
+        return "\n".join(
+            "  ".join([row[0].ljust(widths[0])] + [row[i].rjust(widths[i]) for i in range(1, 4)] + [row[4]]).rstrip()
+            for row in rows
+        )
@@ -0,0 +1,406 @@
+import copy
+import hashlib
+import io
+import mmap
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from . import __version__
+from .clock import Clock
+from .paths import _set_keys, parse_path
+from .states import Machine, Map, Parallel, Pass, Sequence, State, States
+
+# Version of the format of dumped plans, see ``ExecutionPlan.dumps``.
+PLAN_FORMAT_VERSION = 1
+
+
+class PlanFormatError(RuntimeError):
+    """
+    Raised when loading a plan dumped in a different format or by a different version of this package.
+    """
+
+
+def _plan_header() -> bytes:
+    return f"aws-sfn-builder plan {PLAN_FORMAT_VERSION} {__version__}\n".encode("utf-8")
+
+
+class ResourceResolutionError(RuntimeError):
+    """
+    Raised when binding a state machine to resource providers fails.
+
+    ``missing`` maps each unresolved resource ARN to the paths of the states that use it.
+    """
+
+    def __init__(self, missing: Dict[str, List[str]]):
+        self.missing = missing
+        lines = [
+            f"  {resource_arn!r} used by {', '.join(repr(p) for p in paths)}"
+            for resource_arn, paths in missing.items()
+        ]
+        super().__init__(
+            f"Failed to resolve {len(missing)} resource(s) -- no provider registered:\n" + "\n".join(lines)
+        )
+
+
+def iter_states(sequence: Sequence, path: Tuple[str, ...]=()) -> Iterator[Tuple[Tuple[str, ...], State]]:
+    """
+    Yields ``(path, state)`` of all states in ``sequence``, including the states
+    of ``Parallel`` branches and ``Map`` iterators.
+    ``path`` is the tuple of names of the enclosing states and the name of the state itself.
+    """
+    stack = [(path, sequence)]
+    while stack:
+        path, sequence = stack.pop()
+        for name, state in sequence.states.items():
+            state_path = path + (name,)
+            yield state_path, state
+            if isinstance(state, Parallel):
+                for i, branch in enumerate(state.branches):
+                    stack.append((state_path + (str(i),), branch))
+            elif isinstance(state, Map) and state.iterator is not None:
+                stack.append((state_path + ("Iterator",), state.iterator))
+
+
+def _needs_provider(state: State) -> bool:
+    return state.type == States.Task
+
+
+class _Leaf:
+    """
+    A value placed in an overlay -- as opposed to a nested overlay dictionary.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _overlay_set(overlay: Dict, keys: Tuple[str, ...], value: Any) -> None:
+    key, rest = keys[0], keys[1:]
+    if not rest:
+        overlay[key] = _Leaf(value)
+        return
+    child = overlay.get(key)
+    if isinstance(child, _Leaf):
+        child.value = _set_keys(child.value, rest, value)
+    else:
+        if child is None:
+            child = overlay[key] = {}
+        _overlay_set(child, rest, value)
+
+
+def _overlay_apply(payload: Any, overlay: Dict) -> Any:
+    if isinstance(payload, dict):
+        payload = dict(payload)
+    elif payload is None:
+        payload = {}
+    else:
+        raise TypeError(f"Cannot set {next(iter(overlay))!r} on {type(payload).__name__}")
+    for key, child in overlay.items():
+        if isinstance(child, _Leaf):
+            payload[key] = copy.deepcopy(child.value)
+        else:
+            payload[key] = _overlay_apply(payload.get(key), child)
+    return payload
+
+
+def _is_foldable(state: State) -> bool:
+    """
+    A Pass state with a static Result placed at a simple ResultPath -- its output is a function
+    of nothing but the parts of its input that it doesn't replace.
+    """
+    if state.type != States.Pass or state.result is None:
+        return False
+    if state.input_path not in (None, "$") or state.output_path not in (None, "$"):
+        return False
+    if state.result_path is None:
+        return True
+    keys = parse_path(state.result_path)
+    return keys is not None and all(isinstance(k, str) for k in keys)
+
+
+class FoldedPasses:
+    """
+    A chain of Pass states with static Results, collapsed into one precomputed transform.
+    Executes as if all the states of the chain were executed, and is named after the first one.
+
+    Raises ``TypeError`` for chains that can't be executed, such as ones that set a key in a Result
+    that isn't an object.
+    """
+
+    type = States.Pass
+
+    def __init__(self, states: List[Pass]):
+        self.states = states
+        self.name = states[0].name
+        self.next = states[-1].next
+        self.resource = None
+
+        # Either the output is a constant, or the input with an overlay of constants.
+        self._constant = None
+        self._has_constant = False
+        overlay = {}
+        for state in states:
+            keys = parse_path(state.result_path) if state.result_path else ()
+            if not keys:
+                self._constant = state.result
+                self._has_constant = True
+                overlay = {}
+            elif self._has_constant:
+                self._constant = _set_keys(self._constant, keys, state.result)
+            else:
+                _overlay_set(overlay, keys, state.result)
+        self._overlay = overlay
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
+        if self._has_constant:
+            # Every execution gets its own copy of the constant, see ``Pass.execute``.
+            return self.next, copy.deepcopy(self._constant)
+        return self.next, _overlay_apply(input, self._overlay)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {[s.name for s in self.states]}>"
+
+
+def fold_pass_chains(sequence: Sequence) -> Optional[Dict[str, State]]:
+    """
+    Returns states of ``sequence`` in which each chain of two or more foldable Pass states
+    is replaced by ``FoldedPasses`` under the name of its first state. States inside a chain are
+    kept as they are so that other states can still transition to them.
+
+    Returns ``None`` if there is nothing to fold.
+    """
+    states = sequence.states
+    foldable = {name for name, state in states.items() if _is_foldable(state)}
+    continued = {states[name].next for name in foldable if states[name].next in foldable}
+
+    folded = None
+    for head in foldable:
+        if head in continued or states[head].next not in foldable:
+            continue
+        chain = [states[head]]
+        seen = {head}
+        while chain[-1].next in foldable and chain[-1].next not in seen:
+            seen.add(chain[-1].next)
+            chain.append(states[chain[-1].next])
+        try:
+            folded_passes = FoldedPasses(chain)
+        except TypeError:
+            # The chain fails when executed -- left to fail then, like it would without folding.
+            continue
+        if folded is None:
+            folded = dict(states)
+        folded[head] = folded_passes
+    return folded
+
+
+class ExecutionPlan:
+    """
+    A state machine bound to the providers of all its resources. Create with ``Runner.bind``.
+
+    Running a plan does not resolve any resources.
+
+    With ``fold_passes``, chains of Pass states with static Results are executed
+    as one state, see ``FoldedPasses``. Tracers then see only the first state of each chain.
+
+    Parameters and ResultSelector templates are compiled when the plan is created,
+    so changes made to them afterwards don't affect the plan.
+    """
+
+    def __init__(self, machine: Machine, providers: Dict[str, Callable], fold_passes: bool=True):
+        self.machine = machine
+        self.providers = providers
+        self.state_indices: Dict[str, int] = {name: i for i, name in enumerate(machine.states)}
+        self._branch_state_indices: Dict[int, Dict[str, int]] = {}
+
+        # States to execute, by id of the sequence -- only for sequences that differ from the original.
+        self._states: Dict[int, Dict[str, State]] = {}
+        if fold_passes:
+            for sequence in self._sequences():
+                folded = fold_pass_chains(sequence)
+                if folded is not None:
+                    self._states[id(sequence)] = folded
+        self._bind_templates()
+
+        # A resource resolver, only to be called with the resources of the machine.
+        self.resolve: Callable[[str], Callable] = providers.__getitem__
+
+    def _sequences(self) -> List[Sequence]:
+        sequences = [self.machine]
+        for _, state in iter_states(self.machine):
+            if isinstance(state, Parallel):
+                sequences.extend(state.branches)
+            elif isinstance(state, Map) and state.iterator is not None:
+                sequences.append(state.iterator)
+        return sequences
+
+    def _bind_templates(self) -> None:
+        # Templates are compiled once per state, see ``State.bind_templates``.
+        for sequence in self._sequences():
+            states = self.states_of(sequence)
+            bound = {
+                name: state.bind_templates() if isinstance(state, State) else state
+                for name, state in states.items()
+            }
+            if any(bound[name] is not state for name, state in states.items()):
+                self._states[id(sequence)] = bound
+
+    def state_indices_of(self, sequence: Sequence) -> Dict[str, int]:
+        """
+        Returns indices of states of the machine or of one of its branches.
+        """
+        if sequence is self.machine:
+            return self.state_indices
+        indices = self._branch_state_indices.get(id(sequence))
+        if indices is None:
+            indices = self._branch_state_indices[id(sequence)] = {name: i for i, name in enumerate(sequence.states)}
+        return indices
+
+    def states_of(self, sequence: Sequence) -> Dict[str, State]:
+        """
+        Returns states to execute for the machine or one of its branches.
+        """
+        return self._states.get(id(sequence), sequence.states)
+
+    def __getstate__(self):
+        # Providers are not pickled -- they are resolved again when the plan is loaded.
+        # Sequences are keyed by id, which changes, so they are pickled alongside their states.
+        return {
+            "machine": self.machine,
+            "states": [(sequence, states) for sequence, states in self._folded_sequences()],
+        }
+
+    def __setstate__(self, state):
+        self.machine = state["machine"]
+        self.providers = {}
+        self.state_indices = {name: i for i, name in enumerate(self.machine.states)}
+        self._branch_state_indices = {}
+        self._states = {id(sequence): states for sequence, states in state["states"]}
+        self._bind_templates()
+        self.resolve = self.providers.__getitem__
+
+    def _folded_sequences(self) -> List[Tuple[Sequence, Dict[str, State]]]:
+        sequences = {id(sequence): sequence for sequence in self._sequences()}
+        return [(sequences[key], states) for key, states in self._states.items()]
+
+    def dumps(self) -> bytes:
+        """
+        Returns the plan pickled, without its providers, behind a header with the format and package version.
+        Load with ``ExecutionPlan.loads``.
+        """
+        return _plan_header() + pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def loads(
+        cls, data: Union[bytes, memoryview, mmap.mmap], resource_resolver: Callable[[str], Callable],
+    ) -> "ExecutionPlan":
+        """
+        Loads a plan dumped by ``dumps`` and resolves its resources again with ``resource_resolver``.
+        ``data`` can be anything that supports the buffer protocol, such as a memory-mapped file.
+
+        Raises ``PlanFormatError`` if the plan was dumped by a different version of this package,
+        which is checked before anything is unpickled, or if it can't be unpickled.
+        Only load plans that you have dumped yourself -- loading unpickles arbitrary objects.
+        """
+        header = _plan_header()
+        with memoryview(data) as view:
+            if view[:len(header)] != header:
+                found = bytes(view[:len(header)]).split(b"\n", 1)[0]
+                raise PlanFormatError(f"Plan header {found!r} is not supported, expected {header.strip()!r}")
+            try:
+                plan = pickle.loads(view[len(header):])
+            except Exception as e:
+                raise PlanFormatError(f"Plan can't be loaded: {e!r}") from e
+        if not isinstance(plan, cls):
+            raise PlanFormatError(f"Expected a plan, got {type(plan).__name__}")
+        plan.providers.update(_resolve_providers(plan.machine, resource_resolver))
+        return plan
+
+    @classmethod
+    def bind(
+        cls, machine: Machine, resource_resolver: Callable[[str], Callable], fold_passes: bool=True,
+    ) -> "ExecutionPlan":
+        """
+        Resolves all resources of ``machine``, reporting all missing providers at once.
+        """
+        return cls(machine, _resolve_providers(machine, resource_resolver), fold_passes=fold_passes)
+
+
+def _resolve_providers(machine: Machine, resource_resolver: Callable[[str], Callable]) -> Dict[str, Callable]:
+    providers = {}
+    missing = {}
+    for path, state in iter_states(machine):
+        if not _needs_provider(state):
+            continue
+        resource_arn = state.resource
+        if resource_arn in providers:
+            continue
+        try:
+            providers[resource_arn] = resource_resolver(resource_arn)
+        except RuntimeError:
+            missing.setdefault(resource_arn, []).append("/".join(path))
+    if missing:
+        raise ResourceResolutionError(missing)
+    return providers
+
+
+class PlanCache:
+    """
+    A directory of dumped execution plans of state machine definition files, so that
+    processes binding the same definitions skip parsing them.
+
+    Usage:
+
+        cache = PlanCache(".plans")
+        plan = runner.bind_file("definitions/job.json", cache=cache)
+
+    Plans are keyed by the contents of the definition file. Cached plans are read through
+    ``mmap``, so processes loading the same plan read the same pages of the page cache.
+    Plans dumped by other versions of this package are ignored and replaced.
+    """
+
+    def __init__(self, directory: str, fold_passes: bool=True):
+        self.directory = directory
+        self.fold_passes = fold_passes
+
+    def _plan_path(self, definition: bytes) -> str:
+        key = hashlib.blake2b(definition, digest_size=16)
+        key.update(f"{PLAN_FORMAT_VERSION}:{__version__}:{self.fold_passes}".encode("utf-8"))
+        return os.path.join(self.directory, f"{key.hexdigest()}.plan")
+
+    def _load(self, plan_path: str, resource_resolver: Callable[[str], Callable]) -> Optional[ExecutionPlan]:
+        try:
+            with open(plan_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return ExecutionPlan.loads(data, resource_resolver)
+        except (OSError, ValueError, PlanFormatError):
+            return None
+
+    def _save(self, plan_path: str, plan: ExecutionPlan) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so that other processes never see a partial plan.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(plan.dumps())
+            os.replace(temp_path, plan_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def bind(self, definition_path: str, resource_resolver: Callable[[str], Callable]) -> ExecutionPlan:
+        """
+        Returns the plan of the definition in file ``definition_path`` bound to ``resource_resolver``,
+        loading it from the cache, or parsing the definition and caching its plan.
+        """
+        with open(definition_path, "rb") as f:
+            definition = f.read()
+        plan_path = self._plan_path(definition)
+        plan = self._load(plan_path, resource_resolver)
+        if plan is None:
+            machine = Machine.load(io.BytesIO(definition))
+            plan = ExecutionPlan.bind(machine, resource_resolver, fold_passes=self.fold_passes)
+            self._save(plan_path, plan)
+        return plan
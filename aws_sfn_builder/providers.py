@@ -0,0 +1,397 @@
+"""
+Provider factories -- resource providers that share resources which need setting up and tearing down,
+such as connections to a local stand-in of a service.
+
+Register a factory with ``ResourceManager.provider_factory``. It is set up when the first resource
+it provides is resolved, and torn down by ``ResourceManager.close``.
+"""
+import collections
+import concurrent.futures
+import http.client
+import json
+import select
+import threading
+import urllib.parse
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .errors import StatesError
+
+
+class ProviderFactory:
+    """
+    Base class of provider factories.
+
+    Subclasses implement ``create`` and, if they hold any resources, ``setup`` and ``teardown``.
+    ``create`` is called once per resource ARN; ``setup`` is called before the first ``create``.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._providers: Dict[str, Callable] = {}
+        self._is_set_up = False
+
+    def setup(self) -> None:
+        pass
+
+    def teardown(self) -> None:
+        pass
+
+    def create(self, resource_arn: str) -> Callable:
+        """
+        Returns the provider of ``resource_arn`` -- a function of the payload.
+        """
+        raise NotImplementedError()
+
+    def ensure_setup(self) -> None:
+        if not self._is_set_up:
+            with self._lock:
+                if not self._is_set_up:
+                    self.setup()
+                    self._is_set_up = True
+
+    def provider(self, resource_arn: str) -> Callable:
+        provider = self._providers.get(resource_arn)
+        if provider is None:
+            with self._lock:
+                self.ensure_setup()
+                provider = self._providers.get(resource_arn)
+                if provider is None:
+                    provider = self._providers[resource_arn] = self.create(resource_arn)
+        return provider
+
+    def close(self) -> None:
+        """
+        Tears down the factory if it has been set up. It is set up again when next used.
+        """
+        with self._lock:
+            if self._is_set_up:
+                self._is_set_up = False
+                self._providers.clear()
+                self.teardown()
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: http.client.HTTPMessage
+    body: bytes
+
+
+class HttpRequest(NamedTuple):
+    method: str
+    path: str
+    body: bytes = b""
+    headers: Optional[Dict[str, str]] = None
+
+
+class _UnclosableFile:
+    # Lets consecutive responses read from one buffered socket file, which each of them would close.
+
+    def __init__(self, fp):
+        self._fp = fp
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+    def close(self):
+        pass
+
+
+class _SharedSocket:
+    def __init__(self, fp):
+        self._fp = fp
+
+    def makefile(self, mode, *args, **kwargs):
+        return _UnclosableFile(self._fp)
+
+
+class HttpSession:
+    """
+    A pool of keep-alive HTTP/1.1 connections to one server, safe to use from many threads.
+
+    At most ``max_connections`` connections are open at a time. ``pipeline`` sends several requests
+    on one connection without waiting for the responses in between.
+
+    Requests are not idempotent in general, so a request is only sent again when the server is known
+    not to have processed it -- see ``pipeline``. With ``resend_unanswered``, requests are also sent again
+    when the connection breaks before they are answered, which is only safe for idempotent requests.
+    """
+
+    def __init__(self, url: str, max_connections: int=4, timeout: float=30.0, resend_unanswered: bool=False):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL {url!r}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.resend_unanswered = resend_unanswered
+        self.connections_opened = 0
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._idle = collections.deque()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.connections_opened += 1
+                    break
+                connection = self._idle.pop()
+            if not _is_stale(connection):
+                return connection
+            connection.close()
+        connection = self._connection_class(self.host, self.port, timeout=self.timeout)
+        connection.connect()
+        return connection
+
+    def _checkin(self, connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append(connection)
+
+    def _encode(self, request: HttpRequest) -> bytes:
+        body = request.body or b""
+        lines = [
+            f"{request.method} {self.base_path}{request.path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(body)}",
+        ]
+        for name, value in (request.headers or {}).items():
+            lines.append(f"{name}: {value}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+    def _exchange(
+        self, connection: http.client.HTTPConnection, requests: List[HttpRequest], responses: List[HttpResponse],
+    ) -> bool:
+        """
+        Sends ``requests`` and adds their responses to ``responses`` until all are read
+        or the server closes the connection. Returns whether the connection can be reused.
+        """
+        connection.sock.sendall(b"".join(self._encode(request) for request in requests))
+        with connection.sock.makefile("rb") as fp:
+            for request in requests:
+                response = http.client.HTTPResponse(_SharedSocket(fp), method=request.method)
+                response.begin()
+                responses.append(HttpResponse(response.status, response.headers, response.read()))
+                if response.will_close:
+                    return False
+        return True
+
+    def pipeline(self, requests: List[HttpRequest]) -> List[HttpResponse]:
+        """
+        Sends ``requests`` on one connection and returns their responses in the same order.
+
+        Pooled connections that the server has closed are detected before anything is sent on them.
+        If the server closes the connection after a response that says so (``Connection: close``),
+        it doesn't process the requests that follow, and those are sent again on a new connection.
+        If the connection breaks in any other way, the error is raised -- unless ``resend_unanswered``
+        is set, in which case the unanswered requests are sent again.
+        """
+        responses = self.pipeline_partial(requests)
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+        return responses
+
+    def pipeline_partial(self, requests: List[HttpRequest]) -> List[Union[HttpResponse, Exception]]:
+        """
+        Like ``pipeline``, but if the connection breaks, returns the error in place of the response
+        of each request that was left unanswered, rather than raising it.
+        """
+        responses = []
+        resent = False
+        with self._slots:
+            while len(responses) < len(requests):
+                answered = len(responses)
+                try:
+                    connection = self._checkout()
+                except (OSError, http.client.HTTPException) as e:
+                    return responses + [e] * (len(requests) - answered)
+                try:
+                    reusable = self._exchange(connection, requests[answered:], responses)
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    # Gives up when an attempt after the first one gets none of them answered.
+                    if self.resend_unanswered and not (resent and len(responses) == answered):
+                        resent = True
+                        continue
+                    return responses + [e] * (len(requests) - len(responses))
+                if reusable:
+                    self._checkin(connection)
+                else:
+                    connection.close()
+        return responses
+
+    def request(self, method: str, path: str, body: bytes=b"", headers: Dict[str, str]=None) -> HttpResponse:
+        return self.pipeline([HttpRequest(method, path, body, headers)])[0]
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, collections.deque()
+        for connection in idle:
+            connection.close()
+
+
+def _is_stale(connection: http.client.HTTPConnection) -> bool:
+    """
+    Whether an idle connection has been closed -- by the server, if it can be read from.
+    """
+    sock = connection.sock
+    if sock is None or sock.fileno() < 0:
+        return True
+    try:
+        return bool(select.select([sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class _Batcher:
+    """
+    Sends items submitted by many threads at once in batches.
+
+    The thread that submits an item sends it, together with all other items waiting at the time,
+    unless ``max_concurrency`` batches are being sent already -- then one of those threads sends it next.
+    """
+
+    def __init__(self, send: Callable[[List], List], max_batch: int, max_concurrency: int):
+        self._send = send
+        self._max_batch = max_batch
+        self._slots = threading.Semaphore(max_concurrency)
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+
+    def submit(self, item: Any) -> Any:
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._pending.append((item, future))
+        self._flush()
+        return future.result()
+
+    def _flush(self) -> None:
+        while True:
+            if not self._slots.acquire(blocking=False):
+                # The threads sending batches check for waiting items after they are done.
+                return
+            try:
+                self._drain()
+            finally:
+                self._slots.release()
+            with self._lock:
+                if not self._pending:
+                    return
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self._max_batch, len(self._pending)))]
+            if not batch:
+                return
+            try:
+                results = self._send([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                # Items can fail one by one -- their results are exceptions then.
+                for (_, future), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+
+# Errors of the Lambda service, by HTTP status, as Step Functions reports them.
+_LAMBDA_ERRORS = {
+    400: "Lambda.InvalidRequestContentException",
+    404: "Lambda.ResourceNotFoundException",
+    413: "Lambda.RequestTooLargeException",
+    429: "Lambda.TooManyRequestsException",
+}
+
+
+def lambda_function_name(resource_arn: str) -> Tuple[str, Optional[str]]:
+    """
+    Returns the function name and the qualifier (version or alias) of a Lambda function ARN,
+    or of a plain function name.
+    """
+    parts = resource_arn.split(":")
+    if len(parts) >= 7 and parts[0] == "arn" and parts[5] == "function":
+        return parts[6], parts[7] if len(parts) > 7 else None
+    return resource_arn, None
+
+
+class LocalLambdaEndpoint(ProviderFactory):
+    """
+    Provides Lambda functions by invoking them on a local server that implements the Lambda Invoke API,
+    such as ``sam local start-lambda`` or a mock server.
+
+    Usage:
+
+        with ResourceManager() as resources:
+            resources.provider_factory("arn:aws:lambda:*:*:function:*", LocalLambdaEndpoint("http://127.0.0.1:3001"))
+            Runner(resources=resources).run(sm)
+
+    Invocations share at most ``max_connections`` keep-alive connections. Invocations made at the same time,
+    for example by iterations of a Map state, are sent in batches of up to ``max_batch`` requests
+    pipelined on one connection.
+
+    Invocations are never sent twice unless the server is known not to have received them (see
+    ``HttpSession.pipeline``): if a connection breaks, the invocations that weren't answered fail with
+    ``Lambda.ServiceException`` and can be retried with a Retry field. Pass ``resend_unanswered=True``
+    to send them again automatically if the functions are idempotent.
+
+    Function errors fail the Task with the ``errorType`` of the function as the error name.
+    """
+
+    def __init__(self, url: str="http://127.0.0.1:3001", max_connections: int=4, max_batch: int=16,
+                 timeout: float=30.0, resend_unanswered: bool=False):
+        super().__init__()
+        self.url = url
+        self.resend_unanswered = resend_unanswered
+        self.max_connections = max_connections
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.session: Optional[HttpSession] = None
+        self._batcher: Optional[_Batcher] = None
+
+    def setup(self) -> None:
+        self.session = HttpSession(
+            self.url, max_connections=self.max_connections, timeout=self.timeout,
+            resend_unanswered=self.resend_unanswered,
+        )
+        self._batcher = _Batcher(self.session.pipeline_partial, self.max_batch, self.max_connections)
+
+    def teardown(self) -> None:
+        self.session.close()
+
+    def create(self, resource_arn: str) -> Callable:
+        function_name, qualifier = lambda_function_name(resource_arn)
+        path = f"/2015-03-31/functions/{urllib.parse.quote(function_name, safe='')}/invocations"
+        if qualifier:
+            path += f"?Qualifier={urllib.parse.quote(qualifier, safe='')}"
+
+        def invoke(payload):
+            return self.invoke(path, payload)
+
+        return invoke
+
+    def invoke(self, path: str, payload: Any) -> Any:
+        self.ensure_setup()
+        request = HttpRequest("POST", path, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+        try:
+            response = self._batcher.submit(request)
+        except (OSError, http.client.HTTPException) as e:
+            raise StatesError("Lambda.ServiceException", f"Invocation was not answered: {e!r}") from e
+        text = response.body.decode("utf-8")
+        if response.status >= 400:
+            raise StatesError(_LAMBDA_ERRORS.get(response.status, "Lambda.ServiceException"), text)
+        if response.headers.get("X-Amz-Function-Error"):
+            try:
+                error = json.loads(text)
+            except ValueError:
+                error = {}
+            if not isinstance(error, dict):
+                error = {}
+            raise StatesError(error.get("errorType") or "Lambda.Unknown", error.get("errorMessage", text))
+        return json.loads(text) if text else None
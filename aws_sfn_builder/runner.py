@@ -1,8 +1,64 @@
 import collections
+import concurrent.futures
+import threading
 import time
-from typing import Any, Callable, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-from .states import Machine, State
+from .arns import ArnPatternIndex, is_arn_pattern
+from .budget import Budget, BudgetExceeded, CycleDetector
+from .caching import LRU
+from .checkpoints import Checkpoint, Checkpointer, _CheckpointSchedule, load_checkpoint
+from .choice_profile import ChoiceProfiler
+from .clock import Clock
+from .errors import ErrorNames, ExecutionFailed, StatesError, error_cause, error_name, find_handler
+from .payloads import PayloadSizeMonitor, PayloadSizer, RecordingResolver
+from .plan import ExecutionPlan, PlanCache
+from .providers import ProviderFactory
+from .states import Machine, Sequence, State, States, apply_result_path
+from .tracing import StateTrace, TimedResolver, Tracer
+
+
+class _ProviderTable:
+    """
+    A snapshot of the providers registered with a ``ResourceManager``.
+    Never modified once created -- registration replaces the whole table.
+    """
+
+    __slots__ = ("providers", "factories", "registrations", "patterns", "resolved")
+
+    def __init__(
+        self,
+        providers: Dict[str, Callable],
+        factories: Dict[str, ProviderFactory],
+        registrations: Tuple[Tuple[str, Union[Callable, ProviderFactory]], ...],
+    ):
+        self.providers = providers
+        self.factories = factories
+        self.registrations = registrations
+        self.patterns = ArnPatternIndex()
+        for pattern, provider in registrations:
+            self.patterns.add(pattern, provider)
+        # Cache of resolved patterns and factories -- filling it in doesn't change what the table resolves to.
+        self.resolved: Dict[str, Callable] = {}
+
+    def resolve(self, resource_arn: str) -> Callable:
+        provider = self.providers.get(resource_arn)
+        if provider is not None:
+            return provider
+        provider = self.resolved.get(resource_arn)
+        if provider is not None:
+            return provider
+        provider = self.factories.get(resource_arn)
+        if provider is None and self.patterns and resource_arn is not None:
+            provider = self.patterns.match(resource_arn)
+        if provider is not None:
+            if isinstance(provider, ProviderFactory):
+                provider = provider.provider(resource_arn)
+            self.resolved[resource_arn] = provider
+            return provider
+        raise RuntimeError(f"Failed to resolve resource {resource_arn!r} -- no provider registered")
+
+    __call__ = resolve
 
 
 class ResourceManager:
@@ -15,75 +71,684 @@ class ResourceManager:
         def hello_world(payload):
             return '"Hello, world!"'
 
+        @resources.provider("arn.lookup", cache=LRU(maxsize=1024))
+        def lookup(payload):
+            return expensive_but_deterministic_lookup(payload)
+
+        resources.provider_factory("arn:aws:lambda:*:*:function:*", LocalLambdaEndpoint())
+
+    Safe to use from many threads at once. Registering a provider replaces the table of providers
+    with a modified copy, so ``snapshot`` and ``resolve`` never see a table that is being modified.
+
+    Provider factories are set up when first used and torn down by ``close``,
+    or on leaving the ``with`` block of the resource manager.
     """
 
     def __init__(self, providers=None):
-        self._providers = {}
+        self._lock = threading.Lock()
+        self._table = _ProviderTable({}, {}, ())
+        self._caches: Dict[str, LRU] = {}
+        self._factories: List[ProviderFactory] = []
 
         if providers:
-            self._providers.update(providers)
+            for resource_arn, provider in providers.items():
+                self._register(resource_arn, provider)
+
+    def _register(self, resource_arn: str, provider: Union[Callable, ProviderFactory], cache: LRU=None) -> None:
+        with self._lock:
+            table = self._table
+            providers = table.providers
+            factories = table.factories
+            registrations = table.registrations
+            if is_arn_pattern(resource_arn):
+                registrations += ((resource_arn, provider),)
+            elif isinstance(provider, ProviderFactory):
+                providers = {k: v for k, v in providers.items() if k != resource_arn}
+                factories = {**factories, resource_arn: provider}
+            else:
+                providers = {**providers, resource_arn: provider}
+                factories = {k: v for k, v in factories.items() if k != resource_arn}
+            caches = {k: v for k, v in self._caches.items() if k != resource_arn}
+            if cache is not None:
+                caches[resource_arn] = cache
+            # Registration may change which provider a previously resolved resource maps to,
+            # so the new table starts with no resolved patterns.
+            self._table = _ProviderTable(providers, factories, registrations)
+            self._caches = caches
+
+    def snapshot(self) -> Callable[[str], Callable]:
+        """
+        Returns a resolver of resources to the providers registered at this moment,
+        unaffected by providers registered later. ``Runner.run`` resolves all resources
+        of an execution through one snapshot.
+        """
+        return self._table
 
     def resolve(self, resource_arn: str):
-        try:
-            return self._providers[resource_arn]
-        except KeyError:
-            raise RuntimeError(f"Failed to resolve resource {resource_arn!r} -- no provider registered")
+        """
+        Returns the provider registered for ``resource_arn``, trying exact matches first,
+        then the most specific matching pattern. Resolved patterns are cached per ARN.
+        """
+        return self._table.resolve(resource_arn)
 
     def __call__(self, resource_arn: str):
         return self.resolve(resource_arn)
 
-    def provider(self, resource_arn) -> Callable:
+    def provider(self, resource_arn, cache: LRU=None) -> Callable:
         """
         Decorator to register a resource provider.
         The decorated function should take one positional argument `payload`
         and return output of the resource execution.
+
+        ``resource_arn`` may be a pattern with glob wildcards in any of its components,
+        for example ``arn:aws:lambda:*:*:function:*``.
+
+        Pass ``cache`` to memoize results of a provider that is a deterministic
+        function of its payload -- it is then called once per distinct payload.
         """
 
         def decorator(func):
-            self._providers[resource_arn] = func
+            if cache is not None:
+                self._register(resource_arn, cache.wrap(func, resource_arn=resource_arn), cache=cache)
+            else:
+                self._register(resource_arn, func)
             return func
 
         return decorator
 
+    def provider_factory(self, resource_arn: str, factory: ProviderFactory) -> ProviderFactory:
+        """
+        Registers ``factory`` to create the providers of ``resource_arn``, which may be a pattern
+        like in ``provider``. The factory is set up when the first of its resources is resolved.
+        """
+        self._register(resource_arn, factory)
+        with self._lock:
+            if all(f is not factory for f in self._factories):
+                self._factories.append(factory)
+        return factory
+
+    def close(self) -> None:
+        """
+        Tears down all provider factories that have been registered.
+        """
+        for factory in list(self._factories):
+            factory.close()
+
+    def __enter__(self) -> "ResourceManager":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        """
+        Returns statistics of provider result caches by resource ARN.
+        """
+        return {resource_arn: cache.stats() for resource_arn, cache in self._caches.items()}
+
+    def clear_caches(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+
 
 class Runner:
-    def __init__(self, resources: ResourceManager=None):
+    """
+    Executes state machines locally.
+
+    Pass a ``Tracer`` to observe individual state executions. When no tracer is set,
+    the execution loop does no measurements at all. Payload sizes are only measured for tracers
+    that set ``measure_payloads``, estimated like ``PayloadSizeMonitor`` does, and never fail an execution.
+
+    Pass a ``Clock`` to simulate time: Wait states and Retry back-off wait on the clock.
+    With ``VirtualClock`` they advance simulated time instantly. Without a clock,
+    nothing waits.
+
+    Pass a ``Budget`` to limit executions. By default, executions are limited to 25000 transitions,
+    the state machine's ``TimeoutSeconds`` are enforced on the clock, and provably infinite
+    loops fail immediately.
+
+    Pass a ``PayloadSizeMonitor`` to track sizes of state inputs and outputs
+    and to enforce the 256 KB payload size limit of Step Functions.
+
+    Branches of Parallel states and iterations of Map states run concurrently,
+    in at most ``max_workers`` threads per state.
+
+    Pass a ``ChoiceProfiler`` to count which Choice rules match, including in branches.
+
+    Pass a ``Checkpointer`` to take checkpoints of executions at regular intervals,
+    and resume executions from them with ``resume``.
+
+    ``run`` can be called from many threads at once. Each execution resolves resources through
+    a snapshot of the providers taken when it starts (see ``ResourceManager.snapshot``) and keeps
+    its state in its own ``_Execution``, so executions share nothing but what is passed in here.
+    Of that, resource managers, budgets, caches and Choice profilers are safe to share.
+    Clocks, tracers and payload monitors follow one execution at a time: pass a clock and
+    a tracer to ``run`` for each concurrent execution, and don't use a payload monitor.
+    """
+
+    def __init__(
+        self,
+        resources: ResourceManager=None,
+        tracer: Tracer=None,
+        clock: Clock=None,
+        budget: Budget=None,
+        payload_monitor: PayloadSizeMonitor=None,
+        max_workers: int=32,
+        choice_profiler: ChoiceProfiler=None,
+        checkpointer: Checkpointer=None,
+    ):
         self._resources: ResourceManager = resources or ResourceManager()
+        self._tracer: Optional[Tracer] = tracer
+        self._clock: Optional[Clock] = clock
+        self._budget: Budget = budget or Budget()
+        self._payload_monitor: Optional[PayloadSizeMonitor] = payload_monitor
+        self._max_workers = max_workers
+        self._choice_profiler: Optional[ChoiceProfiler] = choice_profiler
+        self._checkpointer: Optional[Checkpointer] = checkpointer
 
-    def resource_provider(self, resource_arn) -> Callable:
+    def resource_provider(self, resource_arn, cache: LRU=None) -> Callable:
         """
         An alternative to ResourceManager.provider of registering a resource provider
         -- through the Runner instance. Handy when you don't have or don't need
         an explicit ResourceManager instance.
         """
-        return self._resources.provider(resource_arn)
+        return self._resources.provider(resource_arn, cache=cache)
+
+    def bind(self, sm: Machine, fold_passes: bool=True) -> ExecutionPlan:
+        """
+        Resolves the providers of all resources used by ``sm``, including the states
+        of ``Parallel`` branches and ``Map`` iterators, and returns an ``ExecutionPlan``
+        that can be passed to ``run``.
 
-    def run(self, sm: Machine, input=None, _timeout=2) -> Tuple[Optional[State], Any]:
+        With ``fold_passes``, chains of Pass states with static Results are precomputed
+        and executed as one state.
+
+        Raises ``ResourceResolutionError`` listing all missing providers.
+        """
+        return ExecutionPlan.bind(sm, self._resources, fold_passes=fold_passes)
+
+    def bind_file(self, definition_path: str, cache: PlanCache=None) -> ExecutionPlan:
+        """
+        Parses the state machine definition in JSON file ``definition_path`` and binds it like ``bind``.
+        With ``cache``, the plan is loaded from the cache if the definition hasn't changed since it was cached.
+        """
+        if cache is not None:
+            return cache.bind(definition_path, self._resources)
+        with open(definition_path, "rb") as f:
+            return self.bind(Machine.load(f))
+
+    def run(
+        self,
+        sm: Union[Machine, ExecutionPlan],
+        input=None,
+        budget: Budget=None,
+        clock: Clock=None,
+        tracer: Tracer=None,
+    ) -> Tuple[Optional[State], Any]:
+        """
+        Executes the state machine ``sm`` with ``input`` and returns the last executed state and the output.
+
+        ``sm`` can be a state machine or an ``ExecutionPlan`` returned by ``bind``.
+        Resources of a plain state machine are resolved as its states are executed,
+        from the providers registered when the execution starts.
+
+        The execution is limited by ``budget`` and runs on ``clock`` and with ``tracer``
+        or, if not set, the ones of the runner.
+        """
         if input is None:
             input = {}
+        return self._start(sm, input, budget, clock, tracer)
+
+    def resume(
+        self,
+        sm: Union[Machine, ExecutionPlan],
+        checkpoint: Union[bytes, Checkpoint],
+        budget: Budget=None,
+        clock: Clock=None,
+        tracer: Tracer=None,
+    ) -> Tuple[Optional[State], Any]:
+        """
+        Continues the execution of ``sm`` from ``checkpoint``, taken by the ``Checkpointer`` of a runner,
+        and returns the last executed state and the output like ``run``.
+
+        The execution continues on ``clock`` set to the time of the checkpoint
+        (see ``Clock.restore``) and with the transitions and retry attempts made so far.
+
+        Raises ``CheckpointError`` if the checkpoint wasn't taken of an execution of ``sm``.
+        """
+        checkpoint = load_checkpoint(checkpoint, sm.machine if isinstance(sm, ExecutionPlan) else sm)
+        clock = clock or self._clock
+        if clock is not None and checkpoint.time is not None:
+            clock.restore(checkpoint.time)
+        return self._start(sm, checkpoint.input, budget, clock, tracer, checkpoint=checkpoint)
 
-        start_time = time.time()
+    def _start(
+        self,
+        sm: Union[Machine, ExecutionPlan],
+        input,
+        budget: Optional[Budget],
+        clock: Optional[Clock],
+        tracer: Optional[Tracer],
+        checkpoint: Checkpoint=None,
+    ) -> Tuple[Optional[State], Any]:
+        if isinstance(sm, ExecutionPlan):
+            plan = sm
+            sm = plan.machine
+            resources = plan.resolve
+        else:
+            plan = None
+            resources = self._resources.snapshot()
+
+        tracer = tracer or self._tracer
+        # Payload sizes are measured for the payload monitor and for the tracer, with the same sizer.
+        payload_monitor = self._payload_monitor
+        sizer = None
+        if payload_monitor is not None:
+            payload_monitor.start_execution()
+            sizer = payload_monitor.sizer
+        elif tracer is not None and tracer.measure_payloads:
+            sizer = PayloadSizer()
+
+        budget = budget or self._budget
+        # Shared with the branches, so the budget limits the execution as a whole.
+        limits = _Limits(checkpoint.transitions if checkpoint is not None else 0, budget.max_wall_seconds)
+
+        execution = _Execution(
+            resources=resources,
+            plan=plan,
+            clock=clock or self._clock,
+            budget=budget,
+            limits=limits,
+            tracer=tracer,
+            payload_monitor=payload_monitor,
+            max_workers=self._max_workers,
+            choice_profiler=self._choice_profiler,
+            sizer=sizer,
+        )
+        return self._run(execution, sm, input, checkpointer=self._checkpointer, checkpoint=checkpoint)
+
+    def _run(
+        self,
+        execution: "_Execution",
+        sm: Sequence,
+        input,
+        checkpointer: Checkpointer=None,
+        checkpoint: Checkpoint=None,
+    ) -> Tuple[Optional[State], Any]:
+        """
+        Executes ``sm``, or a branch, from its start or, if set, from ``checkpoint``.
+        """
+        budget = execution.budget
+        clock = execution.clock
+        states = execution.states(sm)
         state = None
         next_state = sm.start_at
 
-        last_10_states = collections.deque()
+        last_states = collections.deque(maxlen=10)
+
+        limits = execution.limits
+        started_at = clock.now() if clock is not None else None
+        retry_attempts = None
+        if checkpoint is not None:
+            next_state = checkpoint.state
+            if checkpoint.started_at is not None:
+                started_at = checkpoint.started_at
+            if checkpoint.retry_attempts:
+                retry_attempts = collections.Counter(checkpoint.retry_attempts)
+        max_transitions = budget.max_transitions
+        wall_deadline = limits.wall_deadline
+        clock_deadline = None
+        timeout_seconds = getattr(sm, "timeout_seconds", None)
+        if budget.enforce_timeout_seconds and clock is not None and timeout_seconds:
+            clock_deadline = started_at + timeout_seconds
+        checkpoints = None
+        if checkpointer is not None:
+            checkpoints = execution.checkpoints = checkpointer.schedule(sm, started_at, limits.transitions)
+        cycle_detector = None
+        if budget.detect_cycles:
+            cycle_detector = CycleDetector()
+            state_indices = execution.state_indices(sm)
+
+        tracer = execution.tracer
+        resources = execution.resources
+        trace = None
+
+        if tracer is not None:
+            tracer.use_clock(clock)
+            tracer.on_execution_start(sm, input)
+
+        payload_monitor = execution.payload_monitor
+        sizer = execution.sizer
+        # Without the payload monitor, branches only keep the sizer up to date, for the tracer of the parent.
+        measure = sizer is not None and (
+            payload_monitor is not None or (tracer is not None and tracer.measure_payloads)
+        )
+        input_size = None
+        if measure:
+            input_size = sizer.size(input)
+        if payload_monitor is not None and not execution.branch:
+            try:
+                payload_monitor.check(sm.comment or sm.name, "execution input", input_size)
+            except StatesError as e:
+                if tracer is not None:
+                    tracer.on_execution_end(None, input, error=e)
+                raise
 
         while next_state is not None:
-            state = sm.states[next_state]
-            last_10_states.append(next_state)
-            while len(last_10_states) > 10:
-                last_10_states.popleft()
+            state = states[next_state]
+            last_states.append(next_state)
+            if checkpoints is not None and retry_attempts is None:
+                checkpoints.before_state(next_state, input, limits.transitions, clock)
+
+            error = None
+            transitions = limits.count_transition()
+            if max_transitions is not None and transitions > max_transitions:
+                error = BudgetExceeded(
+                    f"State machine {(sm.comment or sm.name)!r} failed to terminate in {max_transitions} transitions. "
+                    f"Last {len(last_states)} states: {list(last_states)}."
+                )
+            elif wall_deadline is not None and transitions % budget.wall_check_interval == 0:
+                if time.perf_counter() > wall_deadline:
+                    error = BudgetExceeded(
+                        f"State machine {(sm.comment or sm.name)!r} failed to terminate "
+                        f"in {budget.max_wall_seconds} seconds of wall time. "
+                        f"Last {len(last_states)} states: {list(last_states)}."
+                    )
+            if error is None and cycle_detector is not None:
+                cycle_length = cycle_detector.step(state_indices[next_state], input, States.is_deterministic(state))
+                if cycle_length is not None:
+                    if cycle_length < len(last_states):
+                        cycle = " -> ".join(list(last_states)[-cycle_length - 1:])
+                    else:
+                        cycle = f"{cycle_length} states"
+                    message = (
+                        f"State machine {(sm.comment or sm.name)!r} entered an infinite loop "
+                        f"after {transitions} transitions: {cycle} keep repeating with the same input."
+                    )
+                    if clock_deadline is not None:
+                        # It would run until it times out -- fail the way it eventually would.
+                        error = BudgetExceeded(
+                            f"{message} It would time out after {timeout_seconds} seconds (TimeoutSeconds).",
+                            error=ErrorNames.Timeout,
+                        )
+                    else:
+                        error = BudgetExceeded(message)
+            if error is not None:
+                if tracer is not None:
+                    tracer.on_execution_end(state, input, error=error)
+                raise error
+
+            resource_resolver = resources
+            recorder = None
+            if sizer is not None and state.type == States.Task:
+                resource_resolver = recorder = RecordingResolver(resource_resolver)
+            if tracer is not None:
+                resource_resolver = TimedResolver(resource_resolver)
+                trace = StateTrace(state, input_size=input_size)
+                tracer.on_state_enter(trace, input)
+                trace.started_ns = time.perf_counter_ns()
+
             try:
-                next_state, input = state.execute(input=input, resource_resolver=self._resources)
+                next_state, input = self._execute_state(
+                    execution, state, input, resource_resolver, trace, retry_attempts=retry_attempts,
+                )
+                retry_attempts = None
+            except BudgetExceeded as e:
+                # Exceeded in a branch -- ends the whole execution, like it does at the top level.
+                if tracer is not None:
+                    tracer.on_execution_end(state, None, error=e)
+                raise
             except Exception as e:
-                raise RuntimeError(
-                    f"State {state.name} ({state.type}) execution failed with an exception: {e!r}"
+                if tracer is not None:
+                    tracer.on_execution_end(state, None, error=e)
+                raise ExecutionFailed(
+                    f"State {state.name} ({state.type}) execution failed with an exception: {e!r}",
+                    error=error_name(e),
+                    cause=error_cause(e),
                 )
-            if time.time() - start_time > _timeout:
-                raise RuntimeError(
-                    f"State machine {(sm.comment or sm.name)!r} failed to terminate in {_timeout} seconds. "
-                    f"Last {len(last_10_states)} states: {last_10_states}.",
+
+            if tracer is not None:
+                trace.duration_ns = time.perf_counter_ns() - trace.started_ns
+                trace.provider_ns = resource_resolver.provider_ns
+                trace.result = resource_resolver.result
+
+            if recorder is not None:
+                # Providers may have modified their input, and their output, in place. Everything else
+                # is shared with the previous payload or new, and measured only once.
+                for payload in recorder.payloads:
+                    sizer.refresh(payload)
+            if measure:
+                output_size = sizer.size(input)
+            if payload_monitor is not None:
+                payload_monitor.record(state.name, input_size, output_size)
+                try:
+                    payload_monitor.check(state.name, "output", output_size)
+                except StatesError as e:
+                    if tracer is not None:
+                        tracer.on_execution_end(state, input, error=e)
+                    raise
+
+            if measure:
+                input_size = output_size
+
+            if tracer is not None:
+                trace.output_size = input_size
+                tracer.on_state_exit(trace, input)
+                if next_state is not None:
+                    tracer.on_transition(state.name, next_state)
+
+            if clock_deadline is not None and clock.now() > clock_deadline:
+                error = BudgetExceeded(
+                    f"State machine {(sm.comment or sm.name)!r} timed out "
+                    f"after {timeout_seconds} seconds (TimeoutSeconds) on {clock!r}. "
+                    f"Last {len(last_states)} states: {list(last_states)}.",
+                    error=ErrorNames.Timeout,
                 )
+                if tracer is not None:
+                    tracer.on_execution_end(state, input, error=error)
+                raise error
+
+        if tracer is not None:
+            tracer.on_execution_end(state, input)
 
         # Return the final state
         return state, input
+
+    def _execute_state(
+        self,
+        execution: "_Execution",
+        state: State,
+        input,
+        resource_resolver,
+        trace: StateTrace=None,
+        retry_attempts: collections.Counter=None,
+    ):
+        """
+        Executes the state, applying its Retry and Catch fields to errors.
+        ``retry_attempts`` are the attempts made before, when resuming from a checkpoint.
+        """
+        clock = execution.clock
+
+        while True:
+            try:
+                if state.type == States.Choice and execution.choice_profiler is not None:
+                    return execution.choice_profiler.execute(state, input)
+                if state.type in States._WITH_BRANCHES:
+                    return state.execute(
+                        input=input,
+                        resource_resolver=resource_resolver,
+                        clock=clock,
+                        branch_runner=execution.branch_runner(self, resource_resolver),
+                    )
+                return state.execute(input=input, resource_resolver=resource_resolver, clock=clock)
+            except BudgetExceeded:
+                # Not an error of the state -- Retry and Catch don't apply.
+                raise
+            except Exception as e:
+                error = error_name(e)
+
+                if trace is not None:
+                    trace.duration_ns = time.perf_counter_ns() - trace.started_ns
+                    trace.provider_ns = resource_resolver.provider_ns
+                    execution.tracer.on_error(trace, e)
+
+                retrier_index, retrier = find_handler(getattr(state, "retry", None), error)
+                if retrier is not None:
+                    if retry_attempts is None:
+                        retry_attempts = collections.Counter()
+                    attempt = retry_attempts[retrier_index]
+                    if attempt < retrier.get("MaxAttempts", 3):
+                        retry_attempts[retrier_index] += 1
+                        if clock is not None:
+                            clock.sleep(retrier.get("IntervalSeconds", 1) * retrier.get("BackoffRate", 2.0) ** attempt)
+                        if execution.checkpoints is not None:
+                            execution.checkpoints.before_retry(state.name, input, retry_attempts, clock)
+                        continue
+
+                _, catcher = find_handler(getattr(state, "catch", None), error)
+                if catcher is not None:
+                    if trace is not None:
+                        trace.error = error
+                    error_output = {"Error": error, "Cause": error_cause(e)}
+                    return catcher["Next"], apply_result_path(catcher.get("ResultPath"), input, error_output)
+
+                raise
+
+
+class _Limits:
+    """
+    Transitions made so far and the wall-time deadline of an execution, shared by its branches,
+    which count their transitions from many threads.
+    """
+
+    def __init__(self, transitions: int=0, max_wall_seconds: float=None):
+        self._lock = threading.Lock()
+        self.transitions = transitions
+        self.wall_deadline = None
+        if max_wall_seconds is not None:
+            self.wall_deadline = time.perf_counter() + max_wall_seconds
+
+    def count_transition(self) -> int:
+        with self._lock:
+            self.transitions += 1
+            return self.transitions
+
+
+class _Execution:
+    """
+    Context of a single execution: the resource resolver, clock, tracer and other settings
+    that it runs with. Created by ``Runner.run`` for each execution and shared only with
+    the branches of its Parallel and Map states, which get their own copies with a forked clock.
+    """
+
+    def __init__(
+        self,
+        resources: Callable,
+        plan: Optional[ExecutionPlan],
+        clock: Optional[Clock],
+        budget: Budget,
+        limits: "_Limits",
+        tracer: Optional[Tracer],
+        payload_monitor: Optional[PayloadSizeMonitor],
+        max_workers: int=32,
+        choice_profiler: Optional[ChoiceProfiler]=None,
+        sizer: Optional[PayloadSizer]=None,
+        branch: bool=False,
+    ):
+        self.resources = resources
+        self.plan = plan
+        self.clock = clock
+        self.budget = budget
+        self.limits = limits
+        self.tracer = tracer
+        self.payload_monitor = payload_monitor
+        self.max_workers = max_workers
+        self.choice_profiler = choice_profiler
+        self.sizer = sizer
+        self.branch = branch
+        # Set for top-level executions of runners with a checkpointer.
+        self.checkpoints: Optional[_CheckpointSchedule] = None
+
+    def states(self, sequence: Sequence) -> Dict[str, State]:
+        if self.plan is not None:
+            return self.plan.states_of(sequence)
+        return sequence.states
+
+    def state_indices(self, sequence: Sequence) -> Dict[str, int]:
+        if self.plan is not None:
+            return self.plan.state_indices_of(sequence)
+        return {name: i for i, name in enumerate(sequence.states)}
+
+    def branch_runner(self, runner: Runner, resource_resolver: Callable) -> "BranchRunner":
+        return BranchRunner(runner, self, resource_resolver)
+
+
+class BranchRunner:
+    """
+    Runs branches of Parallel states and iterations of Map states,
+    concurrently in a bounded pool of threads.
+
+    Branches are executed without the tracer of the parent execution, only the Parallel or Map
+    state itself is traced. The payload monitor checks the states in branches too.
+
+    On a virtual clock, each branch gets its own copy of the clock, and the parent clock
+    then advances to when the slowest branch finished -- branches wait in parallel.
+    """
+
+    def __init__(self, runner: Runner, execution: _Execution, resource_resolver: Callable):
+        self._runner = runner
+        self._execution = execution
+        self._resource_resolver = resource_resolver
+
+    def _run_branch(self, branch: Sequence, input, clock: Optional[Clock], resource_resolver: Callable):
+        execution = _Execution(
+            resources=resource_resolver,
+            plan=self._execution.plan,
+            clock=clock,
+            budget=self._execution.budget,
+            limits=self._execution.limits,
+            tracer=None,
+            payload_monitor=self._execution.payload_monitor,
+            max_workers=self._execution.max_workers,
+            choice_profiler=self._execution.choice_profiler,
+            sizer=self._execution.sizer,
+            branch=True,
+        )
+        final_state, output = self._runner._run(execution, branch, input)
+        if final_state is not None and final_state.type == States.Fail:
+            raise StatesError(final_state.error or ErrorNames.BranchFailed, final_state.cause)
+        return output
+
+    def run(self, branches: List[Tuple[Sequence, Any]], max_concurrency: int=0) -> List[Any]:
+        """
+        Runs each ``(branch, input)`` and returns the list of outputs in the same order.
+        ``max_concurrency`` of 0 means no limit other than the size of the thread pool.
+        """
+        parent_clock = self._execution.clock
+        clocks = [parent_clock.fork() if parent_clock is not None else None for _ in branches]
+        # Branches count the time spent in providers separately, the parent adds it up once they have finished.
+        timed = isinstance(self._resource_resolver, TimedResolver)
+        resolvers = [self._resource_resolver.fork() if timed else self._resource_resolver for _ in branches]
+
+        max_workers = min(max_concurrency or self._execution.max_workers, self._execution.max_workers, len(branches))
+        try:
+            if max_workers <= 1:
+                outputs = [
+                    self._run_branch(branch, input, clock, resolver)
+                    for (branch, input), clock, resolver in zip(branches, clocks, resolvers)
+                ]
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(self._run_branch, branch, input, clock, resolver)
+                        for (branch, input), clock, resolver in zip(branches, clocks, resolvers)
+                    ]
+                    outputs = [future.result() for future in futures]
+        finally:
+            # Also when a branch failed -- the trace of the failed state includes the time.
+            if timed:
+                self._resource_resolver.join(resolvers, concurrent=max_workers > 1)
+
+        if parent_clock is not None:
+            parent_clock.join(clocks)
+        return outputs
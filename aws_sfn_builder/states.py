@@ -1,19 +1,33 @@
+import copy
+import datetime as dt
 import json
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
 from uuid import uuid4
 
 import dataclasses
 from bidict import bidict
-from jsonpath_ng import parse as parse_jsonpath
 
 from .base import Node
 from .choice_rules import ChoiceRule
+from .clock import Clock
+from .paths import get_path, set_path
+from .templates import Builder, compile_template
 
 
 def _generate_name():
     return str(uuid4())
 
 
+def apply_result_path(result_path: Optional[str], input, result):
+    """
+    Places ``result`` in ``input`` at ``result_path``, or returns ``result`` if there is no ``result_path``.
+    ``input`` is not modified, only the dictionaries along ``result_path`` are copied.
+    """
+    if result_path:
+        return set_path(input, result_path, result)
+    return result
+
+
 class States:
     """
     Namespace for all names of states.
@@ -26,6 +40,7 @@ class States:
     Succeed = "Succeed"
     Fail = "Fail"
     Parallel = "Parallel"
+    Map = "Map"
 
     Sequence = "Sequence"
     Machine = "Machine"
@@ -38,6 +53,7 @@ class States:
         Succeed,
         Fail,
         Parallel,
+        Map,
         Sequence,
         Machine,
     ]
@@ -57,10 +73,29 @@ class States:
     def is_terminal(cls, state: "State"):
         return state.next is None or state.type in cls._TERMINAL
 
+    # States that run branches of states, see ``BranchRunner``.
+    _WITH_BRANCHES = [
+        Parallel,
+        Map,
+    ]
+
+    # States whose outcome depends only on their input, and which don't modify it in place.
+    _DETERMINISTIC = [
+        Pass,
+        Choice,
+        Wait,
+        Succeed,
+        Fail,
+    ]
+
     @classmethod
     def is_internal(cls, state: "State"):
         return state.type in cls._INTERNAL
 
+    @classmethod
+    def is_deterministic(cls, state: "State"):
+        return state.type in cls._DETERMINISTIC
+
 
 @dataclasses.dataclass
 class State(Node):
@@ -127,25 +162,14 @@ class State(Node):
         Applies InputPath
         """
         if self.input_path:
-            return parse_jsonpath(self.input_path).find(input)[0].value
+            return get_path(input, self.input_path)
         return input
 
     def format_result(self, input, resource_result):
         """
         Applies ResultPath
         """
-        if self.result_path:
-            result_path = parse_jsonpath(self.result_path)
-            if not result_path.find(input):
-                # A quick hack to set a non-existent key (assuming the parent of the path is a dictionary).
-                result_path.left.find(input)[0].value[str(result_path.right)] = resource_result
-                return input
-            elif str(result_path) == "$":
-                return resource_result
-            else:
-                result_path.update(input, resource_result)
-                return input
-        return resource_result
+        return apply_result_path(self.result_path, input, resource_result)
 
     def format_state_output(self, result):
         """
@@ -154,29 +178,82 @@ class State(Node):
         if not self.output_path:
             return result
 
-        output_path = parse_jsonpath(self.output_path)
-        if str(output_path) == "$":
+        if self.output_path == "$":
             # From docs:
             # If the OutputPath has the default value of $, this matches the entire input completely.
             # In this case, the entire input is passed to the next state.
             return result
         else:
-            output_matches = output_path.find(result)
-            if output_matches:
+            try:
                 # From docs:
                 # If the OutputPath matches an item in the state's input, only that input item is selected.
                 # This input item becomes the state's output.
-                assert len(output_matches) == 1
-                return output_matches[0].value
-            else:
+                return get_path(result, self.output_path)
+            except (KeyError, IndexError, TypeError):
                 # From docs:
                 # If the OutputPath doesn't match an item in the state's input,
                 # an exception specifies an invalid path.
                 raise NotImplementedError()
 
-    def execute(self, input, resource_resolver: Callable=None) -> Tuple[Optional[str], Any]:
-        resource_input = self.format_state_input(input)
+    def format_parameters(self, state_input, context: Dict=None):
+        """
+        Applies Parameters
+        """
+        return state_input
+
+    def format_result_selector(self, resource_result, context: Dict=None):
+        """
+        Applies ResultSelector
+        """
+        return resource_result
+
+    def get_context(self) -> Dict:
+        """
+        Returns the context object -- what ``$$`` refers to in Parameters and ResultSelector.
+        """
+        return {"State": {"Name": self.name}}
+
+    def template_builder(self, field_name: str) -> Builder:
+        """
+        Returns the builder of the template in field ``field_name`` (``parameters`` or ``result_selector``),
+        compiling the template on first use. A template assigned to the field later is compiled again,
+        changes made to a template in place are not seen.
+        """
+        template = getattr(self, field_name)
+        builders = self.__dict__.get("_builders")
+        if builders is None:
+            builders = self._builders = {}
+        compiled = builders.get(field_name)
+        if compiled is None or compiled[0] is not template:
+            compiled = builders[field_name] = (template, compile_template(template))
+        return compiled[1]
+
+    def bind_templates(self) -> "State":
+        """
+        Returns a copy of the state with its templates compiled, or the state itself if it has no templates.
+        Used by ``ExecutionPlan``, which executes the copy instead of the state.
+        """
+        field_names = [
+            field_name for field_name in ("parameters", "result_selector")
+            if getattr(self, field_name, None) is not None
+        ]
+        if not field_names:
+            return self
+        bound = copy.copy(self)
+        for field_name in field_names:
+            bound.template_builder(field_name)
+        return bound
+
+    def __getstate__(self):
+        # Compiled templates are not copied or pickled.
+        state = dict(self.__dict__)
+        state.pop("_builders", None)
+        return state
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None) -> Tuple[Optional[str], Any]:
+        resource_input = self.format_parameters(self.format_state_input(input))
         resource_result = resource_resolver(self.resource)(resource_input)
+        resource_result = self.format_result_selector(resource_result)
         result = self.format_result(input, resource_result)
         return self.next, self.format_state_output(result)
 
@@ -191,17 +268,39 @@ class Pass(State):
         **State._FIELDS,
         **{
             "result": "Result",
+            "parameters": "Parameters",
         },
     )
 
     type: str = States.Pass
     result: str = None
     result_path: str = None
+    parameters: Dict = None
 
     def compile_dict(self, c: Dict):
         if self.next is None:
             c["End"] = True
 
+    def format_parameters(self, state_input, context: Dict=None):
+        """
+        Applies Parameters
+        """
+        if self.parameters is None:
+            return state_input
+        return self.template_builder("parameters")(state_input, self.get_context() if context is None else context)
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
+        """
+        Places Result (or the effective input if there is no Result) at ResultPath.
+        Pass states have no resource, ``resource_resolver`` is not used.
+        """
+        if self.result is not None:
+            # A copy, so that later states can't change the definition through the payload.
+            result = copy.deepcopy(self.result)
+        else:
+            result = self.format_parameters(self.format_state_input(input))
+        return self.next, self.format_state_output(self.format_result(input, result))
+
 
 @dataclasses.dataclass
 class Task(Pass):
@@ -214,6 +313,7 @@ class Task(Pass):
             "catch": "Catch",
             "timeout_seconds": "TimeoutSeconds",
             "heartbeat_seconds": "HeartbeatSeconds",
+            "result_selector": "ResultSelector",
         },
     )
 
@@ -222,6 +322,20 @@ class Task(Pass):
     catch: List = None
     timeout_seconds: int = None
     heartbeat_seconds: int = None
+    result_selector: Dict = None
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
+        # Not Pass.execute -- tasks invoke their resource.
+        return State.execute(self, input, resource_resolver=resource_resolver, clock=clock)
+
+    def format_result_selector(self, resource_result, context: Dict=None):
+        """
+        Applies ResultSelector
+        """
+        if self.result_selector is None:
+            return resource_result
+        build = self.template_builder("result_selector")
+        return build(resource_result, self.get_context() if context is None else context)
 
 
 @dataclasses.dataclass
@@ -242,7 +356,39 @@ class Choice(State):
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
         fields["choices"] = [ChoiceRule.parse(raw_choice_rule) for raw_choice_rule in d["Choices"]]
 
-    def execute(self, input, resource_resolver: Callable):
+    def optimize(self, profile) -> "Choice":
+        """
+        Returns a copy of this Choice state with the rules that match most often checked first,
+        as counted in ``profile`` -- a ``ChoiceProfile`` or a list of hit counts per rule.
+
+        A rule is only moved ahead of the rules that it provably can't match together with,
+        see ``choice_analysis.reorder_rules``, so the copy routes every input the same way.
+        """
+        from .choice_analysis import reorder_rules
+        order = reorder_rules(self.choices, getattr(profile, "hits", profile))
+        return dataclasses.replace(self, choices=[self.choices[i] for i in order])
+
+    def analyze(self):
+        """
+        Finds rules that never fire because earlier rules cover every input that they match,
+        or because they can't match any input, and the Next targets that only such rules lead to.
+        Returns a ``choice_analysis.ChoiceAnalysis``.
+        """
+        from .choice_analysis import analyze_choice
+        return analyze_choice(self)
+
+    def route_batch(self, records: Iterable, errors: str="raise") -> List[Optional[str]]:
+        """
+        Returns the name of the next state for each of ``records``, as ``execute`` would,
+        evaluating each rule over the whole batch at once rather than record by record.
+
+        With ``errors="raise"``, raises the exception that ``execute`` raises on the first record
+        it fails on. With ``errors="ignore"``, returns ``None`` for such records.
+        """
+        from .choice_batch import route_batch
+        return route_batch(self, records, errors=errors)
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
         for choice_rule in self.choices:
             if choice_rule.matches(input):
                 return choice_rule.next, input
@@ -271,9 +417,31 @@ class Wait(State):
         if self.next is None:
             c["End"] = True
 
-    def execute(self, input, resource_resolver: Callable=None):
-        # TODO We don't actually do any waiting here, but perhaps we could delegate it to some predefined resource.
+    def get_wait_seconds(self, input, now: float) -> float:
+        """
+        Returns the number of seconds to wait from ``now`` (seconds since the epoch).
+        """
+        if self.seconds is not None:
+            return self.seconds
+        elif self.seconds_path:
+            return get_path(input, self.seconds_path)
+        elif self.timestamp or self.timestamp_path:
+            if self.timestamp:
+                timestamp = self.timestamp
+            else:
+                timestamp = get_path(input, self.timestamp_path)
+            if timestamp.endswith("Z"):
+                timestamp = timestamp[:-1] + "+00:00"
+            return dt.datetime.fromisoformat(timestamp).timestamp() - now
+        return 0
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
+        """
+        Waits on the ``clock``. Without a clock, the wait is skipped.
+        """
         state_input = self.format_state_input(input)
+        if clock is not None:
+            clock.sleep(self.get_wait_seconds(state_input, now=clock.now()))
         state_output = self.format_state_output(state_input)
         return self.next, state_output
 
@@ -292,7 +460,7 @@ class Fail(State):
     cause: str = None
     error: str = None
 
-    def execute(self, input, resource_resolver: Callable=None):
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
         # TODO No idea what should we do here.
         return None, None
 
@@ -301,6 +469,9 @@ class Fail(State):
 class Succeed(State):
     type: str = States.Succeed
 
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None):
+        return None, self.format_state_output(self.format_state_input(input))
+
 
 @dataclasses.dataclass
 class Parallel(Task):
@@ -318,10 +489,7 @@ class Parallel(Task):
     @classmethod
     def parse_list(cls, raw: List, **fields) -> "Parallel":
         assert isinstance(raw, List)
-        return cls(
-            branches=[Sequence.parse_list(raw_branch) for raw_branch in raw],
-            **fields,
-        )
+        return _parse_list_notation(raw, cls, fields, parallel=True)
 
     @classmethod
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
@@ -331,6 +499,13 @@ class Parallel(Task):
         if self.next is None:
             c["End"] = True
 
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None, branch_runner=None):
+        state_input = self.format_state_input(input)
+        branch_input = self.format_parameters(state_input)
+        results = branch_runner.run([(branch, branch_input) for branch in self.branches])
+        result = self.format_result(input, self.format_result_selector(results))
+        return self.next, self.format_state_output(result)
+
     def dry_run(self, trace: List):
         parallel_trace = []
         for branch in self.branches:
@@ -341,6 +516,66 @@ class Parallel(Task):
         return self.next
 
 
+@dataclasses.dataclass
+class Map(Task):
+
+    _FIELDS = bidict(
+        **Task._FIELDS,
+        **{
+            "items_path": "ItemsPath",
+            "iterator": "Iterator",
+            "max_concurrency": "MaxConcurrency",
+        },
+    )
+
+    type: str = States.Map
+    items_path: str = None
+    iterator: "Sequence" = None
+    max_concurrency: int = None
+
+    @classmethod
+    def parse_dict(cls, d: Dict, fields: Dict) -> None:
+        # In list notation, Iterator can be a list of states to run for each item.
+        raw_iterator = d.get("Iterator")
+        if raw_iterator is None:
+            return
+        elif isinstance(raw_iterator, list):
+            machine = Machine.parse(raw_iterator)
+            fields["iterator"] = Sequence(start_at=machine.start_at, states=machine.states)
+        else:
+            fields["iterator"] = State.parse(raw_iterator, type="Sequence")
+
+    def compile_dict(self, c: Dict):
+        if self.next is None:
+            c["End"] = True
+
+    def execute(self, input, resource_resolver: Callable=None, clock: Clock=None, branch_runner=None):
+        state_input = self.format_state_input(input)
+        items = get_path(state_input, self.items_path) if self.items_path else state_input
+        if not isinstance(items, list):
+            raise TypeError(f"Map state {self.name!r} expected a list of items, got {type(items).__name__}")
+        if self.parameters is not None:
+            # Parameters select the input of each iteration, with the item available in the context object.
+            build = self.template_builder("parameters")
+            state_context = {"Name": self.name}
+            items = [
+                build(state_input, {"State": state_context, "Map": {"Item": {"Index": i, "Value": item}}})
+                for i, item in enumerate(items)
+            ]
+        results = branch_runner.run(
+            [(self.iterator, item) for item in items],
+            max_concurrency=self.max_concurrency or 0,
+        )
+        result = self.format_result(input, self.format_result_selector(results))
+        return self.next, self.format_state_output(result)
+
+    def dry_run(self, trace: List):
+        iterator_trace = []
+        self.iterator.dry_run(iterator_trace)
+        trace.append(iterator_trace)
+        return self.next
+
+
 @dataclasses.dataclass
 class Sequence(State):
     _FIELDS = bidict(
@@ -361,25 +596,10 @@ class Sequence(State):
 
     @classmethod
     def parse_list(cls, raw: List, **fields) -> "State":
-        if not isinstance(raw, list):
-            raise TypeError(raw)
         if raw and all(isinstance(item, list) for item in raw):
             assert not fields
             return Parallel.parse_list(raw)
-        else:
-            states = []
-            for raw_state in raw:
-                if isinstance(raw_state, list):
-                    states.append(Sequence.parse_list(raw_state))
-                else:
-                    states.append(Task.parse(raw_state))
-        for i, state in enumerate(states[:-1]):
-            state.next = states[i + 1].name
-        return cls(
-            start_at=states[0].name if states else None,
-            states={s.name: s for s in states},
-            **fields,
-        )
+        return _parse_list_notation(raw, cls, fields, parallel=False)
 
     @classmethod
     def parse_dict(cls, d: Dict, fields: Dict) -> None:
@@ -420,12 +640,31 @@ class Sequence(State):
 
     def remove(self, name: str):
         removed_state = self.states[name]
+        self.redirect(name, removed_state.next)
+        del self.states[name]
+
+    def redirect(self, name: str, to: Optional[str]):
+        """
+        Makes all transitions to state ``name``, including those of Choice rules
+        and Catch handlers, go to state ``to`` instead.
+        """
         for state in self.states.values():
             if state.next == name:
-                state.next = removed_state.next
+                state.next = to
+            if isinstance(state, Choice):
+                for choice_rule in state.choices:
+                    if choice_rule.next == name:
+                        choice_rule.next = to
+                    # The operator compiles the Next field of the rule.
+                    if choice_rule.operator is not None and choice_rule.operator.next == name:
+                        choice_rule.operator.next = to
+                if state.default == name:
+                    state.default = to
+            for catcher in getattr(state, "catch", None) or ():
+                if catcher.get("Next") == name:
+                    catcher["Next"] = to
         if self.start_at == name:
-            self.start_at = removed_state.next
-        del self.states[name]
+            self.start_at = to
 
     def append(self, raw):
         new_state = State.parse(raw)
@@ -446,6 +685,79 @@ class Sequence(State):
             s.next = new_state.name
 
 
+class _ListFrame:
+    """
+    A list being parsed by ``_parse_list_notation``.
+    """
+
+    __slots__ = ("items", "position", "parsed", "cls", "fields", "parallel")
+
+    def __init__(self, items: List, cls: Type, fields: Dict, parallel: bool):
+        if not isinstance(items, list):
+            raise TypeError(items)
+        self.items = items
+        self.position = 0
+        self.parsed = []
+        self.cls = cls
+        self.fields = fields
+        self.parallel = parallel
+
+    def build(self) -> State:
+        if self.parallel:
+            return self.cls(branches=self.parsed, **self.fields)
+        states = self.parsed
+        for i in range(len(states) - 1):
+            states[i].next = states[i + 1].name
+        return self.cls(
+            start_at=states[0].name if states else None,
+            states={s.name: s for s in states},
+            **self.fields,
+        )
+
+
+def _nested_frame(items: List) -> _ListFrame:
+    # A list in which all items are lists is a Parallel, any other list is a Sequence.
+    if isinstance(items, list) and items and all(isinstance(item, list) for item in items):
+        return _ListFrame(items, Parallel, {}, parallel=True)
+    return _ListFrame(items, Sequence, {}, parallel=False)
+
+
+def _parse_list_notation(raw: List, cls: Type, fields: Dict, parallel: bool) -> State:
+    """
+    Parses list notation in a single pass with an explicit stack, so there is no limit on nesting.
+
+    Items that are neither lists, dictionaries nor states become Tasks named ``str(item)``,
+    constructed directly rather than through ``Task.parse``.
+    """
+    stack = [_ListFrame(raw, cls, fields, parallel)]
+    while True:
+        frame = stack[-1]
+        items = frame.items
+        parsed = frame.parsed
+        position = frame.position
+        while position < len(items):
+            item = items[position]
+            position += 1
+            if isinstance(item, list):
+                stack.append(_nested_frame(item))
+                break
+            elif frame.parallel:
+                raise TypeError(item)
+            elif isinstance(item, (dict, Node)):
+                parsed.append(Task.parse(item))
+            else:
+                parsed.append(Task(name=str(item), obj=item))
+        frame.position = position
+        if stack[-1] is not frame:
+            continue
+
+        stack.pop()
+        state = frame.build()
+        if not stack:
+            return state
+        stack[-1].parsed.append(state)
+
+
 @dataclasses.dataclass
 class Machine(Sequence):
     _FIELDS = bidict(
@@ -474,6 +786,32 @@ class Machine(Sequence):
         else:
             raise TypeError(raw)
 
+    def diff(self, other: "Machine") -> List:
+        """
+        Returns the list of ``Edit``-s that turn this state machine into ``other``:
+        added, removed and changed states, changed transitions and changed fields by States Language name.
+        Returns an empty list if the two are structurally equal.
+        """
+        from .diffing import diff_machines
+        return diff_machines(self, other)
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the structure of this state machine -- equal for machines that ``diff`` finds equal.
+        """
+        from .diffing import fingerprint
+        return fingerprint(self)
+
+    @classmethod
+    def load(cls, fp: IO, chunk_size: int=65536, **fields) -> "Machine":
+        """
+        Parses a state machine definition from JSON file ``fp`` (text or binary) incrementally:
+        each entry of ``States`` is parsed as soon as it has been read.
+        Uses ``ijson`` for binary files if it is installed.
+        """
+        from .loading import load_machine
+        return load_machine(fp, chunk_size=chunk_size, **fields)
+
     def to_json(self, json_options=None, state_visitor: Callable[[State, Dict], None]=None):
         """
         Generate a JSON that can be used as a State Machine definition.
@@ -485,6 +823,17 @@ class Machine(Sequence):
         json_options.setdefault("indent", 4)
         return json.dumps(self.compile(state_visitor=state_visitor), **json_options)
 
+    def optimize(self, **options) -> "Machine":
+        """
+        Returns a smaller equivalent state machine: unreachable states are removed,
+        consecutive Pass states merged and zero-second Waits dropped. This state machine is not modified.
+
+        Each optimization can be switched off, see ``optimizer.optimize_machine``. With ``collapse_parallels=True``,
+        Parallels with a single branch are also collapsed into plain sequences -- which changes their output.
+        """
+        from .optimizer import optimize_machine
+        return optimize_machine(self, **options)
+
     def dry_run(self, trace: List=None):
         """
         DEPRECATED.
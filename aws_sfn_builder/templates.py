@@ -0,0 +1,99 @@
+"""
+Payload templates -- the Parameters and ResultSelector fields.
+
+A template is compiled once into a builder function. Only values of the keys ending with ``.$``
+are evaluated, with precompiled path getters or intrinsic functions (see ``intrinsics``).
+Static parts of the template are copied into each payload, so payloads never share them
+with the template or with each other.
+"""
+import copy
+from typing import Any, Callable, Dict, List, Tuple
+
+from .intrinsics import compile_intrinsic, is_intrinsic
+from .paths import compile_getter
+
+Builder = Callable[[Any, Any], Any]
+
+
+def _compile_value(value: Any) -> Tuple[bool, Any]:
+    """
+    Returns ``(True, builder)`` if ``value`` contains dynamic parts, ``(False, value)`` otherwise.
+    """
+    if isinstance(value, dict):
+        static: Dict[str, Any] = {}
+        dynamic: List[Tuple[str, Builder]] = []
+        for key, item in value.items():
+            if key.endswith(".$"):
+                dynamic.append((key[:-2], _compile_path(key, item)))
+            else:
+                is_dynamic, compiled = _compile_value(item)
+                if is_dynamic:
+                    dynamic.append((key, compiled))
+                else:
+                    static[key] = compiled
+        if not dynamic:
+            return False, value
+
+        # Scalars can be shared, containers are copied.
+        scalars = {key: item for key, item in static.items() if not isinstance(item, (dict, list))}
+        containers = [(key, item) for key, item in static.items() if isinstance(item, (dict, list))]
+
+        def build_dict(input, context):
+            payload = dict(scalars)
+            for key, item in containers:
+                payload[key] = copy.deepcopy(item)
+            for key, build in dynamic:
+                payload[key] = build(input, context)
+            return payload
+
+        return True, build_dict
+
+    if isinstance(value, list):
+        compiled_items = [_compile_value(item) for item in value]
+        if not any(is_dynamic for is_dynamic, _ in compiled_items):
+            return False, value
+
+        def build_list(input, context):
+            return [
+                compiled(input, context) if is_dynamic else copy.deepcopy(compiled)
+                for is_dynamic, compiled in compiled_items
+            ]
+
+        return True, build_list
+
+    return False, value
+
+
+def _compile_path(key: str, path: Any) -> Builder:
+    if not isinstance(path, str):
+        raise ValueError(f"Value of {key!r} must be a path, got {path!r}")
+    if path.startswith("$$"):
+        get = compile_getter(path[1:])
+
+        def get_from_context(input, context):
+            return get(context)
+
+        return get_from_context
+    elif path.startswith("$"):
+        get = compile_getter(path)
+
+        def get_from_input(input, context):
+            return get(input)
+
+        return get_from_input
+    elif is_intrinsic(path):
+        return compile_intrinsic(path)
+    else:
+        raise ValueError(f"Value of {key!r} must be a path or an intrinsic function, got {path!r}")
+
+
+def compile_template(template: Any) -> Builder:
+    """
+    Compiles a Parameters or ResultSelector template into a function
+    that takes ``input`` and the context object ``context`` (what ``$$`` refers to)
+    and returns the payload.
+    """
+    is_dynamic, compiled = _compile_value(template)
+    if is_dynamic:
+        return compiled
+    return lambda input, context: copy.deepcopy(compiled)
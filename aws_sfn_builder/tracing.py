@@ -0,0 +1,270 @@
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+
+class StateTrace:
+    """
+    Measurements of a single state execution, passed to all ``Tracer`` callbacks.
+
+    All durations are in nanoseconds as returned by ``time.perf_counter_ns``.
+    ``provider_ns`` is the time spent inside resource providers, the rest of
+    ``duration_ns`` (``overhead_ns``) is spent processing paths and the state itself.
+    ``input_size`` and ``output_size`` are estimated sizes of the payloads as JSON, ``None`` unless
+    the tracer sets ``measure_payloads`` or the runner has a payload monitor.
+    ``result`` is what the resource of a Task state returned, before ResultSelector and ResultPath.
+    ``error`` is the name of the error caught by the state's Catch field, if any.
+    """
+
+    __slots__ = (
+        "state", "name", "type", "input_size", "output_size", "started_ns", "duration_ns", "provider_ns",
+        "result", "error",
+    )
+
+    def __init__(self, state, input_size: int=None):
+        self.state = state
+        self.name = state.name
+        self.type = state.type
+        self.input_size = input_size
+        self.output_size = None
+        self.started_ns = 0
+        self.duration_ns = 0
+        self.provider_ns = 0
+        self.result = None
+        self.error = None
+
+    @property
+    def overhead_ns(self) -> int:
+        return self.duration_ns - self.provider_ns
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name!r} ({self.type}) {self.duration_ns}ns>"
+
+
+class Tracer:
+    """
+    Base class for execution tracers.
+
+    Pass an instance to ``Runner(tracer=...)``. All callbacks are no-ops,
+    override the ones you need.
+
+    Set ``measure_payloads`` to have sizes of state inputs and outputs measured for ``StateTrace``.
+    """
+
+    measure_payloads = False
+
+    def use_clock(self, clock) -> None:
+        """
+        Called before ``on_execution_start`` with the ``Clock`` of the execution, or ``None`` if it has none.
+        """
+        pass
+
+    def on_execution_start(self, sm, input: Any) -> None:
+        pass
+
+    def on_execution_end(self, state, output: Any, error: Exception=None) -> None:
+        """
+        Called when the execution stops -- ``state`` is the last state executed,
+        ``error`` is set if the execution failed with an exception.
+        """
+        pass
+
+    def on_state_enter(self, trace: StateTrace, input: Any) -> None:
+        pass
+
+    def on_state_exit(self, trace: StateTrace, output: Any) -> None:
+        pass
+
+    def on_transition(self, from_state: str, to_state: str) -> None:
+        pass
+
+    def on_error(self, trace: StateTrace, error: Exception) -> None:
+        pass
+
+
+class CompositeTracer(Tracer):
+    """
+    Forwards all callbacks to each of the wrapped tracers in order.
+    """
+
+    def __init__(self, *tracers: Tracer):
+        self.tracers = tracers
+        self.measure_payloads = any(tracer.measure_payloads for tracer in tracers)
+
+    def use_clock(self, clock) -> None:
+        for tracer in self.tracers:
+            tracer.use_clock(clock)
+
+    def on_execution_start(self, sm, input: Any) -> None:
+        for tracer in self.tracers:
+            tracer.on_execution_start(sm, input)
+
+    def on_execution_end(self, state, output: Any, error: Exception=None) -> None:
+        for tracer in self.tracers:
+            tracer.on_execution_end(state, output, error=error)
+
+    def on_state_enter(self, trace: StateTrace, input: Any) -> None:
+        for tracer in self.tracers:
+            tracer.on_state_enter(trace, input)
+
+    def on_state_exit(self, trace: StateTrace, output: Any) -> None:
+        for tracer in self.tracers:
+            tracer.on_state_exit(trace, output)
+
+    def on_transition(self, from_state: str, to_state: str) -> None:
+        for tracer in self.tracers:
+            tracer.on_transition(from_state, to_state)
+
+    def on_error(self, trace: StateTrace, error: Exception) -> None:
+        for tracer in self.tracers:
+            tracer.on_error(trace, error)
+
+
+class TimedResolver:
+    """
+    Wraps a resource resolver so that time spent in the resolved providers
+    is accumulated in ``provider_ns``, and the last result they returned kept in ``result``.
+
+    Not thread-safe -- branches that run in other threads each time their providers
+    on a ``fork``, which is added to this resolver by ``join`` once they have all finished.
+    """
+
+    __slots__ = ("_resolve", "provider_ns", "result")
+
+    def __init__(self, resolve: Callable):
+        self._resolve = resolve
+        self.provider_ns = 0
+        self.result = None
+
+    def __call__(self, resource_arn: str) -> Callable:
+        provider = self._resolve(resource_arn)
+
+        def timed_provider(payload):
+            started_ns = time.perf_counter_ns()
+            try:
+                result = provider(payload)
+            finally:
+                self.provider_ns += time.perf_counter_ns() - started_ns
+            self.result = result
+            return result
+
+        return timed_provider
+
+    def fork(self) -> "TimedResolver":
+        """
+        Returns a resolver with a counter of its own, for a branch.
+        """
+        return TimedResolver(self._resolve)
+
+    def join(self, forks: List["TimedResolver"], concurrent: bool) -> None:
+        """
+        Adds the provider time of finished ``forks``. Of branches that ran concurrently,
+        only the slowest one counts, so that ``provider_ns`` never exceeds the wall time of the state.
+        """
+        if not forks:
+            return
+        if concurrent:
+            self.provider_ns += max(fork.provider_ns for fork in forks)
+        else:
+            self.provider_ns += sum(fork.provider_ns for fork in forks)
+
+
+class _HotSpot:
+    __slots__ = (
+        "name", "type", "count", "errors", "total_ns", "provider_ns", "max_ns",
+        "measured", "input_bytes", "output_bytes",
+    )
+
+    def __init__(self, name: str, type: str):
+        self.name = name
+        self.type = type
+        self.count = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.provider_ns = 0
+        self.max_ns = 0
+        self.measured = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+
+class HotSpotTracer(Tracer):
+    """
+    Aggregates state executions per state name.
+
+    Usage:
+
+        tracer = HotSpotTracer()
+        runner = Runner(tracer=tracer)
+        runner.run(sm)
+        tracer.print_report()
+
+    With ``measure_payloads``, the report includes average sizes of state inputs and outputs,
+    at the cost of estimating them on every transition.
+    """
+
+    def __init__(self, measure_payloads: bool=False):
+        self.measure_payloads = measure_payloads
+        self.spots: Dict[str, _HotSpot] = {}
+        self.transitions = 0
+
+    def _spot(self, trace: StateTrace) -> _HotSpot:
+        spot = self.spots.get(trace.name)
+        if spot is None:
+            spot = self.spots[trace.name] = _HotSpot(trace.name, trace.type)
+        return spot
+
+    def on_state_exit(self, trace: StateTrace, output: Any) -> None:
+        spot = self._spot(trace)
+        spot.count += 1
+        spot.total_ns += trace.duration_ns
+        spot.provider_ns += trace.provider_ns
+        if trace.duration_ns > spot.max_ns:
+            spot.max_ns = trace.duration_ns
+        if trace.input_size is not None and trace.output_size is not None:
+            spot.measured += 1
+            spot.input_bytes += trace.input_size
+            spot.output_bytes += trace.output_size
+
+    def on_transition(self, from_state: str, to_state: str) -> None:
+        self.transitions += 1
+
+    def on_error(self, trace: StateTrace, error: Exception) -> None:
+        self._spot(trace).errors += 1
+
+    def hot_spots(self, limit: int=None) -> List[_HotSpot]:
+        """
+        Returns aggregated states, the ones with the largest total time first.
+        """
+        spots = sorted(self.spots.values(), key=lambda s: s.total_ns, reverse=True)
+        return spots[:limit] if limit else spots
+
+    def report(self, limit: int=None) -> str:
+        header = (
+            "State", "Type", "Count", "Errors", "Total ms", "Provider ms", "Overhead ms", "Max ms", "Avg in", "Avg out",
+        )
+        rows = [header]
+        for spot in self.hot_spots(limit=limit):
+            rows.append((
+                spot.name,
+                spot.type,
+                str(spot.count),
+                str(spot.errors),
+                f"{spot.total_ns / 1e6:.3f}",
+                f"{spot.provider_ns / 1e6:.3f}",
+                f"{(spot.total_ns - spot.provider_ns) / 1e6:.3f}",
+                f"{spot.max_ns / 1e6:.3f}",
+                str(spot.input_bytes // spot.measured) if spot.measured else "-",
+                str(spot.output_bytes // spot.measured) if spot.measured else "-",
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for row in rows:
+            lines.append("  ".join(
+                cell.ljust(widths[i]) if i < 2 else cell.rjust(widths[i])
+                for i, cell in enumerate(row)
+            ).rstrip())
+        return "\n".join(lines)
+
+    def print_report(self, limit: int=None, file: Optional[TextIO]=None) -> None:
+        print(self.report(limit=limit), file=file or sys.stdout)
@@ -24,7 +24,7 @@ setup(
     description="AWS Step Functions: state machine boilerplate generator",
     long_description=read("README.rst"),
     packages=find_packages(exclude=["integration_tests", "tests"]),
-    python_requires=">=3.6.0",
+    python_requires=">=3.7.0",
     install_requires=[
         "bidict",
         "dataclasses",
@@ -43,7 +43,6 @@ setup(
         "Intended Audience :: Developers",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "License :: OSI Approved :: MIT License",
     ],
@@ -0,0 +1,165 @@
+import time
+
+import pytest
+
+from aws_sfn_builder import Budget, BudgetExceeded, Machine, Runner, VirtualClock
+
+
+def choice_loop():
+    return Machine.parse({
+        "StartAt": "Check",
+        "States": {
+            "Check": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.done", "BooleanEquals": True, "Next": "Done"}],
+                "Default": "Wait",
+            },
+            "Wait": {
+                "Type": "Wait",
+                "Seconds": 60,
+                "Next": "Check",
+            },
+            "Done": {
+                "Type": "Succeed",
+            },
+        },
+    })
+
+
+def test_detects_infinite_loop_immediately():
+    clock = VirtualClock(start=0)
+    runner = Runner(clock=clock)
+
+    with pytest.raises(BudgetExceeded) as exc_info:
+        runner.run(choice_loop(), input={"done": False})
+
+    # Fails the first time the loop comes back to the same state with the same input.
+    assert "after 3 transitions" in str(exc_info.value)
+    assert "Check -> Wait -> Check" in str(exc_info.value)
+    assert clock.now() == 60
+
+
+def test_loop_with_tasks_stops_at_max_transitions():
+    sm = Machine.parse({
+        "StartAt": "Poll",
+        "States": {
+            "Poll": {"Type": "Task", "Resource": "poll", "Next": "Poll"},
+        },
+    })
+    runner = Runner(budget=Budget(max_transitions=100))
+    runner.resource_provider("poll")(lambda x: x)
+
+    with pytest.raises(BudgetExceeded) as exc_info:
+        runner.run(sm)
+    assert "100 transitions" in str(exc_info.value)
+
+
+@pytest.mark.parametrize("state_type", ["Parallel", "Map"])
+def test_budget_exceeded_in_branches_is_not_caught(state_type):
+    loop = choice_loop().compile()
+    state = {
+        "Type": state_type,
+        "Retry": [{"ErrorEquals": ["States.ALL"], "MaxAttempts": 2}],
+        "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "Caught"}],
+        "End": True,
+    }
+    if state_type == "Parallel":
+        state["Branches"] = [loop]
+    else:
+        state["Iterator"] = loop
+    sm = Machine.parse({
+        "StartAt": "Branches",
+        "States": {"Branches": state, "Caught": {"Type": "Succeed"}},
+    })
+
+    with pytest.raises(BudgetExceeded) as exc_info:
+        Runner().run(sm, input=[{"done": False}] if state_type == "Map" else {"done": False})
+    assert "Check -> Wait -> Check" in str(exc_info.value)
+
+
+def test_transitions_in_branches_count_towards_the_execution():
+    sm = Machine.parse({
+        "StartAt": "Items",
+        "States": {
+            "Items": {
+                "Type": "Map",
+                "Iterator": Machine.parse([
+                    {"Type": "Pass", "Name": "a"},
+                    {"Type": "Pass", "Name": "b"},
+                    {"Type": "Pass", "Name": "c"},
+                ]).compile(),
+                "End": True,
+            },
+        },
+    })
+    items = list(range(10))
+
+    # The Map state and 3 states for each of the 10 items.
+    assert Runner(budget=Budget(max_transitions=31)).run(sm, input=items)[1] == items
+    with pytest.raises(BudgetExceeded) as exc_info:
+        Runner(budget=Budget(max_transitions=30)).run(sm, input=items)
+    assert "30 transitions" in str(exc_info.value)
+
+
+def test_enforces_timeout_seconds_on_virtual_clock():
+    sm = choice_loop()
+    sm.timeout_seconds = 3600
+
+    clock = VirtualClock(start=0)
+    runner = Runner(clock=clock, budget=Budget(detect_cycles=False))
+
+    with pytest.raises(BudgetExceeded) as exc_info:
+        runner.run(sm, input={"done": False})
+    assert exc_info.value.error == "States.Timeout"
+    assert 3600 < clock.now() <= 3660
+
+
+def test_enforces_max_wall_seconds():
+    sm = Machine.parse({
+        "StartAt": "Poll",
+        "States": {
+            "Poll": {"Type": "Task", "Resource": "poll", "Next": "Poll"},
+        },
+    })
+    runner = Runner(budget=Budget(max_transitions=None, max_wall_seconds=0.05, wall_check_interval=1))
+    runner.resource_provider("poll")(lambda x: time.sleep(0.01))
+
+    with pytest.raises(BudgetExceeded) as exc_info:
+        runner.run(sm)
+    assert "wall time" in str(exc_info.value)
+
+
+def test_terminating_loop_is_not_reported():
+    sm = choice_loop()
+    runner = Runner()
+    runner.resource_provider("poll")(lambda x: x)
+    final_state, output = runner.run(sm, input={"done": True})
+    assert final_state.name == "Done"
+
+
+def test_payloads_that_are_equal_but_of_other_types_are_not_a_loop():
+    sm = Machine.parse({
+        "StartAt": "Check",
+        "States": {
+            "Check": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.x", "StringEquals": "True", "Next": "Done"}],
+                "Default": "Set",
+            },
+            "Set": {"Type": "Pass", "Result": True, "ResultPath": "$.x", "Next": "Check"},
+            "Done": {"Type": "Succeed"},
+        },
+    })
+    final_state, output = Runner().run(sm, input={"x": 1})
+    assert final_state.name == "Done"
+    assert output == {"x": True}
+
+
+def test_infinite_loop_with_timeout_seconds_fails_with_timeout():
+    sm = choice_loop()
+    sm.timeout_seconds = 3600
+
+    with pytest.raises(BudgetExceeded) as exc_info:
+        Runner(clock=VirtualClock(start=0)).run(sm, input={"done": False})
+    assert exc_info.value.error == "States.Timeout"
+    assert "infinite loop" in str(exc_info.value)
@@ -0,0 +1,97 @@
+from aws_sfn_builder import LRU, Machine, ResourceManager, Runner, clear_all_caches
+from aws_sfn_builder.caching import payload_key
+
+
+def test_payload_key_is_canonical():
+    assert payload_key({"a": 1, "b": [1, 2]}) == payload_key({"b": [1, 2], "a": 1})
+    assert payload_key({"a": 1}) != payload_key({"a": 2})
+
+
+def test_cached_provider_runs_once_per_distinct_input():
+    calls = []
+    resources = ResourceManager()
+
+    @resources.provider("lookup", cache=LRU(maxsize=10))
+    def lookup(payload):
+        calls.append(payload)
+        return {"value": payload["key"] * 2}
+
+    sm = Machine.parse([{"Resource": "lookup", "InputPath": "$.query", "ResultPath": "$.result"}])
+    runner = Runner(resources=resources)
+
+    for key in [1, 2, 1, 1, 2]:
+        final_state, output = runner.run(sm, input={"query": {"key": key}})
+        assert output["result"] == {"value": key * 2}
+
+    assert calls == [{"key": 1}, {"key": 2}]
+    stats = resources.cache_stats()["lookup"]
+    assert stats["hits"] == 3
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.6
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRU(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert len(cache) == 2
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+    assert "b" not in cache._entries
+
+
+def test_lru_expires_entries_after_ttl():
+    now = [0.0]
+    cache = LRU(ttl=10, timer=lambda: now[0])
+    cached = cache.wrap(lambda payload: now[0])
+
+    assert cached({}) == 0.0
+    now[0] = 5.0
+    assert cached({}) == 0.0
+    now[0] = 11.0
+    assert cached({}) == 11.0
+    assert cache.evictions == 1
+
+
+def test_clear_all_caches():
+    cache = LRU()
+    cache.put("a", 1)
+    clear_all_caches()
+    assert len(cache) == 0
+
+
+def test_shared_cache_keys_results_by_resource():
+    cache = LRU(maxsize=10)
+    resources = ResourceManager()
+
+    @resources.provider("double", cache=cache)
+    def double(payload):
+        return payload * 2
+
+    @resources.provider("square", cache=cache)
+    def square(payload):
+        return payload * payload
+
+    assert resources.resolve("double")(3) == 6
+    assert resources.resolve("square")(3) == 9
+    assert cache.stats()["misses"] == 2
+
+
+def test_payloads_that_are_not_json_are_not_cached():
+    class Opaque:
+        def __init__(self, value):
+            self.value = value
+
+        def __repr__(self):
+            return "Opaque()"
+
+    cache = LRU(maxsize=10)
+    cached = cache.wrap(lambda payload: payload.value, resource_arn="opaque")
+
+    assert payload_key(Opaque(1)) is None
+    assert cached(Opaque(1)) == 1
+    assert cached(Opaque(2)) == 2
+    assert len(cache) == 0
@@ -0,0 +1,114 @@
+import pytest
+
+from aws_sfn_builder import (
+    Budget, BudgetExceeded, Checkpoint, CheckpointError, Checkpointer, ExecutionFailed, Machine, Runner, VirtualClock
+)
+
+
+def _poller(example):
+    sm = Machine.parse(example("job_status_poller"))
+
+    def runner(**kwargs):
+        clock = VirtualClock(start=0)
+        runner = Runner(clock=clock, **kwargs)
+        runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")(lambda payload: "job-1")
+
+        @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")
+        def check_job(payload):
+            return "SUCCEEDED" if clock.now() >= 3000 else "RUNNING"
+
+        return runner, clock
+
+    return sm, runner
+
+
+def test_resumes_preempted_execution_from_last_checkpoint(example):
+    sm, runner = _poller(example)
+    uninterrupted, uninterrupted_clock = runner()
+    expected = uninterrupted.run(sm, input={"wait_time": 60})
+
+    saved = []
+    checkpointer = Checkpointer(save=saved.append, every_transitions=10)
+    first, _ = runner(checkpointer=checkpointer, budget=Budget(max_transitions=95))
+    with pytest.raises(BudgetExceeded):
+        first.run(sm, input={"wait_time": 60})
+    assert len(saved) == checkpointer.count == 9
+    assert all(len(data) < 200 for data in saved)
+
+    checkpoint = Checkpoint.loads(saved[-1])
+    assert 80 < checkpoint.transitions <= 95
+    assert checkpoint.state in sm.states
+    assert checkpoint.input["wait_time"] == 60
+    assert 0 < checkpoint.time < 3000
+
+    second, clock = runner()
+    result = second.resume(sm, saved[-1])
+    assert result[0].name == expected[0].name
+    assert result[1] == expected[1]
+    assert clock.now() == uninterrupted_clock.now()
+
+
+def test_checkpoints_every_seconds():
+    sm = Machine.parse({
+        "StartAt": "a",
+        "States": {
+            "a": {"Type": "Pass", "Next": "b"},
+            "b": {"Type": "Pass", "Next": "c"},
+            "c": {"Type": "Pass", "Next": "d"},
+            "d": {"Type": "Pass", "End": True},
+        },
+    })
+    ticks = iter(range(100))
+    checkpointer = Checkpointer(every_seconds=2, timer=lambda: next(ticks))
+    runner = Runner(checkpointer=checkpointer)
+    runner.run(sm, input={"x": 1})
+    assert checkpointer.count == 2
+    assert Checkpoint.loads(checkpointer.latest).state == "d"
+
+
+def test_resume_continues_retry_attempts():
+    sm = Machine.parse({
+        "StartAt": "flaky",
+        "States": {
+            "flaky": {
+                "Type": "Task",
+                "Resource": "arn:flaky",
+                "Retry": [{"ErrorEquals": ["States.ALL"], "MaxAttempts": 2, "IntervalSeconds": 10}],
+                "End": True,
+            },
+        },
+    })
+    calls = []
+    checkpointer = Checkpointer(every_transitions=2)
+    runner = Runner(clock=VirtualClock(start=0), checkpointer=checkpointer)
+
+    @runner.resource_provider("arn:flaky")
+    def flaky(payload):
+        calls.append(payload)
+        raise RuntimeError("Unavailable")
+
+    with pytest.raises(ExecutionFailed):
+        runner.run(sm, input={"id": 1})
+    assert len(calls) == 3
+
+    checkpoint = Checkpoint.loads(checkpointer.latest)
+    assert checkpoint.state == "flaky"
+    assert checkpoint.retry_attempts == {0: 1}
+    assert checkpoint.time == 10
+
+    calls.clear()
+    with pytest.raises(ExecutionFailed):
+        runner.resume(sm, checkpoint)
+    assert calls == [{"id": 1}, {"id": 1}]
+    assert runner._clock.now() == 30
+
+
+def test_rejects_checkpoints_of_other_machines():
+    sm = Machine.parse(["a", "b"])
+    checkpoint = Checkpoint(state="b", input={}, fingerprint=sm.fingerprint())
+    with pytest.raises(CheckpointError):
+        Runner().resume(Machine.parse(["a", "c"]), checkpoint.dumps())
+    with pytest.raises(CheckpointError):
+        Runner().resume(sm, b"garbage")
+    with pytest.raises(ValueError):
+        Checkpointer()
@@ -0,0 +1,181 @@
+from aws_sfn_builder import ChoiceProfiler, Machine, Runner
+from aws_sfn_builder.choice_analysis import Interval, IntervalIndex, IntervalSet, are_exclusive, rule_constraints
+from aws_sfn_builder.states import Choice, State
+
+
+def _choice(*rules, default="other"):
+    return State.parse({"Type": "Choice", "Choices": list(rules), "Default": default}, name="choose")
+
+
+def test_interval_set_algebra():
+    low = IntervalSet([Interval(None, False, 10, False)])
+    high = IntervalSet([Interval(10, True, None, False)])
+    assert low.isdisjoint(high)
+    assert low.union(high) == IntervalSet.everything()
+    assert low.complement() == high
+    assert IntervalSet([Interval(1, True, 1, True)]).complement().intervals == (
+        Interval(None, False, 1, False),
+        Interval(1, False, None, False),
+    )
+    assert IntervalSet([Interval(2, True, 5, True)]).issubset(high.complement().union(low))
+
+
+def test_rule_constraints():
+    choice = _choice(
+        {"Variable": "$.x", "NumericGreaterThan": 5, "Next": "a"},
+        {"Not": {"Variable": "$.x", "NumericGreaterThan": 5}, "Next": "b"},
+        {
+            "And": [
+                {"Variable": "$.x", "NumericGreaterThan": 5},
+                {"Variable": "$.kind", "StringEquals": "big"},
+            ],
+            "Next": "c",
+        },
+        {
+            "Or": [
+                {"Variable": "$.x", "NumericGreaterThan": 5},
+                {"Variable": "$.kind", "StringEquals": "big"},
+            ],
+            "Next": "d",
+        },
+    )
+    a, b, c, d = (rule_constraints(rule) for rule in choice.choices)
+    assert are_exclusive(a, b)
+    assert set(c) == {("$.x", "Numeric"), ("$.kind", "String")}
+    assert d is None
+    assert not are_exclusive(a, d)
+    # Exclusive on $.x, but c reads $.kind which a doesn't, so a failing $.kind must be seen first.
+    assert not are_exclusive(b, c)
+
+
+def test_optimize_moves_hot_exclusive_rules_first():
+    choice = _choice(
+        {"Variable": "$.kind", "StringEquals": "a", "Next": "A"},
+        {"Variable": "$.kind", "StringEquals": "b", "Next": "B"},
+        {"Variable": "$.kind", "StringGreaterThanEquals": "a", "Next": "AZ"},
+        {"Variable": "$.kind", "StringEquals": "z", "Next": "Z"},
+    )
+    optimized = choice.optimize([1, 5, 3, 100])
+    # "z" overlaps the ">= a" rule, so it can't go ahead of it.
+    assert [rule.next for rule in optimized.choices] == ["B", "A", "AZ", "Z"]
+    assert [rule["Next"] for rule in optimized.compile()["Choices"]] == ["B", "A", "AZ", "Z"]
+    assert [rule.next for rule in choice.choices] == ["A", "B", "AZ", "Z"]
+    assert isinstance(optimized, Choice)
+
+    for kind in ("a", "b", "c", "z", "0"):
+        assert optimized.execute({"kind": kind}) == choice.execute({"kind": kind})
+
+
+def test_optimize_with_profile(example):
+    sm = Machine.parse(example("choice_state_x"))
+    profiler = ChoiceProfiler()
+    runner = Runner(choice_profiler=profiler)
+    runner.resource_provider("arn:aws:lambda:*:*:function:*")(lambda payload: payload)
+    for value in (0, 5, 25, 25, 21):
+        runner.run(sm, input={"type": "Private", "value": value})
+
+    choice = sm.states["ChoiceStateX"]
+    optimized = choice.optimize(profiler.profiles["ChoiceStateX"])
+    # The Not rule reads $.type, which the other rules don't, so it stays first.
+    assert [rule.next for rule in optimized.choices] == ["Public", "ValueInTwenties", "ValueIsZero"]
+    for value in (0, 5, 25):
+        assert optimized.execute({"type": "Private", "value": value}) == choice.execute(
+            {"type": "Private", "value": value},
+        )
+
+
+def test_interval_index_merges_and_covers():
+    index = IntervalIndex()
+    index.add(IntervalSet([Interval(0, True, 10, False)]), "a")
+    index.add(IntervalSet([Interval(20, True, 30, True)]), "b")
+    index.add(IntervalSet([Interval(10, True, 15, True)]), "c")
+    assert len(index) == 2
+    assert index.covers(IntervalSet([Interval(5, True, 12, True)])) == {"a", "c"}
+    assert index.covers(IntervalSet([Interval(5, True, 16, True)])) is None
+    index.add(IntervalSet([Interval(15, False, 20, False)]), "d")
+    assert len(index) == 1
+    assert index.covers(IntervalSet([Interval(0, True, 30, True)])) == {"a", "b", "c", "d"}
+    assert index.covers(IntervalSet([Interval(0, False, 30, False)])) is not None
+    assert index.covers(IntervalSet.everything()) is None
+
+
+def test_analyze_finds_shadowed_rules_and_unreachable_targets():
+    choice = _choice(
+        {"Variable": "$.n", "NumericLessThan": 10, "Next": "small"},
+        {"Variable": "$.n", "NumericGreaterThanEquals": 100, "Next": "large"},
+        {
+            "And": [
+                {"Variable": "$.n", "NumericGreaterThanEquals": 2},
+                {"Variable": "$.n", "NumericLessThan": 5},
+            ],
+            "Next": "tiny",
+        },
+        {"Variable": "$.n", "NumericGreaterThanEquals": 10, "Next": "medium"},
+        {
+            "And": [
+                {"Variable": "$.n", "NumericEquals": 50},
+                {"Variable": "$.kind", "StringEquals": "x"},
+            ],
+            "Next": "fifty",
+        },
+        {
+            "And": [
+                {"Variable": "$.n", "NumericGreaterThan": 5},
+                {"Variable": "$.n", "NumericLessThan": 5},
+            ],
+            "Next": "never",
+        },
+        {"Variable": "$.kind", "StringEquals": "x", "Next": "small"},
+        default="medium",
+    )
+    analysis = choice.analyze()
+    assert [(rule.index, rule.next, rule.shadowed_by) for rule in analysis.shadowed] == [
+        (2, "tiny", (0,)),
+        (4, "fifty", (0, 1, 3)),
+        (5, "never", ()),
+    ]
+    assert analysis.unreachable == ["tiny", "fifty", "never"]
+
+
+def test_analyze_covers_through_or_but_not_multi_variable_and():
+    choice = _choice(
+        {
+            "Or": [
+                {"Variable": "$.kind", "StringEquals": "a"},
+                {"Variable": "$.n", "NumericGreaterThan": 0},
+            ],
+            "Next": "first",
+        },
+        {
+            "And": [
+                {"Variable": "$.kind", "StringEquals": "b"},
+                {"Variable": "$.n", "NumericLessThan": 0},
+            ],
+            "Next": "second",
+        },
+        {"Variable": "$.n", "NumericEquals": 5, "Next": "five"},
+        {"Variable": "$.kind", "StringEquals": "b", "Next": "b"},
+        {"Variable": "$.kind", "StringLessThanEquals": "a", "Next": "a"},
+        {"Variable": "$.n", "NumericEquals": "5", "Next": "text"},
+    )
+    analysis = choice.analyze()
+    assert [rule.index for rule in analysis.shadowed] == [2]
+    assert analysis.unreachable == ["five"]
+
+
+def test_analyze_scales_to_many_rules():
+    rules = [{"Variable": "$.n", "NumericGreaterThanEquals": i, "Next": f"from_{i}"} for i in range(500, 0, -1)]
+    rules += [
+        {
+            "And": [
+                {"Variable": "$.n", "NumericGreaterThanEquals": i},
+                {"Variable": "$.n", "NumericLessThan": i + 1},
+            ],
+            "Next": f"at_{i}",
+        }
+        for i in range(1000)
+    ]
+    analysis = _choice(*rules).analyze()
+    assert [rule.index for rule in analysis.shadowed] == list(range(501, 1500))
+    # The ranges of rules 0 .. 500 merge into one, so all of them are reported.
+    assert analysis.shadowed[0].shadowed_by == tuple(range(501))
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from aws_sfn_builder import Machine
+from aws_sfn_builder import choice_batch
+from aws_sfn_builder.states import State
+
+
+@pytest.fixture(params=["numpy", "bits"])
+def masks(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(choice_batch, "numpy", None)
+    return request.param
+
+
+def _routes(choice, records):
+    return [choice.execute(record)[0] for record in records]
+
+
+def test_routes_like_execute(example, masks):
+    choice = Machine.parse(example("choice_state_x")).states["ChoiceStateX"]
+    records = [
+        {"type": random.choice(["Public", "Private"]), "value": random.choice([0, 5, 20, 25, 29.5, 30, "25", 1e20])}
+        for _ in range(500)
+    ]
+    assert choice.route_batch(records) == _routes(choice, records)
+    assert choice.route_batch([]) == []
+
+
+def test_all_operator_kinds(masks):
+    choice = State.parse({
+        "Type": "Choice",
+        "Choices": [
+            {"Variable": "$.flag", "BooleanEquals": True, "Next": "flagged"},
+            {
+                "Or": [
+                    {"Variable": "$.name", "StringLessThan": "b"},
+                    {"Variable": "$.name", "StringGreaterThanEquals": "y"},
+                ],
+                "Next": "edges",
+            },
+            {"Variable": "$.at", "TimestampGreaterThan": "2020-01-01T00:00:00", "Next": "recent"},
+            {"Not": {"Variable": "$.n", "NumericLessThanEquals": 10}, "Next": "big"},
+        ],
+        "Default": "other",
+    }, name="choose")
+    records = [
+        {"flag": flag, "name": name, "at": at, "n": n}
+        for flag in (0, 1, "")
+        for name in ("a", "m", "z", 5)
+        for at in ("2019-05-05T00:00:00", "2021-05-05T00:00:00")
+        for n in (2 ** 60, 10, 10.5, "11")
+    ]
+    assert choice.route_batch(records) == _routes(choice, records)
+
+
+def test_failures_follow_short_circuiting(masks):
+    choice = State.parse({
+        "Type": "Choice",
+        "Choices": [
+            {
+                "And": [
+                    {"Variable": "$.x", "NumericGreaterThan": 0},
+                    {"Variable": "$.y", "StringEquals": "yes"},
+                ],
+                "Next": "both",
+            },
+            {"Variable": "$.x", "NumericEquals": 0, "Next": "zero"},
+        ],
+        "Default": "other",
+    }, name="choose")
+    records = [
+        {"x": 1, "y": "yes"},
+        {"x": -1},  # $.y isn't needed
+        {"x": 0},
+        {"x": 1},  # $.y is missing
+        {"x": "one"},
+        {"y": "yes"},
+    ]
+    assert choice.route_batch(records, errors="ignore") == ["both", "other", "zero", None, None, None]
+    with pytest.raises(KeyError):
+        choice.route_batch(records)
+    with pytest.raises(ValueError):
+        choice.route_batch(records, errors="skip")
@@ -0,0 +1,115 @@
+import pytest
+
+from aws_sfn_builder import ChoiceProfiler, ExecutionFailed, Machine, Runner
+
+
+@pytest.fixture
+def runner():
+    profiler = ChoiceProfiler()
+    runner = Runner(choice_profiler=profiler)
+    runner.resource_provider("arn:aws:lambda:*:*:function:*")(lambda payload: payload)
+    return runner
+
+
+def test_counts_rule_hits_and_default(example, runner):
+    profiler = runner._choice_profiler
+    sm = Machine.parse(example("choice_state_x"))
+
+    inputs = [
+        {"type": "Public", "value": 0},
+        {"type": "Private", "value": 0},
+        {"type": "Private", "value": 0},
+        {"type": "Private", "value": 25},
+        {"type": "Private", "value": 5},
+    ]
+    for input in inputs:
+        runner.run(sm, input=input)
+
+    profile = profiler.profiles["ChoiceStateX"]
+    assert profile.executions == 5
+    assert profile.hits == [1, 2, 1]
+    assert profile.evaluations == [5, 4, 2]
+    assert profile.default_hits == 1
+    assert profile.average_path_length == 11 / 5
+    assert all(cost > 0 for cost in profile.cost_ns)
+    assert profile.uncovered() == []
+
+    hottest = profiler.hottest_rules(limit=2)
+    assert [(rule.index, rule.next, rule.hits) for rule in hottest][0] == (1, "ValueIsZero", 2)
+
+    report = profiler.report()
+    assert report.splitlines()[0].split()[:3] == ["State", "Rule", "Next"]
+    assert "ValueIsZero" in report.splitlines()[1]
+    assert "Default" in report
+
+
+def test_counts_errors_separately(runner):
+    sm = Machine.parse({
+        "StartAt": "choose",
+        "States": {
+            "choose": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.x", "NumericEquals": 1, "Next": "done"}],
+                "Default": "done",
+            },
+            "done": {"Type": "Succeed"},
+        },
+    })
+    with pytest.raises(ExecutionFailed):
+        runner.run(sm, input={})
+    profile = runner._choice_profiler.profiles["choose"]
+    assert (profile.errors, profile.default_hits, profile.evaluations) == (1, 0, [1])
+
+
+def test_counts_choices_in_map_iterations(runner):
+    sm = Machine.parse([
+        {
+            "Type": "Map",
+            "Name": "each",
+            "Iterator": {
+                "StartAt": "choose",
+                "States": {
+                    "choose": {
+                        "Type": "Choice",
+                        "Choices": [{"Variable": "$", "NumericGreaterThan": 10, "Next": "big"}],
+                        "Default": "small",
+                    },
+                    "big": {"Type": "Pass", "Result": "big", "End": True},
+                    "small": {"Type": "Pass", "Result": "small", "End": True},
+                },
+            },
+        },
+    ])
+    _, output = runner.run(sm, input=[1, 20, 30, 4, 50])
+    assert output == ["small", "big", "big", "small", "big"]
+    profile = runner._choice_profiler.profiles["choose"]
+    assert (profile.hits, profile.default_hits) == ([3], 2)
+
+
+def test_tells_apart_choice_states_of_the_same_name(runner):
+    def branch(rules):
+        return {
+            "StartAt": "choose",
+            "States": {
+                "choose": {
+                    "Type": "Choice",
+                    "Choices": [{"Variable": "$", "NumericEquals": i, "Next": "done"} for i in range(rules)],
+                    "Default": "done",
+                },
+                "done": {"Type": "Succeed"},
+            },
+        }
+
+    sm = Machine.parse({
+        "StartAt": "both",
+        "States": {"both": {"Type": "Parallel", "Branches": [branch(1), branch(3)], "End": True}},
+    })
+    for input in [0, 2, 2]:
+        runner.run(sm, input=input)
+
+    profiles = runner._choice_profiler.profiles
+    assert sorted(profiles) == ["choose", "choose [2]"]
+    by_size = {len(profile.hits): profile for profile in profiles.values()}
+    assert by_size[1].hits == [1]
+    assert by_size[3].hits == [1, 0, 2]
+    assert len(runner._choice_profiler.report().splitlines()) == 7
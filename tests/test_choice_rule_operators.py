@@ -108,3 +108,9 @@ def test_nested_ands_and_ors_and_nots():
     assert op.matches({"value": 28})
     assert op.matches({"value": 29})
     assert not op.matches({"value": 30})
+
+
+def test_not_operator():
+    op = Operator.parse({"Not": {"Variable": "$.type", "StringEquals": "Private"}, "Next": "Public"})
+    assert op.matches({"type": "Public"})
+    assert not op.matches({"type": "Private"})
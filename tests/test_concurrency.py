@@ -0,0 +1,77 @@
+import concurrent.futures
+import threading
+
+from aws_sfn_builder import HotSpotTracer, Machine, ResourceManager, Runner, VirtualClock
+
+
+def test_runs_in_many_threads_at_once():
+    sm = Machine.parse([
+        {"Type": "Task", "Name": "submit", "Resource": "arn:aws:lambda:REGION:ACCOUNT_ID:function:Submit"},
+        {"Type": "Wait", "Name": "wait", "Seconds": 60},
+        {"Type": "Task", "Name": "check", "Resource": "arn:aws:lambda:REGION:ACCOUNT_ID:function:Check"},
+    ])
+    runner = Runner()
+    # Every 16 submissions wait for each other, which can only succeed if 16 executions run at once.
+    submitted = threading.Barrier(16, timeout=5)
+
+    @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:Submit")
+    def submit(payload):
+        submitted.wait()
+        return payload
+
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:Check")(lambda payload: payload)
+
+    def run(i):
+        clock = VirtualClock(start=0)
+        tracer = HotSpotTracer()
+        _, output = runner.run(sm, input={"i": i}, clock=clock, tracer=tracer)
+        return output["i"], clock.now(), tracer.transitions
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(run, range(32)))
+
+    assert [i for i, _, _ in results] == list(range(32))
+    # Each execution waits on its own clock and is traced by its own tracer.
+    assert len({(now, transitions) for _, now, transitions in results}) == 1
+
+
+def test_execution_keeps_providers_registered_when_it_started():
+    sm = Machine.parse([
+        {"Type": "Task", "Name": "first", "Resource": "arn:first"},
+        {"Type": "Task", "Name": "second", "Resource": "arn:second"},
+    ])
+    resources = ResourceManager()
+    runner = Runner(resources=resources)
+    entered = threading.Event()
+    release = threading.Event()
+
+    @resources.provider("arn:first")
+    def first(payload):
+        entered.set()
+        release.wait(5)
+        return payload
+
+    resources.provider("arn:second")(lambda payload: "old")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(runner.run, sm)
+        assert entered.wait(5)
+        resources.provider("arn:second")(lambda payload: "new")
+        release.set()
+        assert future.result()[1] == "old"
+
+    assert runner.run(sm)[1] == "new"
+
+
+def test_concurrent_registration_loses_no_providers():
+    resources = ResourceManager()
+
+    def register(i):
+        resources.provider(f"arn:exact:{i}")(lambda payload, i=i: i)
+        resources.provider(f"arn:pattern:{i}:*")(lambda payload, i=i: -i)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(register, range(100)))
+
+    assert all(resources.resolve(f"arn:exact:{i}")(None) == i for i in range(100))
+    assert all(resources.resolve(f"arn:pattern:{i}:x")(None) == -i for i in range(100))
@@ -0,0 +1,63 @@
+from aws_sfn_builder import Edit, Machine
+
+
+def test_equal_machines_have_no_edits_despite_generated_names(example):
+    source = ["a", [["b", "c"], ["d"]], [["e"]], "f"]
+    assert Machine.parse(source).diff(Machine.parse(source)) == []
+    assert Machine.parse(source).fingerprint() == Machine.parse(source).fingerprint()
+
+    sm = Machine.parse(example("job_status_poller"))
+    assert sm.diff(Machine.parse(example("job_status_poller"))) == []
+
+
+def test_reports_added_removed_and_changed_states(example):
+    old = Machine.parse(example("job_status_poller"))
+    definition = example("job_status_poller")
+    states = definition["States"]
+    states["Wait X Seconds"]["SecondsPath"] = "$.wait_time_2"
+    states["Get Job Status"]["Retry"] = [{"ErrorEquals": ["States.ALL"]}]
+    del states["Get Final Job Status"]["Retry"]
+    del states["Job Failed"]
+    states["Job Complete?"]["Choices"][0]["Next"] = "Job Aborted"
+    states["Job Aborted"] = {"Type": "Fail", "Cause": "Aborted"}
+    new = Machine.parse(definition)
+
+    edits = old.diff(new)
+    expected = [
+        Edit("changed", ("Wait X Seconds",), "SecondsPath", "$.wait_time", "$.wait_time_2"),
+        Edit(
+            "changed", ("Get Job Status",), "Retry",
+            [{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 1, "MaxAttempts": 3, "BackoffRate": 2}],
+            [{"ErrorEquals": ["States.ALL"]}],
+        ),
+        Edit(
+            "changed", ("Get Final Job Status",), "Retry",
+            [{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 1, "MaxAttempts": 3, "BackoffRate": 2}],
+            None,
+        ),
+        Edit("removed", ("Job Failed",)),
+        Edit("added", ("Job Aborted",)),
+        Edit("edge", ("Job Complete?",), "Choices[0].Next", "Job Failed", "Job Aborted"),
+    ]
+    assert sorted(edits, key=repr) == sorted(expected, key=repr)
+    assert old.fingerprint() != new.fingerprint()
+
+
+def test_diffs_inside_branches_and_skips_identical_ones():
+    old = Machine.parse(["a", [["b", "c"], ["d"]], "e"])
+    new = Machine.parse(["a", [["b", "c"], ["d", "x"]], "e"])
+    assert old.diff(new) == [
+        Edit("edge", ("a.Next", "1", "d"), "Next", None, "x"),
+        Edit("added", ("a.Next", "1", "x")),
+    ]
+
+
+def test_reports_machine_fields_and_start():
+    old = Machine.parse({"StartAt": "a", "States": {"a": {"Type": "Succeed"}, "b": {"Type": "Succeed"}}})
+    new = Machine.parse({
+        "StartAt": "b", "TimeoutSeconds": 10, "States": {"a": {"Type": "Succeed"}, "b": {"Type": "Succeed"}},
+    })
+    assert old.diff(new) == [
+        Edit("changed", (), "TimeoutSeconds", None, 10),
+        Edit("edge", (), "StartAt", "a", "b"),
+    ]
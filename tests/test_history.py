@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from aws_sfn_builder import (
+    Budget, BudgetExceeded, CompositeTracer, ExecutionHistory, HotSpotTracer, JsonLinesSink, Machine, Runner,
+    VirtualClock,
+)
+from aws_sfn_builder.history import MemorySink
+
+
+def test_history_of_job_status_poller(example):
+    sm = Machine.parse(example("job_status_poller"))
+
+    sink = MemorySink()
+    runner = Runner(tracer=ExecutionHistory(sink, clock=lambda: 0.0))
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob")(lambda x: "job-1")
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob")(lambda x: "SUCCEEDED")
+
+    runner.run(sm)
+
+    assert [e["type"] for e in sink.events] == [
+        "ExecutionStarted",
+        "TaskStateEntered", "TaskScheduled", "TaskStarted", "TaskSucceeded", "TaskStateExited",
+        "WaitStateEntered", "WaitStateExited",
+        "TaskStateEntered", "TaskScheduled", "TaskStarted", "TaskSucceeded", "TaskStateExited",
+        "ChoiceStateEntered", "ChoiceStateExited",
+        "TaskStateEntered", "TaskScheduled", "TaskStarted", "TaskSucceeded", "TaskStateExited",
+        "ExecutionSucceeded",
+    ]
+    assert [e["id"] for e in sink.events] == list(range(1, len(sink.events) + 1))
+    assert sink.events[0]["timestamp"] == "1970-01-01T00:00:00+00:00"
+    assert sink.events[1]["stateEnteredEventDetails"]["name"] == "Submit Job"
+    assert json.loads(sink.events[-1]["executionSucceededEventDetails"]["output"]) == "SUCCEEDED"
+
+
+def test_history_of_failed_execution():
+    sm = Machine.parse([
+        {"Resource": "a", "Next": "failure"},
+        {"Name": "failure", "Type": "Fail", "Error": "E", "Cause": "C"},
+    ])
+
+    sink = MemorySink()
+    runner = Runner(tracer=ExecutionHistory(sink))
+    runner.resource_provider("a")(lambda x: x)
+    runner.run(sm)
+
+    assert sink.events[-2]["type"] == "FailStateEntered"
+    assert sink.events[-1]["type"] == "ExecutionFailed"
+    assert sink.events[-1]["executionFailedEventDetails"] == {"error": "E", "cause": "C"}
+
+
+def test_history_written_as_json_lines_in_batches(tmp_path):
+    sm = Machine.parse([{"Resource": "a"}])
+    path = tmp_path / "history.jsonl"
+
+    hot_spots = HotSpotTracer()
+    with JsonLinesSink(str(path), batch_size=2) as sink:
+        runner = Runner(tracer=CompositeTracer(ExecutionHistory(sink), hot_spots))
+        runner.resource_provider("a")(lambda x: x)
+        runner.run(sm, input={"x": 1})
+        runner.run(sm, input={"x": 2})
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(events) == 14
+    assert [e["id"] for e in events[:7]] == [1, 2, 3, 4, 5, 6, 7]
+    assert events[7]["type"] == "ExecutionStarted"
+    assert events[7]["id"] == 1
+    assert hot_spots.spots["a"].count == 2
+
+
+def test_history_is_timestamped_with_the_clock_of_the_execution():
+    sm = Machine.parse([
+        {"Type": "Wait", "Name": "wait", "Seconds": 86400},
+        {"Type": "Pass", "Name": "done"},
+    ])
+    sink = MemorySink()
+    history = ExecutionHistory(sink)
+    Runner(tracer=history, clock=VirtualClock(start=0)).run(sm)
+
+    timestamps = {e["type"]: e["timestamp"] for e in sink.events}
+    assert timestamps["WaitStateEntered"] == "1970-01-01T00:00:00+00:00"
+    assert timestamps["WaitStateExited"] == "1970-01-02T00:00:00+00:00"
+
+    sink.events.clear()
+    Runner(tracer=history).run(sm)
+    assert sink.events[0]["timestamp"] > "2000"
+
+
+def test_history_of_retried_task():
+    sm = Machine.parse([{
+        "Resource": "flaky",
+        "Name": "flaky",
+        "ResultPath": "$.result",
+        "Retry": [{"ErrorEquals": ["States.ALL"], "IntervalSeconds": 10, "MaxAttempts": 2}],
+    }])
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(payload)
+        if len(attempts) < 2:
+            raise ValueError("not yet")
+        return {"ok": True}
+
+    sink = MemorySink()
+    runner = Runner(tracer=ExecutionHistory(sink), clock=VirtualClock(start=0))
+    runner.resource_provider("flaky")(flaky)
+    runner.run(sm, input={"x": 1})
+
+    assert [e["type"] for e in sink.events] == [
+        "ExecutionStarted",
+        "TaskStateEntered",
+        "TaskScheduled", "TaskStarted", "TaskFailed",
+        "TaskScheduled", "TaskStarted", "TaskSucceeded",
+        "TaskStateExited",
+        "ExecutionSucceeded",
+    ]
+    timestamps = [e["timestamp"] for e in sink.events]
+    assert timestamps == sorted(timestamps)
+    assert timestamps[5] == "1970-01-01T00:00:10+00:00"
+    assert sink.events[4]["taskFailedEventDetails"]["error"] == "ValueError"
+    assert json.loads(sink.events[7]["taskSucceededEventDetails"]["output"]) == {"ok": True}
+    assert json.loads(sink.events[8]["stateExitedEventDetails"]["output"]) == {"x": 1, "result": {"ok": True}}
+
+
+def test_history_of_execution_exceeding_budget():
+    sm = Machine.parse({"StartAt": "Poll", "States": {"Poll": {"Type": "Task", "Resource": "poll", "Next": "Poll"}}})
+
+    sink = MemorySink()
+    runner = Runner(tracer=ExecutionHistory(sink), budget=Budget(max_transitions=3))
+    runner.resource_provider("poll")(lambda x: x)
+    with pytest.raises(BudgetExceeded):
+        runner.run(sm)
+
+    details = sink.events[-1]["executionFailedEventDetails"]
+    assert details["error"] == "BudgetExceeded"
+    assert "3 transitions" in details["cause"]
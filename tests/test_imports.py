@@ -0,0 +1,62 @@
+import json
+import subprocess
+import sys
+
+import aws_sfn_builder
+
+
+def _run(code: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    ).stdout
+    return json.loads(output.decode())
+
+
+def test_importing_package_imports_nothing_else():
+    modules = _run(
+        "import json, sys\n"
+        "before = set(sys.modules)\n"
+        "import aws_sfn_builder\n"
+        "print(json.dumps(sorted(set(sys.modules) - before)))\n"
+    )
+    assert [m for m in modules if m.startswith("aws_sfn_builder.")] == []
+    assert "jsonpath_ng" not in modules
+    assert "bidict" not in modules
+
+
+def test_jsonpath_ng_is_imported_only_for_complex_paths():
+    modules = _run(
+        "import json, sys\n"
+        "from aws_sfn_builder import Machine\n"
+        "from aws_sfn_builder.paths import get_path\n"
+        "Machine.parse(['a', [['b'], ['c']]]).to_json()\n"
+        "simple = [m for m in sys.modules if m.startswith('jsonpath_ng') or m == 'aws_sfn_builder.runner']\n"
+        "get_path({'a': [{'b': 1}]}, '$.a[*].b')\n"
+        "complex = [m for m in sys.modules if m.startswith('jsonpath_ng')]\n"
+        "print(json.dumps({'simple': simple, 'complex': complex}))\n"
+    )
+    assert modules["simple"] == []
+    assert "jsonpath_ng" in modules["complex"]
+
+
+def test_import_time_stays_low():
+    timings = _run(
+        "import json, time\n"
+        "t = time.perf_counter()\n"
+        "import aws_sfn_builder\n"
+        "package = time.perf_counter() - t\n"
+        "t = time.perf_counter()\n"
+        "from aws_sfn_builder import Machine\n"
+        "states = time.perf_counter() - t\n"
+        "print(json.dumps({'package': package, 'states': states}))\n"
+    )
+    # Generous limits -- the package alone takes well under a millisecond,
+    # the states (with bidict and dataclasses) a few tens of milliseconds.
+    assert timings["package"] < 0.05
+    assert timings["states"] < 0.5
+
+
+def test_lazy_exports():
+    assert set(aws_sfn_builder.__all__) <= set(dir(aws_sfn_builder))
+    for name in aws_sfn_builder.__all__:
+        assert getattr(aws_sfn_builder, name).__module__.startswith("aws_sfn_builder.")
@@ -76,3 +76,31 @@ def test_dictionary_with_no_type_defaults_to_task():
     })
 
     assert state.type == States.Task
+
+
+def test_parses_deeply_nested_lists_without_recursion():
+    source = ["leaf"]
+    for _ in range(5000):
+        source = ["a", source]
+    s = Machine.parse(source)
+
+    depth = 0
+    while len(s.states) == 2:
+        s = s.states[s.start_at_state.next]
+        depth += 1
+    assert depth == 5000
+    assert s.start_at == "leaf"
+
+
+def test_items_are_tasks_named_after_str():
+    class Step:
+        def __str__(self):
+            return "step"
+
+    step = Step()
+    s = Machine.parse([step, {"Name": "b", "Resource": "arn:b"}, ["c", "d"]])
+    assert s.start_at_state.name == "step"
+    assert s.start_at_state.obj is step
+    assert s.start_at_state.type == States.Task
+    assert s.states["b"].resource == "arn:b"
+    assert s.dry_run() == ["step", "b", "c", "d"]
@@ -0,0 +1,70 @@
+import io
+import json
+
+import pytest
+
+from aws_sfn_builder import Machine, loading
+from tests import aws_examples_dir
+
+
+@pytest.fixture(params=["ijson", "stdlib"])
+def reader(request, monkeypatch):
+    if request.param == "ijson":
+        if loading.ijson is None:
+            pytest.skip("ijson is not installed")
+    else:
+        monkeypatch.setattr(loading, "ijson", None)
+    return request.param
+
+
+@pytest.mark.parametrize("example_name", ["hello_world", "choice_state_x", "job_status_poller"])
+def test_loads_examples_like_parse(reader, example, example_name):
+    with open(aws_examples_dir / f"{example_name}.json", "rb") as f:
+        sm = Machine.load(f, chunk_size=7)
+    assert sm.compile() == Machine.parse(example(example_name)).compile()
+
+
+def test_loads_text_and_values_split_across_chunks(reader):
+    definition = {
+        "Comment": "Ünïcode",
+        "StartAt": "a",
+        "States": {
+            "a": {"Type": "Pass", "Result": {"x": 1.25, "items": [1, None, True, "ā"]}, "Next": "b"},
+            "b": {"Type": "Wait", "Seconds": 12345, "End": True},
+        },
+        "TimeoutSeconds": 300,
+    }
+    text = json.dumps(definition, indent=2, ensure_ascii=False)
+    for chunk_size in (1, 2, 5, 65536):
+        for fp in (io.StringIO(text), io.BytesIO(text.encode("utf-8"))):
+            sm = Machine.load(fp, chunk_size=chunk_size)
+            assert sm.timeout_seconds == 300
+            assert list(sm.states) == ["a", "b"]
+            assert sm.compile() == Machine.parse(definition).compile()
+
+
+def test_parses_each_state_as_soon_as_it_is_read(reader, monkeypatch):
+    parsed = []
+    original_parse = loading.State.parse
+
+    def recording_parse(raw, **fields):
+        if "name" in fields:
+            parsed.append((fields["name"], fp.tell()))
+        return original_parse(raw, **fields)
+
+    monkeypatch.setattr(loading.State, "parse", recording_parse)
+
+    states = {f"s{i}": {"Type": "Pass", "Result": "x" * 1000, "Next": f"s{i + 1}"} for i in range(100)}
+    states["s100"] = {"Type": "Succeed"}
+    data = json.dumps({"StartAt": "s0", "States": states}).encode("utf-8")
+    fp = io.BytesIO(data)
+
+    sm = Machine.load(fp, chunk_size=4096)
+    assert len(sm.states) == 101
+    assert [name for name, _ in parsed] == list(states)
+    assert parsed[0][1] < len(data) / 10
+
+
+def test_rejects_invalid_json(reader):
+    with pytest.raises(ValueError):
+        Machine.load(io.StringIO('{"StartAt": "a", "States": {"a": '))
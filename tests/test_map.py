@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import ExecutionFailed, Machine, Map, Runner, State, StatesError, VirtualClock
+
+
+def test_map_state():
+    source = {
+        "Type": "Map",
+        "ItemsPath": "$.shipped",
+        "MaxConcurrency": 0,
+        "Iterator": {
+            "StartAt": "Validate",
+            "States": {
+                "Validate": {
+                    "Type": "Task",
+                    "Resource": "arn:aws:lambda:us-east-1:123456789012:function:ship-val",
+                    "End": True,
+                },
+            },
+        },
+        "ResultPath": "$.detail.shipped",
+        "End": True,
+    }
+
+    state = State.parse(source)
+    assert isinstance(state, Map)
+    assert state.iterator.start_at_state.resource == "arn:aws:lambda:us-east-1:123456789012:function:ship-val"
+
+    assert state.compile() == source
+
+
+def test_map_in_list_notation():
+    sm = Machine.parse([
+        "a",
+        {"Type": "Map", "Name": "each", "ItemsPath": "$.items", "Iterator": ["b", "c"]},
+        "d",
+    ])
+    assert sm.dry_run() == ["a", ["b", "c"], "d"]
+
+    c = sm.compile()
+    assert c["States"]["each"]["Iterator"] == {
+        "StartAt": "b",
+        "States": {
+            "b": {"Type": "Task", "Next": "c"},
+            "c": {"Type": "Task", "End": True},
+        },
+    }
+
+
+def test_runs_map_iterations_within_max_concurrency():
+    sm = Machine.parse([
+        {"Type": "Map", "ItemsPath": "$.items", "MaxConcurrency": 2, "Iterator": [{"Resource": "square"}]},
+    ])
+
+    lock = threading.Lock()
+    running = [0, 0]  # current, max
+
+    runner = Runner()
+
+    @runner.resource_provider("square")
+    def square(x):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return x * x
+
+    final_state, output = runner.run(runner.bind(sm), input={"items": list(range(6))})
+    assert output == [0, 1, 4, 9, 16, 25]
+    assert running[1] == 2
+
+
+def test_runs_parallel_branches():
+    sm = Machine.parse([
+        [{"Resource": "double"}],
+        [{"Resource": "double"}, {"Resource": "increment"}],
+    ])
+    runner = Runner()
+    runner.resource_provider("double")(lambda x: x * 2)
+    runner.resource_provider("increment")(lambda x: x + 1)
+
+    final_state, output = runner.run(sm, input=5)
+    assert output == [10, 11]
+
+
+def test_branches_wait_in_parallel_on_virtual_clock():
+    sm = Machine.parse([
+        {
+            "Type": "Map",
+            "Iterator": [{"Type": "Wait", "SecondsPath": "$"}],
+        },
+    ])
+    clock = VirtualClock(start=0)
+    runner = Runner(clock=clock)
+    final_state, output = runner.run(sm, input=[60, 3600, 10])
+    assert output == [60, 3600, 10]
+    assert clock.now() == 3600
+
+
+def test_failed_iteration_fails_map_with_its_error():
+    sm = Machine.parse([
+        {"Type": "Map", "Iterator": [{"Resource": "check"}]},
+    ])
+    runner = Runner()
+
+    @runner.resource_provider("check")
+    def check(x):
+        if x < 0:
+            raise StatesError("Negative", str(x))
+        return x
+
+    with pytest.raises(ExecutionFailed) as exc_info:
+        runner.run(sm, input=[1, -1, 2])
+    assert exc_info.value.error == "Negative"
+
+    sm.start_at_state.catch = [{"ErrorEquals": ["Negative"], "Next": "handled"}]
+    sm.states["handled"] = State.parse({"Type": "Succeed", "Name": "handled"})
+    final_state, output = runner.run(sm, input=[1, -1, 2])
+    assert final_state.name == "handled"
+    assert output == {"Error": "Negative", "Cause": "-1"}
@@ -51,3 +51,22 @@ def test_append_to_a_sequence():
     sm.append("a")
     sm.append("b")
     assert sm.dry_run() == ["a", "b"]
+
+
+def test_remove_redirects_choice_rules():
+    sm = Machine.parse({
+        "StartAt": "choose",
+        "States": {
+            "choose": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.x", "BooleanEquals": True, "Next": "b"}],
+                "Default": "b",
+            },
+            "b": {"Type": "Pass", "Next": "c"},
+            "c": {"Type": "Succeed"},
+        },
+    })
+    sm.remove("b")
+    compiled = sm.compile()["States"]["choose"]
+    assert compiled["Choices"][0]["Next"] == "c"
+    assert compiled["Default"] == "c"
@@ -0,0 +1,104 @@
+import pytest
+
+from aws_sfn_builder import ExecutionFailed, Machine, Runner, VirtualClock
+
+
+def _run(sm, input=None):
+    runner = Runner(clock=VirtualClock(start=0))
+    runner.resource_provider("arn:*")(lambda payload: payload)
+    return runner.run(sm, input=input)[1]
+
+
+def test_removes_unreachable_states():
+    sm = Machine.parse({
+        "StartAt": "a",
+        "States": {
+            "a": {"Type": "Pass", "Next": "b"},
+            "b": {"Type": "Task", "Resource": "arn:b", "End": True},
+            "orphan": {"Type": "Task", "Resource": "arn:orphan", "Next": "b"},
+        },
+    })
+    optimized = sm.optimize()
+    assert set(optimized.states) == {"b"}
+    assert optimized.start_at == "b"
+    assert set(sm.states) == {"a", "b", "orphan"}
+
+
+def test_merges_consecutive_passes_and_drops_zero_second_waits():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": {"x": 1}, "ResultPath": "$.config"},
+        {"Type": "Wait", "Name": "w", "Seconds": 0},
+        {"Type": "Pass", "Name": "b", "Result": 2, "ResultPath": "$.config.y"},
+        {"Type": "Task", "Name": "t", "Resource": "arn:t"},
+        {"Type": "Wait", "Name": "w2", "Seconds": 5},
+    ])
+    optimized = sm.optimize()
+    assert optimized.dry_run() == ["a", "t", "w2"]
+    assert optimized.states["a"].result == {"x": 1, "y": 2}
+    assert _run(optimized, {"id": 1}) == _run(sm, {"id": 1}) == {"id": 1, "config": {"x": 1, "y": 2}}
+
+
+def test_keeps_passes_whose_first_write_can_fail():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": 1, "ResultPath": "$.a.b"},
+        {"Type": "Pass", "Name": "b", "Result": {"c": 2}, "ResultPath": "$.a"},
+    ])
+    optimized = sm.optimize()
+    assert optimized.dry_run() == ["a", "b"]
+    for machine in (sm, optimized):
+        with pytest.raises(ExecutionFailed, match="Cannot set 'b' on int"):
+            _run(machine, {"a": 5})
+    assert _run(optimized, {"a": {}}) == _run(sm, {"a": {}}) == {"a": {"c": 2}}
+
+
+def test_redirects_choice_rules_and_catchers_around_removed_states():
+    sm = Machine.parse({
+        "StartAt": "choose",
+        "States": {
+            "choose": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.x", "NumericEquals": 1, "Next": "skip"}],
+                "Default": "work",
+            },
+            "work": {
+                "Type": "Task",
+                "Resource": "arn:work",
+                "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "skip"}],
+                "End": True,
+            },
+            "skip": {"Type": "Pass", "Next": "done"},
+            "done": {"Type": "Succeed"},
+        },
+    })
+    optimized = sm.optimize()
+    assert "skip" not in optimized.states
+    compiled = optimized.compile()
+    assert compiled["States"]["choose"]["Choices"][0]["Next"] == "done"
+    assert compiled["States"]["work"]["Catch"][0]["Next"] == "done"
+    assert sm.states["work"].catch[0]["Next"] == "skip"
+
+
+def test_collapses_single_branch_parallels_from_list_notation_on_request():
+    sm = Machine.parse(["a", [["b", "c"]], "d"])
+    optimized = sm.optimize(collapse_parallels=True)
+    assert optimized.dry_run() == ["a", "b", "c", "d"]
+    assert len(optimized.states) == 4
+    assert all(state.type == "Task" for state in optimized.states.values())
+
+    assert Machine.parse([["b", "c"]]).optimize(collapse_parallels=True).dry_run() == ["b", "c"]
+
+
+def test_keeps_output_shape_of_single_branch_parallels_by_default():
+    sm = Machine.parse([[{"Name": "b", "Resource": "arn:b"}]])
+    optimized = sm.optimize()
+    assert len(optimized.states) == 1
+    assert _run(optimized, input={"x": 1}) == _run(sm, input={"x": 1}) == [{"x": 1}]
+
+
+def test_optimizes_inside_branches():
+    sm = Machine.parse([
+        [{"Type": "Wait", "Name": "w", "Seconds": 0}, "a"],
+        ["b"],
+    ])
+    assert sm.optimize().dry_run() == [["a"], ["b"]]
+    assert sm.dry_run() == [["w", "a"], ["b"]]
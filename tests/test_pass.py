@@ -0,0 +1,115 @@
+import pytest
+
+from aws_sfn_builder import ExecutionFailed, HotSpotTracer, Machine, Runner
+
+
+def test_pass_places_result_at_result_path_without_resources():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": {"x": 1}, "ResultPath": "$.config"},
+    ])
+    input = {"id": 42}
+    _, output = Runner().run(sm, input=input)
+    assert output == {"id": 42, "config": {"x": 1}}
+    assert input == {"id": 42}
+
+
+def _pass_chain():
+    return Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": {"x": 1}, "ResultPath": "$.config"},
+        {"Type": "Pass", "Name": "b", "Result": 2, "ResultPath": "$.config.y"},
+        {"Type": "Pass", "Name": "c", "Result": "z", "ResultPath": "$.other"},
+        {"Type": "Task", "Name": "d", "Resource": "echo"},
+        {"Type": "Pass", "Name": "e", "Result": {"done": True}},
+        {"Type": "Pass", "Name": "f", "Result": "yes", "ResultPath": "$.really"},
+    ])
+
+
+def test_folded_pass_chains_produce_same_output_as_unfolded():
+    sm = _pass_chain()
+    input = {"id": 42, "config": {"y": 1, "w": 0}}
+
+    runner = Runner()
+    runner.resource_provider("echo")(lambda payload: payload)
+
+    unfolded = runner.run(runner.bind(sm, fold_passes=False), input=input)[1]
+    folded = runner.run(runner.bind(sm), input=input)[1]
+    assert folded == unfolded == {"done": True, "really": "yes"}
+    assert input == {"id": 42, "config": {"y": 1, "w": 0}}
+
+    captured = []
+    runner.resource_provider("echo")(lambda payload: captured.append(payload) or payload)
+    runner.run(runner.bind(sm), input=input)
+    assert captured == [{"id": 42, "config": {"x": 1, "y": 2}, "other": "z"}]
+
+
+def test_folded_pass_chain_executes_as_one_state():
+    sm = _pass_chain()
+    tracer = HotSpotTracer()
+    runner = Runner(tracer=tracer)
+    runner.resource_provider("echo")(lambda payload: payload)
+    runner.run(runner.bind(sm), input={})
+    assert set(tracer.spots) == {"a", "d", "e"}
+
+
+def test_pass_chain_is_not_folded_past_a_pass_without_static_result():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": 1, "ResultPath": "$.a"},
+        {"Type": "Pass", "Name": "b", "InputPath": "$.a", "ResultPath": "$.b"},
+        {"Type": "Pass", "Name": "c", "Result": 3, "ResultPath": "$.c"},
+    ])
+    runner = Runner()
+    assert runner.run(runner.bind(sm), input={})[1] == {"a": 1, "b": 1, "c": 3}
+
+
+def test_providers_changing_the_payload_in_place_dont_change_pass_results():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": {"n": 0}},
+        {"Type": "Pass", "Name": "b", "Result": {"x": 1}, "ResultPath": "$.c"},
+        {"Type": "Pass", "Name": "c", "Result": {"y": 2}, "ResultPath": "$.d"},
+        {"Type": "Task", "Name": "d", "Resource": "increment"},
+    ])
+
+    def increment(payload):
+        payload["n"] += 1
+        payload["c"]["x"] += 1
+        payload["d"]["y"] += 1
+        return payload
+
+    runner = Runner()
+    runner.resource_provider("increment")(increment)
+    for plan in (sm, runner.bind(sm, fold_passes=False), runner.bind(sm)):
+        for _ in range(2):
+            assert runner.run(plan)[1] == {"n": 1, "c": {"x": 2}, "d": {"y": 3}}
+    assert sm.compile()["States"]["a"]["Result"] == {"n": 0}
+
+
+def test_pass_chain_that_fails_is_left_unfolded():
+    sm = Machine.parse({
+        "StartAt": "check",
+        "States": {
+            "check": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.go", "BooleanEquals": True, "Next": "a"}],
+                "Default": "done",
+            },
+            "a": {"Type": "Pass", "Result": "hello", "Next": "b"},
+            "b": {"Type": "Pass", "Result": 1, "ResultPath": "$.x", "End": True},
+            "done": {"Type": "Succeed"},
+        },
+    })
+    runner = Runner()
+    plan = runner.bind(sm)
+    assert runner.run(plan, input={"go": False})[0].name == "done"
+    for unfolded_or_folded in (runner.bind(sm, fold_passes=False), plan):
+        with pytest.raises(ExecutionFailed) as exc_info:
+            runner.run(unfolded_or_folded, input={"go": True})
+        assert "Cannot set 'x' on str" in str(exc_info.value)
+
+
+def test_folded_pass_chain_sets_keys_with_quotes():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": {}, "ResultPath": "$.a"},
+        {"Type": "Pass", "Name": "b", "Result": 1, "ResultPath": "$.a[\"it's\"]"},
+    ])
+    runner = Runner()
+    assert runner.run(runner.bind(sm), input={})[1] == {"a": {"it's": 1}}
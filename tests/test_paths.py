@@ -0,0 +1,59 @@
+import pytest
+
+from aws_sfn_builder import Machine, Runner
+from aws_sfn_builder.paths import get_path, parse_path, set_path
+
+
+@pytest.mark.parametrize("path,keys", [
+    ["$", ()],
+    ["$.a", ("a",)],
+    ["$.a.b[2].c", ("a", "b", 2, "c")],
+    ["$['a b'].c", ("a b", "c")],
+    ["$.a[*]", None],
+    ["$..a", None],
+    ["a", None],
+])
+def test_parse_path(path, keys):
+    assert parse_path(path) == keys
+
+
+def test_get_path_falls_back_to_jsonpath():
+    assert get_path({"a": [{"b": 1}]}, "$.a[0].b") == 1
+    assert get_path({"a": [{"b": 1}]}, "$.a[*].b") == 1
+    with pytest.raises(KeyError):
+        get_path({"a": 1}, "$.b")
+
+
+def test_set_path_copies_only_along_the_path():
+    shared = {"big": list(range(10))}
+    payload = {"a": {"b": 1, "shared": shared}, "c": shared}
+
+    updated = set_path(payload, "$.a.b", 2)
+
+    assert payload == {"a": {"b": 1, "shared": shared}, "c": shared}
+    assert updated == {"a": {"b": 2, "shared": shared}, "c": shared}
+    assert updated["a"] is not payload["a"]
+    assert updated["a"]["shared"] is shared
+    assert updated["c"] is shared
+
+
+def test_set_path_creates_missing_dictionaries():
+    assert set_path({}, "$.a.b", 1) == {"a": {"b": 1}}
+    assert set_path({"x": [1, 2]}, "$.x[1]", 3) == {"x": [1, 3]}
+    assert set_path({"x": 1}, "$", 2) == 2
+
+
+def test_runner_does_not_modify_input():
+    sm = Machine.parse([
+        {"Name": "first", "Resource": "double", "InputPath": "$.value", "ResultPath": "$.result.doubled"},
+        {"Name": "second", "Resource": "double", "InputPath": "$.result.doubled", "ResultPath": "$.result.quadrupled"},
+    ])
+
+    runner = Runner()
+    runner.resource_provider("double")(lambda x: x * 2)
+
+    input = {"value": 1, "result": {}}
+    for _ in range(2):
+        final_state, output = runner.run(sm, input=input)
+        assert output == {"value": 1, "result": {"doubled": 2, "quadrupled": 4}}
+    assert input == {"value": 1, "result": {}}
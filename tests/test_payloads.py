@@ -0,0 +1,178 @@
+import json
+import warnings
+
+import pytest
+
+from aws_sfn_builder import ExecutionFailed, Machine, PayloadSizeMonitor, PayloadSizeWarning, Runner, StatesError
+from aws_sfn_builder.paths import set_path
+from aws_sfn_builder.payloads import PayloadSizer
+
+
+@pytest.mark.parametrize("payload", [
+    None,
+    True,
+    False,
+    0,
+    -12345,
+    1.5,
+    "",
+    "hello",
+    'quote " and \\ backslash',
+    "ünïcödé",
+    "x" * 1000,
+    [],
+    {},
+    [1, "a", None],
+    {"a": {"b": [1, 2, {"c": "d"}]}, "e": []},
+])
+def test_estimates_compact_json_size(payload):
+    expected = len(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    assert PayloadSizer().size(payload) == expected
+
+
+def test_remembers_sizes_of_shared_subtrees():
+    sizer = PayloadSizer()
+    payload = {"big": [{"i": i} for i in range(100)], "small": {}}
+    sizer.size(payload)
+    cached = len(sizer._cache)
+
+    updated = set_path(payload, "$.small.x", 1)
+    assert sizer.size(updated) == len(json.dumps(updated, separators=(",", ":")))
+    # Only the new top-level dictionary and the new "small" dictionary were measured.
+    assert len(sizer._cache) == cached + 2
+
+
+def make_machine():
+    return Machine.parse([
+        {"Name": "grow", "Resource": "grow", "ResultPath": "$.blob"},
+        {"Name": "shrink", "Resource": "shrink"},
+    ])
+
+
+def test_fails_execution_exceeding_payload_limit():
+    runner = Runner(payload_monitor=PayloadSizeMonitor(max_size=1000))
+    runner.resource_provider("grow")(lambda x: "x" * 2000)
+    runner.resource_provider("shrink")(lambda x: {})
+
+    with pytest.raises(StatesError) as exc_info:
+        runner.run(make_machine())
+    assert exc_info.value.error == "States.DataLimitExceeded"
+    assert "'grow'" in exc_info.value.cause
+
+
+def test_measures_payloads_that_providers_modify_in_place():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "init", "Result": {"log": []}},
+        {"Type": "Task", "Name": "a", "Resource": "append"},
+        {"Type": "Task", "Name": "b", "Resource": "append"},
+        {"Type": "Task", "Name": "c", "Resource": "append"},
+    ])
+
+    def append(payload):
+        payload["log"].append("x" * 600)
+        return payload
+
+    monitor = PayloadSizeMonitor(max_size=1000, action="warn")
+    runner = Runner(payload_monitor=monitor)
+    runner.resource_provider("append")(append)
+    with warnings.catch_warnings(record=True):
+        warnings.simplefilter("always")
+        _, output = runner.run(sm)
+    assert monitor.stats["c"].max_output == len(json.dumps(output, separators=(",", ":")))
+
+    runner = Runner(payload_monitor=PayloadSizeMonitor(max_size=1000))
+    runner.resource_provider("append")(append)
+    with pytest.raises(StatesError) as exc_info:
+        runner.run(sm)
+    assert "'b'" in exc_info.value.cause
+
+
+def test_warns_and_records_histograms():
+    monitor = PayloadSizeMonitor(max_size=1000, action="warn")
+    runner = Runner(payload_monitor=monitor)
+    runner.resource_provider("grow")(lambda x: "x" * 2000)
+    runner.resource_provider("shrink")(lambda x: {})
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        runner.run(make_machine())
+    assert len(caught) == 1
+    assert issubclass(caught[0].category, PayloadSizeWarning)
+
+    assert monitor.stats["grow"].max_input == 2
+    assert monitor.stats["grow"].max_output == 2011
+    assert monitor.stats["shrink"].max_output == 2
+    assert monitor.report().splitlines()[1].startswith("grow")
+
+
+def test_measures_only_what_providers_received_and_returned():
+    sm = Machine.parse([
+        {"Type": "Task", "Name": name, "Resource": "lookup", "InputPath": "$.query", "ResultPath": "$.result"}
+        for name in "abc"
+    ])
+    monitor = PayloadSizeMonitor()
+    runner = Runner(payload_monitor=monitor)
+    runner.resource_provider("lookup")(lambda x: {"found": x["key"]})
+
+    measured = []
+    measure = monitor.sizer._size
+
+    def counting_size(payload, *args):
+        measured.append(payload)
+        return measure(payload, *args)
+
+    monitor.sizer._size = counting_size
+    input = {"query": {"key": 1}, "items": [{"i": i} for i in range(1000)]}
+    _, output = runner.run(sm, input=input)
+
+    assert monitor.stats["c"].max_output == len(json.dumps(output, separators=(",", ":")))
+    # The items are measured once, with the execution input.
+    assert sum(isinstance(payload, dict) for payload in measured) < 1000 + 3 * 10
+
+
+def test_measures_results_that_providers_modified_since_they_returned_them():
+    sm = Machine.parse([
+        {"Type": "Task", "Name": name, "Resource": "count", "ResultPath": f"$.{name}"}
+        for name in "abc"
+    ])
+    counter = {"calls": []}
+
+    def count(payload):
+        counter["calls"].append("x" * 100)
+        return counter
+
+    monitor = PayloadSizeMonitor()
+    runner = Runner(payload_monitor=monitor)
+    runner.resource_provider("count")(count)
+    _, output = runner.run(sm)
+    assert monitor.stats["c"].max_output == len(json.dumps(output, separators=(",", ":")))
+
+
+def test_checks_payloads_of_states_in_branches():
+    sm = Machine.parse({
+        "StartAt": "both",
+        "States": {
+            "both": {
+                "Type": "Parallel",
+                "Branches": [
+                    {"StartAt": "small", "States": {"small": {"Type": "Pass", "End": True}}},
+                    {
+                        "StartAt": "grow",
+                        "States": {
+                            "grow": {"Type": "Task", "Resource": "grow", "ResultPath": "$.blob", "Next": "shrink"},
+                            "shrink": {"Type": "Pass", "Result": {}, "End": True},
+                        },
+                    },
+                ],
+                "End": True,
+            },
+        },
+    })
+    monitor = PayloadSizeMonitor(max_size=1000)
+    runner = Runner(payload_monitor=monitor)
+    runner.resource_provider("grow")(lambda x: "x" * 2000)
+
+    with pytest.raises(ExecutionFailed) as exc_info:
+        runner.run(sm)
+    assert exc_info.value.error == "States.DataLimitExceeded"
+    assert "'grow'" in exc_info.value.cause
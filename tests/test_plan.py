@@ -0,0 +1,54 @@
+import pytest
+
+from aws_sfn_builder import ExecutionPlan, Machine, ResourceManager, ResourceResolutionError, Runner
+
+
+def test_bind_reports_all_missing_providers_before_execution():
+    sm = Machine.parse([
+        {"Resource": "a"},
+        [
+            [{"Resource": "b"}, {"Resource": "c"}],
+            [{"Resource": "d", "Name": "d1"}, {"Resource": "d", "Name": "d2"}],
+        ],
+    ])
+
+    calls = []
+    runner = Runner()
+    runner.resource_provider("a")(calls.append)
+    runner.resource_provider("c")(calls.append)
+
+    with pytest.raises(ResourceResolutionError) as exc_info:
+        runner.bind(sm)
+
+    parallel_name = sm.states["a"].next
+    assert exc_info.value.missing == {
+        "b": [f"{parallel_name}/0/b"],
+        "d": [f"{parallel_name}/1/d1", f"{parallel_name}/1/d2"],
+    }
+    assert calls == []
+
+
+def test_runs_bound_plan_without_resolving_resources(example):
+    sm = Machine.parse(example("job_status_poller"))
+
+    resolved = []
+
+    class CountingResourceManager(ResourceManager):
+        def resolve(self, resource_arn):
+            resolved.append(resource_arn)
+            return super().resolve(resource_arn)
+
+    runner = Runner(resources=CountingResourceManager())
+    runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:*")(lambda x: "SUCCEEDED")
+
+    plan = runner.bind(sm)
+    assert isinstance(plan, ExecutionPlan)
+    assert sorted(resolved) == [
+        "arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob",
+        "arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob",
+    ]
+
+    for _ in range(3):
+        final_state, output = runner.run(plan)
+        assert final_state.name == "Get Final Job Status"
+    assert len(resolved) == 2
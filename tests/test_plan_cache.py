@@ -0,0 +1,106 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from aws_sfn_builder import ExecutionPlan, Machine, PlanCache, PlanFormatError, Runner, plan
+from tests import aws_examples_dir
+
+
+def _runner():
+    runner = Runner()
+    runner.resource_provider("arn:aws:lambda:*:*:function:*")(lambda payload: payload)
+    return runner
+
+
+def test_dumped_plan_runs_after_loading_with_new_providers():
+    sm = Machine.parse([
+        {"Type": "Pass", "Name": "a", "Result": 1, "ResultPath": "$.a"},
+        {"Type": "Pass", "Name": "b", "Result": 2, "ResultPath": "$.b"},
+        [[{"Resource": "c"}], [{"Resource": "d"}]],
+    ])
+    runner = Runner()
+    runner.resource_provider("c")(lambda payload: "c")
+    runner.resource_provider("d")(lambda payload: "d")
+    data = runner.bind(sm).dumps()
+
+    other_runner = Runner()
+    other_runner.resource_provider("c")(lambda payload: "C")
+    other_runner.resource_provider("d")(lambda payload: "D")
+    loaded = ExecutionPlan.loads(data, other_runner._resources)
+    assert loaded.machine.compile() == sm.compile()
+    assert other_runner.run(loaded, input={})[1] == ["C", "D"]
+
+    # Folded Pass chains survive the round trip.
+    assert type(loaded.states_of(loaded.machine)["a"]).__name__ == "FoldedPasses"
+
+
+def test_loading_plan_of_another_version_fails(monkeypatch):
+    data = _runner().bind(Machine.parse([{"Resource": "arn:aws:lambda:r:a:function:x"}])).dumps()
+    monkeypatch.setattr(plan, "PLAN_FORMAT_VERSION", plan.PLAN_FORMAT_VERSION + 1)
+    with pytest.raises(PlanFormatError):
+        ExecutionPlan.loads(data, _runner()._resources)
+
+
+def test_plan_cache_skips_parsing_of_unchanged_definitions(tmp_path, monkeypatch):
+    definition_path = tmp_path / "job_status_poller.json"
+    shutil.copy(aws_examples_dir / "job_status_poller.json", definition_path)
+    cache = PlanCache(str(tmp_path / "plans"))
+
+    first = _runner().bind_file(str(definition_path), cache=cache)
+    assert len(os.listdir(tmp_path / "plans")) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("definition parsed again")
+
+    with monkeypatch.context() as m:
+        m.setattr(Machine, "load", fail)
+        second = _runner().bind_file(str(definition_path), cache=cache)
+    assert second.machine.compile() == first.machine.compile()
+    assert second.providers.keys() == first.providers.keys()
+
+    # A changed definition gets a new plan.
+    definition_path.write_text(definition_path.read_text().replace("$.wait_time", "$.wait"))
+    third = _runner().bind_file(str(definition_path), cache=cache)
+    assert third.machine.states["Wait X Seconds"].seconds_path == "$.wait"
+    assert len(os.listdir(tmp_path / "plans")) == 2
+
+
+def test_plan_cache_ignores_corrupt_plans(tmp_path):
+    definition_path = aws_examples_dir / "hello_world.json"
+    cache = PlanCache(str(tmp_path))
+    _runner().bind_file(str(definition_path), cache=cache)
+    for name in os.listdir(tmp_path):
+        (tmp_path / name).write_bytes(b"not a plan")
+    assert _runner().bind_file(str(definition_path), cache=cache).machine.start_at == "Hello World"
+
+
+def test_plan_cache_rebuilds_plans_that_fail_to_unpickle(tmp_path):
+    definition_path = aws_examples_dir / "hello_world.json"
+    cache = PlanCache(str(tmp_path))
+    _runner().bind_file(str(definition_path), cache=cache)
+    # A valid header followed by a reference to a class that no longer exists.
+    artifact = plan._plan_header() + b"caws_sfn_builder.plan\nNoSuchClass\n."
+    with pytest.raises(PlanFormatError):
+        ExecutionPlan.loads(artifact, _runner()._resources)
+    for name in os.listdir(tmp_path):
+        (tmp_path / name).write_bytes(artifact)
+    assert _runner().bind_file(str(definition_path), cache=cache).machine.start_at == "Hello World"
+
+
+def test_plan_cache_is_shared_between_processes(tmp_path):
+    script = (
+        "import sys\n"
+        "from aws_sfn_builder import PlanCache, Runner\n"
+        "runner = Runner()\n"
+        "runner.resource_provider('arn:aws:lambda:*:*:function:*')(lambda payload: payload)\n"
+        "plan = runner.bind_file(sys.argv[1], cache=PlanCache(sys.argv[2]))\n"
+        "print(plan.machine.start_at)\n"
+    )
+    args = [sys.executable, "-c", script, str(aws_examples_dir / "job_status_poller.json"), str(tmp_path)]
+    for _ in range(2):
+        output = subprocess.run(args, check=True, stdout=subprocess.PIPE, cwd=os.getcwd()).stdout
+        assert output.decode().strip() == "Submit Job"
+    assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,230 @@
+import concurrent.futures
+import http.server
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from aws_sfn_builder import (
+    ExecutionFailed, HttpSession, LocalLambdaEndpoint, Machine, ProviderFactory, ResourceManager, Runner
+)
+from aws_sfn_builder.providers import HttpRequest, lambda_function_name
+
+
+class _LambdaHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment rather than waiting for the client to acknowledge the headers.
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        function_name = self.path.split("/")[3]
+        with self.server.lock:
+            self.server.invocations.append(function_name)
+        headers = {}
+        if function_name == "Echo":
+            status, result = 200, body
+        elif function_name == "Double":
+            status, result = 200, json.dumps(json.loads(body) * 2).encode()
+        elif function_name == "Fail":
+            status, result = 200, json.dumps({"errorType": "JobFailed", "errorMessage": "No luck"}).encode()
+            headers["X-Amz-Function-Error"] = "Unhandled"
+        elif function_name == "Drop":
+            # Breaks the connection without answering.
+            self.close_connection = True
+            return
+        elif function_name == "Hangup":
+            # Answers, then closes the connection without saying so.
+            status, result = 200, b'"bye"'
+            self.close_connection = True
+        elif function_name == "Close":
+            status, result = 200, b'"closing"'
+            headers["Connection"] = "close"
+            self.close_connection = True
+        else:
+            status, result = 404, b'{"Type": "User", "Message": "Function not found"}'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _LambdaHandler)
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.invocations = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _arn(name):
+    return f"arn:aws:lambda:us-east-1:123456789012:function:{name}"
+
+
+def test_lambda_function_name():
+    assert lambda_function_name(_arn("Foo")) == ("Foo", None)
+    assert lambda_function_name(_arn("Foo") + ":prod") == ("Foo", "prod")
+    assert lambda_function_name("Foo") == ("Foo", None)
+
+
+def test_factory_is_set_up_once_and_torn_down_on_close():
+    calls = []
+
+    class Factory(ProviderFactory):
+        def setup(self):
+            calls.append("setup")
+
+        def teardown(self):
+            calls.append("teardown")
+
+        def create(self, resource_arn):
+            calls.append(resource_arn)
+            return lambda payload: resource_arn
+
+    with ResourceManager() as resources:
+        resources.provider_factory("arn:x:*", Factory())
+        assert calls == []
+        assert resources.resolve("arn:x:a")(None) == "arn:x:a"
+        assert resources.resolve("arn:x:b")(None) == "arn:x:b"
+        resources.provider("arn:y")(lambda payload: "y")
+        assert resources.resolve("arn:x:a")(None) == "arn:x:a"
+        assert calls == ["setup", "arn:x:a", "arn:x:b"]
+    assert calls[-1] == "teardown"
+
+
+def test_session_pipelines_requests_on_one_connection(server, url):
+    session = HttpSession(url)
+    requests = [HttpRequest("POST", "/2015-03-31/functions/Echo/invocations", json.dumps(i).encode()) for i in range(5)]
+    requests.insert(2, HttpRequest("POST", "/2015-03-31/functions/Close/invocations", b""))
+    responses = session.pipeline(requests)
+    assert [json.loads(r.body) for r in responses] == [0, 1, "closing", 2, 3, 4]
+    # The server closed the first connection after "Close", the rest was sent again on a second one.
+    assert server.connections == session.connections_opened == 2
+
+    assert session.request("POST", "/2015-03-31/functions/Echo/invocations", b"7").body == b"7"
+    assert server.connections == 2
+    session.close()
+
+
+def test_session_reconnects_when_pooled_connection_was_closed(server, url):
+    session = HttpSession(url)
+    session.request("POST", "/2015-03-31/functions/Echo/invocations", b"1")
+    session._idle[0].sock.close()
+    assert session.request("POST", "/2015-03-31/functions/Echo/invocations", b"2").body == b"2"
+    assert session.connections_opened == 2
+
+
+def test_session_detects_pooled_connections_closed_by_the_server(server, url):
+    session = HttpSession(url)
+    assert session.request("POST", "/2015-03-31/functions/Hangup/invocations", b"").body == b'"bye"'
+    time.sleep(0.1)
+    assert session.request("POST", "/2015-03-31/functions/Echo/invocations", b"2").body == b"2"
+    assert session.connections_opened == 2
+    assert server.invocations == ["Hangup", "Echo"]
+
+
+@pytest.mark.parametrize("resend_unanswered", [False, True])
+def test_session_sends_requests_again_only_if_asked_to(server, url, resend_unanswered):
+    session = HttpSession(url, resend_unanswered=resend_unanswered)
+    requests = [
+        HttpRequest("POST", f"/2015-03-31/functions/{name}/invocations", b"1") for name in ["Echo", "Drop", "Echo"]
+    ]
+    responses = session.pipeline_partial(requests)
+    assert responses[0].body == b"1"
+    assert all(isinstance(response, Exception) for response in responses[1:])
+    assert server.invocations == ["Echo", "Drop", "Drop"] if resend_unanswered else ["Echo", "Drop"]
+    with pytest.raises(Exception):
+        session.pipeline(requests[1:2])
+
+
+def test_local_lambda_endpoint_doesnt_invoke_functions_twice(server, url):
+    sm = Machine.parse([{"Type": "Task", "Name": "drop", "Resource": _arn("Drop")}])
+    with ResourceManager() as resources:
+        resources.provider_factory("arn:aws:lambda:*:*:function:*", LocalLambdaEndpoint(url))
+        with pytest.raises(ExecutionFailed) as exc_info:
+            Runner(resources=resources).run(sm)
+    assert exc_info.value.error == "Lambda.ServiceException"
+    assert server.invocations == ["Drop"]
+
+
+def test_local_lambda_endpoint_runs_tasks_over_kept_alive_connections(server, url):
+    sm = Machine.parse([
+        {"Type": "Task", "Name": "double", "Resource": _arn("Double")},
+        {"Type": "Task", "Name": "echo", "Resource": _arn("Echo")},
+    ])
+    with ResourceManager() as resources:
+        endpoint = resources.provider_factory("arn:aws:lambda:*:*:function:*", LocalLambdaEndpoint(url))
+        runner = Runner(resources=resources)
+        for i in range(10):
+            assert runner.run(sm, input=[i])[1] == [i, i]
+        assert endpoint.session.connections_opened == 1
+    assert server.connections == 1
+    assert len(server.invocations) == 20
+
+
+def test_local_lambda_endpoint_batches_concurrent_invocations(server, url):
+    sm = Machine.parse({
+        "StartAt": "map",
+        "States": {
+            "map": {
+                "Type": "Map",
+                "Iterator": {
+                    "StartAt": "double",
+                    "States": {"double": {"Type": "Task", "Resource": _arn("Double"), "End": True}},
+                },
+                "End": True,
+            },
+        },
+    })
+    with ResourceManager() as resources:
+        endpoint = LocalLambdaEndpoint(url, max_connections=2, max_batch=8)
+        resources.provider_factory("arn:aws:lambda:*:*:function:*", endpoint)
+        runner = Runner(resources=resources)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            outputs = list(executor.map(lambda i: runner.run(sm, input=list(range(i, i + 50)))[1], range(4)))
+        assert outputs == [[2 * j for j in range(i, i + 50)] for i in range(4)]
+        assert endpoint.session.connections_opened <= 2
+    assert len(server.invocations) == 200
+
+
+def test_local_lambda_endpoint_errors(url):
+    sm = Machine.parse({
+        "StartAt": "fail",
+        "States": {
+            "fail": {
+                "Type": "Task",
+                "Resource": _arn("Fail"),
+                "Catch": [{"ErrorEquals": ["JobFailed"], "ResultPath": "$.error", "Next": "missing"}],
+                "Next": "missing",
+            },
+            "missing": {"Type": "Task", "Resource": _arn("Missing"), "End": True},
+        },
+    })
+    with ResourceManager() as resources:
+        resources.provider_factory("arn:aws:lambda:*:*:function:*", LocalLambdaEndpoint(url))
+        with pytest.raises(ExecutionFailed) as exc_info:
+            Runner(resources=resources).run(sm)
+    assert exc_info.value.error == "Lambda.ResourceNotFoundException"
@@ -0,0 +1,57 @@
+import pytest
+
+from aws_sfn_builder import Machine, ResourceManager, Runner
+from aws_sfn_builder.arns import ArnPatternIndex
+
+
+def test_pattern_index_matches_per_component():
+    index = ArnPatternIndex()
+    index.add("arn:aws:lambda:*:*:function:*", "any-function")
+    index.add("arn:aws:lambda:*:*:function:Check*", "check-function")
+    index.add("arn:aws:lambda:us-east-1:*:function:*", "us-east-1-function")
+
+    assert index.match("arn:aws:lambda:eu-west-1:1:function:Foo") == "any-function"
+    assert index.match("arn:aws:lambda:eu-west-1:1:function:CheckJob") == "check-function"
+    assert index.match("arn:aws:lambda:us-east-1:1:function:CheckJob") == "us-east-1-function"
+    assert index.match("arn:aws:lambda:eu-west-1:1:function:Foo:prod") is None
+    assert index.match("arn:aws:states:eu-west-1:1:activity:Foo") is None
+
+
+def test_later_pattern_wins_ties():
+    index = ArnPatternIndex()
+    index.add("arn:*", 1)
+    index.add("arn:*", 2)
+    assert index.match("arn:x") == 2
+
+
+def test_resolves_exact_arns_before_patterns():
+    resources = ResourceManager(providers={
+        "arn:aws:lambda:*:*:function:*": "pattern",
+        "arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob": "exact",
+    })
+    assert resources.resolve("arn:aws:lambda:REGION:ACCOUNT_ID:function:SubmitJob") == "exact"
+    assert resources.resolve("arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob") == "pattern"
+    assert "arn:aws:lambda:REGION:ACCOUNT_ID:function:CheckJob" in resources.snapshot().resolved
+
+    with pytest.raises(RuntimeError):
+        resources.resolve("arn:aws:states:REGION:ACCOUNT_ID:activity:Foo")
+
+
+def test_registration_invalidates_resolved_patterns():
+    resources = ResourceManager()
+    resources.provider("arn:x:*")(lambda x: "generic")
+    assert resources.resolve("arn:x:y")(None) == "generic"
+    resources.provider("arn:x:y*")(lambda x: "specific")
+    assert resources.resolve("arn:x:y")(None) == "specific"
+
+
+def test_runs_job_status_poller_with_one_pattern_provider(example):
+    sm = Machine.parse(example("job_status_poller"))
+    runner = Runner()
+
+    @runner.resource_provider("arn:aws:lambda:REGION:ACCOUNT_ID:function:*")
+    def any_function(payload):
+        return "SUCCEEDED"
+
+    final_state, output = runner.run(sm)
+    assert final_state.name == "Get Final Job Status"
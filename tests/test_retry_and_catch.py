@@ -0,0 +1,162 @@
+import pytest
+
+from aws_sfn_builder import ExecutionHistory, Machine, Runner, State, StatesError, VirtualClock
+from aws_sfn_builder.history import MemorySink
+
+
+def flaky(failures, error="Flaky"):
+    calls = []
+
+    def provider(payload):
+        calls.append(payload)
+        if len(calls) <= failures:
+            raise StatesError(error, f"attempt {len(calls)}")
+        return "ok"
+
+    provider.calls = calls
+    return provider
+
+
+def test_retries_with_backoff_on_virtual_clock():
+    sm = Machine.parse([
+        {
+            "Resource": "flaky",
+            "Retry": [
+                {"ErrorEquals": ["Flaky"], "IntervalSeconds": 3600, "BackoffRate": 2, "MaxAttempts": 3},
+            ],
+        },
+    ])
+
+    clock = VirtualClock(start=0)
+    runner = Runner(clock=clock)
+    provider = flaky(2)
+    runner.resource_provider("flaky")(provider)
+
+    final_state, output = runner.run(sm)
+
+    assert output == "ok"
+    assert len(provider.calls) == 3
+    assert clock.now() == 3600 + 7200
+
+
+def test_gives_up_after_max_attempts_and_catches():
+    sm = Machine.parse([
+        {
+            "Resource": "flaky",
+            "Retry": [{"ErrorEquals": ["States.ALL"], "MaxAttempts": 2}],
+            "Catch": [{"ErrorEquals": ["Flaky"], "ResultPath": "$.error", "Next": "recover"}],
+        },
+        {
+            "Name": "unreachable",
+            "Resource": "unreachable",
+        },
+        {
+            "Name": "recover",
+            "Type": "Pass",
+        },
+    ])
+
+    clock = VirtualClock(start=0)
+    runner = Runner(clock=clock)
+    provider = flaky(10)
+    runner.resource_provider("flaky")(provider)
+
+    final_state, output = runner.run(sm, input={"x": 1})
+
+    assert final_state.name == "recover"
+    assert output == {"x": 1, "error": {"Error": "Flaky", "Cause": "attempt 3"}}
+    assert len(provider.calls) == 3
+    assert clock.now() == 1 + 2
+
+
+def test_unmatched_error_fails_execution():
+    sm = Machine.parse([
+        {
+            "Resource": "flaky",
+            "Retry": [{"ErrorEquals": ["Other"]}],
+            "Catch": [{"ErrorEquals": ["Other"], "Next": "x"}],
+        },
+    ])
+
+    runner = Runner()
+    provider = flaky(1)
+    runner.resource_provider("flaky")(provider)
+
+    with pytest.raises(RuntimeError):
+        runner.run(sm)
+    assert len(provider.calls) == 1
+
+
+def test_exceptions_matched_by_class_name():
+    sm = Machine.parse([
+        {
+            "Resource": "a",
+            "Catch": [{"ErrorEquals": ["States.TaskFailed"], "Next": "b"}],
+        },
+        {
+            "Name": "b",
+            "Resource": "b",
+        },
+    ])
+
+    runner = Runner()
+
+    @runner.resource_provider("a")
+    def fail(payload):
+        raise KeyError("missing")
+
+    runner.resource_provider("b")(lambda x: x)
+
+    final_state, output = runner.run(sm)
+    assert output == {"Error": "KeyError", "Cause": "'missing'"}
+
+
+def test_history_of_retried_and_caught_task():
+    sm = Machine.parse([
+        {
+            "Resource": "flaky",
+            "Retry": [{"ErrorEquals": ["States.ALL"], "MaxAttempts": 1}],
+            "Catch": [{"ErrorEquals": ["States.ALL"], "Next": "done"}],
+        },
+        {
+            "Name": "done",
+            "Type": "Succeed",
+        },
+    ])
+
+    sink = MemorySink()
+    clock = VirtualClock(start=0)
+    runner = Runner(clock=clock, tracer=ExecutionHistory(sink, clock=clock.now))
+    runner.resource_provider("flaky")(flaky(10))
+    runner.run(sm)
+
+    assert [e["type"] for e in sink.events] == [
+        "ExecutionStarted",
+        "TaskStateEntered",
+        "TaskScheduled", "TaskStarted", "TaskFailed",
+        "TaskScheduled", "TaskStarted", "TaskFailed",
+        "TaskStateExited",
+        "SucceedStateEntered", "SucceedStateExited",
+        "ExecutionSucceeded",
+    ]
+    assert sink.events[-1]["timestamp"] == "1970-01-01T00:00:01+00:00"
+
+
+@pytest.mark.parametrize("extras,input,waited", [
+    [{"Seconds": 86400}, {}, 86400],
+    [{"SecondsPath": "$.wait_time"}, {"wait_time": 30}, 30],
+    [{"Timestamp": "1970-01-02T00:00:00Z"}, {}, 86400 - 100],
+    [{"TimestampPath": "$.until"}, {"until": "1970-01-01T00:10:00+00:00"}, 500],
+    [{"Timestamp": "1970-01-01T00:00:00Z"}, {}, 0],
+])
+def test_wait_advances_virtual_clock(extras, input, waited):
+    wait = State.parse({
+        "Type": "Wait",
+        "Next": "NextState",
+        **extras,
+    })
+    clock = VirtualClock(start=100)
+    next_state, output = wait.execute(input=input, clock=clock)
+    assert next_state == "NextState"
+    assert output == input
+    assert clock.now() == 100 + waited
@@ -0,0 +1,144 @@
+import pytest
+
+from aws_sfn_builder import Machine, Runner, State, StatesError
+from aws_sfn_builder.templates import compile_template
+
+
+def test_compiled_template_copies_static_parts():
+    template = {
+        "static": {"nested": [1, 2, 3]},
+        "flagged": True,
+        "id.$": "$.guid",
+        "detail": {
+            "name.$": "$.person.name",
+            "kind": "person",
+        },
+        "state.$": "$$.State.Name",
+        "items": [{"first.$": "$.list[0]"}, "literal"],
+    }
+    build = compile_template(template)
+
+    payload = build(
+        {"guid": "123", "person": {"name": "Alice"}, "list": ["a", "b"]},
+        {"State": {"Name": "S"}},
+    )
+    assert payload == {
+        "static": {"nested": [1, 2, 3]},
+        "flagged": True,
+        "id": "123",
+        "detail": {"name": "Alice", "kind": "person"},
+        "state": "S",
+        "items": [{"first": "a"}, "literal"],
+    }
+    assert payload["static"] == template["static"]
+    assert payload["static"] is not template["static"]
+    assert payload["items"][1] == "literal"
+
+
+def test_static_template_is_copied():
+    template = {"a": {"b": 1}}
+    payload = compile_template(template)({}, {})
+    assert payload == template
+    payload["a"]["b"] = 2
+    assert template == {"a": {"b": 1}}
+
+
+def test_templates_are_compiled_once_per_state_and_again_when_assigned():
+    sm = Machine.parse([{"Resource": "echo", "Parameters": {"a.$": "$.x"}}])
+    state = sm.states[sm.start_at]
+    runner = Runner()
+    runner.resource_provider("echo")(lambda payload: payload)
+    plan = runner.bind(sm)
+
+    assert runner.run(sm, input={"x": 1, "y": 2})[1] == {"a": 1}
+    assert state.template_builder("parameters") is state.template_builder("parameters")
+    state.parameters = {"a.$": "$.x", "b.$": "$.y"}
+    assert runner.run(sm, input={"x": 1, "y": 2})[1] == {"a": 1, "b": 2}
+    assert runner.run(plan, input={"x": 1, "y": 2})[1] == {"a": 1}
+    assert runner.run(runner.bind(sm), input={"x": 1, "y": 2})[1] == {"a": 1, "b": 2}
+
+
+def test_intrinsic_functions():
+    build = compile_template({
+        "greeting.$": r"States.Format('Hello, {}! \{literal\}', $.name)",
+        "items.$": "States.Array($.name, 1, true, null, States.ArrayLength($.list))",
+        "parsed.$": "States.StringToJson($.json)",
+        "serialized.$": "States.JsonToString($.list)",
+        "chunks.$": "States.ArrayPartition($.list, 2)",
+        "state.$": "States.Format('{} in {}', $.name, $$.State.Name)",
+        "sum.$": "States.MathAdd(States.ArrayGetItem($.list, 2), -1)",
+        "encoded.$": "States.Base64Encode($.name)",
+        "parts.$": "States.StringSplit('a,b;c', ',;')",
+    })
+    payload = build({"name": "Bob", "list": [1, 2, 3], "json": '{"a": [1]}'}, {"State": {"Name": "S"}})
+    assert payload == {
+        "greeting": "Hello, Bob! {literal}",
+        "items": ["Bob", 1, True, None, 3],
+        "parsed": {"a": [1]},
+        "serialized": "[1,2,3]",
+        "chunks": [[1, 2], [3]],
+        "state": "Bob in S",
+        "sum": 2,
+        "encoded": "Qm9i",
+        "parts": ["a", "b", "c"],
+    }
+
+
+def test_invalid_intrinsic_functions():
+    with pytest.raises(ValueError):
+        compile_template({"a.$": "States.Unknown($.a)"})
+    with pytest.raises(ValueError):
+        compile_template({"a.$": "States.Format('{}', $.a"})
+    with pytest.raises(StatesError) as exc_info:
+        compile_template({"a.$": "States.Format('{} {}', $.a)"})({"a": 1}, {})
+    assert exc_info.value.error == "States.IntrinsicFailure"
+
+
+def test_parameters_and_result_selector_parse_and_compile():
+    source = {
+        "Type": "Task",
+        "Resource": "arn:aws:states:::lambda:invoke",
+        "Parameters": {"FunctionName": "f", "Payload.$": "$"},
+        "ResultSelector": {"body.$": "$.Payload.body"},
+        "ResultPath": "$.result",
+        "End": True,
+    }
+    state = State.parse(source)
+    assert state.parameters == source["Parameters"]
+    assert state.result_selector == source["ResultSelector"]
+    assert state.compile() == source
+
+
+def test_runs_task_with_parameters_and_result_selector():
+    sm = Machine.parse([
+        {
+            "Resource": "invoke",
+            "Parameters": {"FunctionName": "f", "Payload.$": "$.request"},
+            "ResultSelector": {"body.$": "$.Payload.body", "state.$": "$$.State.Name"},
+            "ResultPath": "$.response",
+        },
+    ])
+    runner = Runner()
+    runner.resource_provider("invoke")(lambda x: {"Payload": {"body": x["Payload"]["q"] * 2, "noise": 1}})
+
+    final_state, output = runner.run(sm, input={"request": {"q": 21}})
+    assert output == {"request": {"q": 21}, "response": {"body": 42, "state": "invoke"}}
+
+
+def test_map_parameters_see_the_item_in_context():
+    sm = Machine.parse([
+        {
+            "Type": "Map",
+            "ItemsPath": "$.items",
+            "Parameters": {"index.$": "$$.Map.Item.Index", "value.$": "$$.Map.Item.Value", "tag.$": "$.tag"},
+            "Iterator": [{"Resource": "echo"}],
+        },
+    ])
+    runner = Runner()
+    runner.resource_provider("echo")(lambda x: x)
+
+    final_state, output = runner.run(sm, input={"items": ["a", "b"], "tag": "t"})
+    assert output == [
+        {"index": 0, "value": "a", "tag": "t"},
+        {"index": 1, "value": "b", "tag": "t"},
+    ]
@@ -0,0 +1,144 @@
+import datetime as dt
+import time
+
+import pytest
+
+from aws_sfn_builder import HotSpotTracer, Machine, Runner, Tracer
+
+
+class RecordingTracer(Tracer):
+    measure_payloads = True
+
+    def __init__(self):
+        self.events = []
+
+    def on_state_enter(self, trace, input):
+        self.events.append(("enter", trace.name, trace.type, trace.input_size))
+
+    def on_state_exit(self, trace, output):
+        self.events.append(("exit", trace.name, trace.output_size))
+        assert trace.duration_ns >= trace.provider_ns >= 0
+
+    def on_transition(self, from_state, to_state):
+        self.events.append(("transition", from_state, to_state))
+
+    def on_error(self, trace, error):
+        self.events.append(("error", trace.name, repr(error)))
+
+
+def test_tracer_receives_callbacks_in_order():
+    sm = Machine.parse(["a", "b"])
+
+    tracer = RecordingTracer()
+    runner = Runner(tracer=tracer)
+    runner.resource_provider("a")(lambda x: {"a": 1})
+    runner.resource_provider("b")(lambda x: x)
+    sm.states["a"].resource = "a"
+    sm.states["b"].resource = "b"
+
+    runner.run(sm)
+
+    assert tracer.events == [
+        ("enter", "a", "Task", 2),
+        ("exit", "a", 7),
+        ("transition", "a", "b"),
+        ("enter", "b", "Task", 7),
+        ("exit", "b", 7),
+    ]
+
+
+def test_tracer_is_notified_of_errors():
+    sm = Machine.parse([{"Resource": "a"}])
+
+    tracer = RecordingTracer()
+    runner = Runner(tracer=tracer)
+
+    @runner.resource_provider("a")
+    def fail(payload):
+        raise ValueError("boom")
+
+    with pytest.raises(RuntimeError):
+        runner.run(sm)
+
+    assert tracer.events[-1] == ("error", "a", "ValueError('boom')")
+
+
+def test_tracing_does_not_fail_executions_with_payloads_that_json_cannot_represent():
+    sm = Machine.parse([{"Resource": "a"}])
+
+    tracer = RecordingTracer()
+    runner = Runner(tracer=tracer)
+    runner.resource_provider("a")(lambda x: {"at": dt.datetime(2020, 1, 1)})
+
+    assert runner.run(sm, input={"at": dt.date(2020, 1, 1)})[1] == {"at": dt.datetime(2020, 1, 1)}
+    assert tracer.events[0][-1] > 0
+    assert tracer.events[1][-1] > 0
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_provider_time_of_branches_is_added_to_the_parallel_state(max_workers):
+    sm = Machine.parse({
+        "StartAt": "both",
+        "States": {
+            "both": {
+                "Type": "Parallel",
+                "Branches": [
+                    {"StartAt": name, "States": {name: {"Type": "Task", "Resource": "sleep", "End": True}}}
+                    for name in ("a", "b", "c", "d")
+                ],
+                "End": True,
+            },
+        },
+    })
+
+    traces = []
+
+    class CollectingTracer(Tracer):
+        def on_state_exit(self, trace, output):
+            traces.append(trace)
+
+    runner = Runner(tracer=CollectingTracer(), max_workers=max_workers)
+    runner.resource_provider("sleep")(lambda x: time.sleep(0.01))
+
+    runner.run(sm)
+
+    [trace] = traces
+    assert trace.name == "both"
+    assert trace.provider_ns >= (40 if max_workers == 1 else 10) * 1e6
+    assert trace.duration_ns >= trace.provider_ns
+
+
+def test_hot_spot_tracer_aggregates_per_state():
+    sm = Machine.parse([{"Resource": "a"}, {"Resource": "b"}])
+
+    tracer = HotSpotTracer()
+    runner = Runner(tracer=tracer)
+    runner.resource_provider("a")(lambda x: x)
+    runner.resource_provider("b")(lambda x: x)
+
+    for _ in range(3):
+        runner.run(sm)
+
+    assert tracer.spots["a"].count == 3
+    assert tracer.spots["b"].count == 3
+    assert tracer.transitions == 3
+    assert tracer.spots["a"].provider_ns <= tracer.spots["a"].total_ns
+
+    report = tracer.report()
+    assert report.splitlines()[0].split()[:3] == ["State", "Type", "Count"]
+    assert len(report.splitlines()) == 3
+    # Payload sizes are not measured unless asked for.
+    assert tracer.spots["a"].measured == 0
+    assert report.splitlines()[1].split()[-2:] == ["-", "-"]
+
+
+def test_hot_spot_tracer_measures_payloads_when_asked():
+    sm = Machine.parse([{"Resource": "a"}])
+
+    tracer = HotSpotTracer(measure_payloads=True)
+    runner = Runner(tracer=tracer)
+    runner.resource_provider("a")(lambda x: {"a": 1})
+    runner.run(sm)
+
+    assert tracer.spots["a"].input_bytes == 2
+    assert tracer.spots["a"].output_bytes == 7